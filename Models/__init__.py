@@ -1,8 +1,33 @@
 
-from Models.user import User
-from Models.ticket import Ticket
-from Models.ticket_type import TicketType, SingleRacePass, WeekendPackage, SeasonMembership, GroupDiscount
-from Models.order import Order
-from Models.payment import Payment
-from Models.admin import Admin
-from Models.sales_report import SalesReport
+import importlib
+
+# Each model is imported the first time it is used, so "import Models" costs nothing
+_EXPORTS = {
+    "User": "Models.user",
+    "Ticket": "Models.ticket",
+    "TicketType": "Models.ticket_type",
+    "SingleRacePass": "Models.ticket_type",
+    "WeekendPackage": "Models.ticket_type",
+    "SeasonMembership": "Models.ticket_type",
+    "GroupDiscount": "Models.ticket_type",
+    "TicketBlock": "Models.ticket_block",
+    "SeatMap": "Models.seat_map",
+    "SeatSection": "Models.seat_map",
+    "Order": "Models.order",
+    "Payment": "Models.payment",
+    "Admin": "Models.admin",
+    "SalesReport": "Models.sales_report",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value  # Found directly from now on
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
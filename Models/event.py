@@ -1,12 +1,31 @@
-class Event:
-   # Creates a new racing event
-   def __init__(self, event_id, name, date, venue, capacity):
+from .slotted import SlottedModel
+
+
+class Event(SlottedModel):
+   __slots__ = ("_event_id", "_name", "_date", "_venue", "_capacity", "_available_seats", "_seat_map")
+
+   # Creates a new racing event, with a SeatMap when seats are numbered
+   def __init__(self, event_id, name, date, venue, capacity, seat_map=None):
+       if seat_map is not None and seat_map.get_capacity() != capacity:
+           raise ValueError("Capacity must match the seat map")
        self._event_id = event_id  # Unique ID for this event
        self._name = name  # Name of the event
        self._date = date  # When the event happens
        self._venue = venue  # Where the event takes place
        self._capacity = capacity  # Maximum number of people
        self._available_seats = capacity  # How many seats are left
+       self._seat_map = seat_map  # Which seats are taken, None for general admission
+
+   # Tickets keep their event, so events are saved inside every order: leave the seat
+   # map out, the seat inventory keeps it
+   def __getstate__(self):
+       state = super().__getstate__()
+       state.pop("_seat_map", None)
+       return state
+
+   def __setstate__(self, state):
+       super().__setstate__(state)
+       self._seat_map = None
 
    # Get the event ID
    def get_event_id(self):
@@ -32,6 +51,10 @@ class Event:
    def get_available_seats(self):
        return self._available_seats
 
+   # Get the seat map, None for general admission
+   def get_seat_map(self):
+       return self._seat_map
+
    # Change the event name
    def set_name(self, name):
        self._name = name
@@ -72,3 +95,19 @@ class Event:
        if self._available_seats + quantity > self._capacity:
            raise ValueError("Exceeds maximum capacity")
        self._available_seats += quantity
+
+   # Take seats for a booking, the best ones in a section when seats are numbered.
+   # Returns the seats taken, an empty list for general admission.
+   def hold_seats(self, quantity, section=None):
+       if quantity > self._available_seats:
+           raise ValueError("Not enough seats available")
+       seats = self._seat_map.hold_best(quantity, section) if self._seat_map is not None else []
+       self._available_seats -= quantity
+       return seats
+
+   # Give seats back, numbered ones are freed in the seat map too
+   def release_seats(self, quantity, seats=()):
+       if seats and self._seat_map is not None:
+           self._seat_map.release(seats)
+       self.increase_seats(min(quantity, self._capacity - self._available_seats))
+
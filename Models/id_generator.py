@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, node IDs then come from the process ID
+    fcntl = None
+
+# An ID is one 64-bit number: milliseconds since EPOCH_MS | node | sequence
+EPOCH_MS = 1735689600000  # 2025-01-01 00:00:00 UTC
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+NODE_COUNT = 1 << NODE_BITS
+SEQUENCE_COUNT = 1 << SEQUENCE_BITS
+
+# Lock files of the node IDs this process holds, kept open so the locks stay held
+_held_node_locks = []
+
+
+def claim_node_id(directory):
+    """Take a node ID that no other running process is using, it is freed when the process exits"""
+    if fcntl is None:
+        return os.getpid() % NODE_COUNT
+    os.makedirs(directory, exist_ok=True)
+    start = os.getpid() % NODE_COUNT
+    for step in range(NODE_COUNT):
+        node_id = (start + step) % NODE_COUNT
+        lock_file = open(os.path.join(directory, f"node-{node_id}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        _held_node_locks.append(lock_file)
+        return node_id
+    raise RuntimeError("All node IDs are in use")
+
+
+class IdGenerator:
+    # Hands out unique, increasing IDs (snowflake style). Each process needs its own node ID.
+    def __init__(self, node_id, clock=time.time):
+        if not 0 <= node_id < NODE_COUNT:
+            raise ValueError(f"Node ID must be between 0 and {NODE_COUNT - 1}")
+        self._node_id = node_id  # Which process/worker this generator belongs to
+        self._clock = clock  # Where the current time comes from
+        self._last_ms = 0  # Millisecond of the last ID
+        self._sequence = 0  # IDs already given out in that millisecond
+        self._lock = threading.Lock()
+
+    # Get the node ID
+    def get_node_id(self):
+        return self._node_id
+
+    # Get the next ID as a number
+    def next_number(self):
+        with self._lock:
+            now_ms = int(self._clock() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # Same millisecond, or the clock went back: keep counting from the last ID
+                self._sequence += 1
+                if self._sequence == SEQUENCE_COUNT:
+                    self._last_ms += 1  # Run slightly ahead of the clock rather than wait
+                    self._sequence = 0
+            return (self._last_ms << (NODE_BITS + SEQUENCE_BITS)) | (self._node_id << SEQUENCE_BITS) | self._sequence
+
+    # Get the next ID as text, e.g. next_id("O") -> "O123456789012345"
+    def next_id(self, prefix=""):
+        return f"{prefix}{self.next_number()}"
+
+
+# Split an ID number back into (milliseconds since EPOCH_MS, node, sequence)
+def split_id(number):
+    return (number >> (NODE_BITS + SEQUENCE_BITS),
+            (number >> SEQUENCE_BITS) & (NODE_COUNT - 1),
+            number & (SEQUENCE_COUNT - 1))
@@ -1,11 +1,44 @@
-class Order:
+from .slotted import SlottedModel
+from .ticket_block import TicketBlock
+
+
+class Order(SlottedModel):
+   __slots__ = ("_order_id", "_order_date", "_tickets", "_blocks", "_ticket_count", "_total", "_status", "_user_id",
+                "_user", "_payment")
+
    # Creates a new order for ticket purchases
    def __init__(self, order_id, order_date, status="pending", user=None):
        self._order_id = order_id        # Unique ID for this order
        self._order_date = order_date    # When the order was made
        self._tickets = []               # List of tickets in this order
+       self._blocks = []                # Identical tickets stored once with a count
+       self._ticket_count = 0           # Tickets in the list and in the blocks
+       self._total = 0                  # Running total so it is never summed again
        self._status = status            # Current order status
-       self._user = user                # Who placed this order
+       self._user_id = user.get_user_id() if user else None  # Who placed this order, the only part saved
+       self._user = user                # The user object, only while the order is in memory
+       self._payment = None             # The Payment made for this order, saved with it
+
+   # Save the user id only, so the order file never holds copies of user profiles
+   def __getstate__(self):
+       state = super().__getstate__()
+       state.pop("_user", None)
+       return state
+
+   # Orders saved before blocks existed only have a ticket list, work out the rest when loading.
+   # Orders saved with the whole user inside keep its id and drop the copy.
+   def __setstate__(self, state):
+       super().__setstate__(state)
+       if not hasattr(self, "_blocks"):
+           self._blocks = []
+           self._ticket_count = len(self._tickets)
+           self._total = sum(ticket.get_price() for ticket in self._tickets)
+       if not hasattr(self, "_user_id"):
+           user = getattr(self, "_user", None)
+           self._user_id = user.get_user_id() if user else None
+       self._user = None
+       if not hasattr(self, "_payment"):
+           self._payment = None
 
    # Get the order ID
    def get_order_id(self):
@@ -15,26 +48,102 @@ class Order:
    def get_order_date(self):
        return self._order_date
 
-   # Get all tickets in this order
+   # Get all tickets in this order, blocks are turned into single tickets only here
    def get_tickets(self):
-       return self._tickets
+       if not self._blocks:
+           return self._tickets
+       tickets = list(self._tickets)
+       for block in self._blocks:
+           tickets.extend(block.expand())
+       return tickets
+
+   # Get the blocks of identical tickets
+   def get_blocks(self):
+       return self._blocks
+
+   # Get (ticket, quantity) for every single ticket and every block, without expanding the blocks
+   def get_ticket_lines(self):
+       return [(ticket, 1) for ticket in self._tickets] + [(block.get_ticket(), block.get_quantity()) for block in self._blocks]
+
+   # Count the tickets per event without turning blocks into single tickets: {event_id: (event, quantity)}
+   def get_seats_by_event(self):
+       seats = self._count_by_event()
+       seats.pop(None, None)  # Tickets for no event
+       return seats
+
+   # One pass over the tickets, counted per Event object first so each event's ID is only
+   # read once. Tickets for no event are counted under None.
+   def _count_by_event(self):
+       counts = {}
+       for ticket in self._tickets:
+           event = _event_of(ticket)
+           counts[event] = counts.get(event, 0) + 1
+       for block in self._blocks:
+           event = _event_of(block.get_ticket())
+           counts[event] = counts.get(event, 0) + block.get_quantity()
+       seats = {}
+       for event, quantity in counts.items():
+           event_id = None if event is None else event.get_event_id()
+           event, seen = seats.get(event_id, (event, 0))
+           seats[event_id] = (event, seen + quantity)
+       return seats
+
+   # Get the numbered seats of every ticket and block, per event: {event_id: [seat, ...]}
+   def get_seat_assignments(self):
+       assignments = {}
+       for ticket in self._tickets:
+           event = _event_of(ticket)
+           if event is not None and ticket.get_seat() is not None:
+               assignments.setdefault(event.get_event_id(), []).append(ticket.get_seat())
+       for block in self._blocks:
+           event = _event_of(block.get_ticket())
+           if event is not None and block.get_seats():
+               assignments.setdefault(event.get_event_id(), []).extend(block.get_seats())
+       return assignments
+
+   # Hand the seats held for an event out to its single tickets and then its blocks, in order
+   def assign_seats(self, event_id, seats):
+       seats = list(seats)
+       for ticket in self._tickets:
+           event = _event_of(ticket)
+           if seats and event is not None and event.get_event_id() == event_id:
+               ticket.set_seat(seats.pop(0))
+       for block in self._blocks:
+           event = _event_of(block.get_ticket())
+           if event is not None and event.get_event_id() == event_id:
+               block.set_seats(seats[:block.get_quantity()])
+               seats = seats[block.get_quantity():]
+
+   # Get how many tickets are in this order
+   def get_ticket_count(self):
+       return self._ticket_count
    
    def get_user_id(self):
-        return self._user.get_user_id() if self._user else None
+        return self._user_id
 
    def get_total(self):
-        return sum(ticket.get_price() for ticket in self._tickets)
+        return self._total
    
    # Get the order status
    def get_status(self):
        return self._status
 
-   # Get who made this order
+   # Get who made this order, None for orders read back from storage (look the id up in the store)
    def get_user(self):
        return self._user
+
+   # Get the payment made for this order, None for orders saved before payments were kept
+   def get_payment(self):
+       return self._payment
+
+   # Set the payment made for this order
+   def set_payment(self, payment):
+       self._payment = payment
    
    def get_ticket_type(self):
-        return self._tickets[0].get_type_name() if self._tickets else "Unknown"
+        if self._tickets:
+            return self._tickets[0].get_type_name()
+        return self._blocks[0].get_ticket().get_type_name() if self._blocks else "Unknown"
 
    # Change the order status
    def set_status(self, status):
@@ -46,28 +155,83 @@ class Order:
    def add_ticket(self, ticket):
        if hasattr(ticket, "get_price") and callable(ticket.get_price):
            self._tickets.append(ticket)
+           self._ticket_count += 1
+           self._total += ticket.get_price()
        else:
            raise TypeError("Invalid ticket object: missing get_price method")
 
+   # Add many identical tickets as a single block
+   def add_tickets(self, ticket, quantity):
+       if not (hasattr(ticket, "get_price") and callable(ticket.get_price)):
+           raise TypeError("Invalid ticket object: missing get_price method")
+       block = TicketBlock(ticket, quantity)
+       self._blocks.append(block)
+       self._ticket_count += quantity
+       self._total += block.get_total()
+
    # Remove a ticket from the order
    def remove_ticket(self, ticket):
        if ticket in self._tickets:
            self._tickets.remove(ticket)
+           self._ticket_count -= 1
+           self._total -= ticket.get_price()
+
+   # Confirm the order and take the seats of its tickets: one reservation per event for all
+   # of that event's tickets, not one per ticket. If an event has too few seats left the
+   # seats already taken for the others are given back and the order is left as it was.
+   # With a SeatInventory the seats are taken through it (safe from several threads and,
+   # for the shared one, in one transaction); without one the Event objects are changed.
+   def process_order(self, inventory=None):
+       if self._status != "pending":
+           raise ValueError("Only a pending order can be processed")
+       by_event = self._count_by_event()
+       if not by_event:
+           raise ValueError("Cannot process an empty order")
+       if None in by_event:
+           raise ValueError("Ticket is not associated with a valid event")
+       if inventory is not None:
+           seats = _reserve_with(inventory, by_event)
+       else:
+           seats = _reserve_on_events(by_event)
+       for event_id, event_seats in seats.items():
+           if event_seats:
+               self.assign_seats(event_id, event_seats)
+       self._status = "confirmed"
+       return True
+
+
+# The event a ticket is for, None if it has none
+def _event_of(ticket):
+   return ticket.get_event() if hasattr(ticket, "get_event") else None
+
+
+# Take every event's seats in one call to the inventory, all or none. Returns {event_id: seats}.
+def _reserve_with(inventory, by_event):
+   event_ids = list(by_event)
+   hold_ids = inventory.reserve_many([(event_id, by_event[event_id][1]) for event_id in event_ids])
+   held = [hold_id for hold_id in hold_ids if hold_id is not None]
+   try:
+       if len(held) < len(hold_ids):
+           event = by_event[event_ids[hold_ids.index(None)]][0]
+           raise ValueError(f"Not enough seats available for {event.get_name()}")
+       seats = {event_id: inventory.get_hold_seats(hold_id) for event_id, hold_id in zip(event_ids, hold_ids)}
+       inventory.confirm_many(hold_ids)
+   except BaseException:
+       inventory.release_many(held)  # Holds already confirmed are gone, releasing them does nothing
+       raise
+   return seats
+
 
-       # Confirm order and reduce available seats for each ticket’s event
-       def process_order(self):
-           if not self._tickets:
-               raise ValueError("Cannot process an empty order")
-
-           for ticket in self._tickets:
-               if hasattr(ticket, "get_event") and ticket.get_event():
-                   event = ticket.get_event()
-                   if hasattr(event, "reduce_seats") and callable(event.reduce_seats):
-                       event.reduce_seats(1)
-                   else:
-                       raise AttributeError("Event does not support seat reduction")
-               else:
-                   raise ValueError("Ticket is not associated with a valid event")
-
-           self._status = "confirmed"
-           return True
+# Take every event's seats on the Event objects, giving back what was taken if one fails
+def _reserve_on_events(by_event):
+   taken = []  # (event, quantity, seats) taken so far
+   try:
+       for event, quantity in by_event.values():
+           if not (hasattr(event, "hold_seats") and callable(event.hold_seats)):
+               raise AttributeError("Event does not support seat reduction")
+           taken.append((event, quantity, event.hold_seats(quantity)))
+   except BaseException:
+       for event, quantity, seats in taken:
+           event.release_seats(quantity, seats)
+       raise
+   return {event.get_event_id(): seats for event, _, seats in taken}
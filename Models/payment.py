@@ -1,5 +1,11 @@
 from datetime import datetime
-class Payment:
+
+from .slotted import SlottedModel
+
+
+class Payment(SlottedModel):
+    __slots__ = ("_payment_id", "_amount", "_method", "_status", "_transaction_date")
+
     #Allows multiple payment methods
     ACCEPTED_METHODS = ["credit_card", "debit_card", "cash", "paypal"]
 
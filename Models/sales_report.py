@@ -1,4 +1,5 @@
 import datetime
+import gzip
 class SalesReport:
    # Creates reports about ticket sales
    def __init__(self, report_id, start_date, end_date, sales_data=None):
@@ -7,6 +8,7 @@ class SalesReport:
        self._end_date = end_date  # Report period ends
        # Initialize sales data as an empty dictionary if not passed
        self._sales_data = sales_data if sales_data is not None else {}
+       self._breakdowns = []  # (title, [(label, orders, tickets, revenue)]) shown after the daily sales
 
    # Get the report ID
    def get_report_id(self):
@@ -24,23 +26,45 @@ class SalesReport:
    def get_sales_data(self):
        return self._sales_data
 
-   # Record a ticket sale on a given date
-   def record_sale(self, sale_date):
+   # Get the breakdowns added to the report
+   def get_breakdowns(self):
+       return self._breakdowns
+
+   # Add a table of orders, tickets and revenue per label (ticket type, customer, hour...)
+   def add_breakdown(self, title, rows):
+       self._breakdowns.append((title, list(rows)))
+
+   # Record ticket sales on a given date (one ticket unless a quantity is given)
+   def record_sale(self, sale_date, quantity=1):
         if isinstance(sale_date, datetime.date):
             sale_date = sale_date
             if sale_date not in self._sales_data:
                 self._sales_data[sale_date] = 0
-            self._sales_data[sale_date] += 1 
+            self._sales_data[sale_date] += quantity
+
+   # Go through the lines of the report one at a time
+   def iter_lines(self):
+       yield f"Sales Report: {self._report_id} from {self._start_date} to {self._end_date}"
+       for date, count in sorted(self._sales_data.items()):
+           yield f"{date}: {count} ticket(s) sold"
+       for title, rows in self._breakdowns:
+           yield ""
+           yield title
+           for label, orders, tickets, revenue in rows:
+               yield f"{label}: {orders} order(s), {tickets} ticket(s), ${revenue:.2f}"
 
    # Generate a formatted report
    def generate_report(self):
-       header = f"Sales Report: {self._report_id} from {self._start_date} to {self._end_date}"
-       report_lines = [f"{date}: {count} ticket(s) sold" for date, count in sorted(self._sales_data.items())]
-       return header + "\n" + "\n".join(report_lines)
-
-   # Save report to a file
-   def export_report(self):
-       filename = f"{self._report_id}_sales_report.txt"
-       with open(filename, "w") as file:
-           file.write(self.generate_report())
+       lines = list(self.iter_lines())
+       return lines[0] + "\n" + "\n".join(lines[1:])
+
+   # Save report to a file a line at a time, compressed with gzip when the name ends in .gz
+   def export_report(self, filename=None):
+       filename = filename or f"{self._report_id}_sales_report.txt"
+       opener = gzip.open if filename.endswith(".gz") else open
+       with opener(filename, "wt") as file:
+           lines = self.iter_lines()
+           file.write(next(lines) + "\n")  # The header ends in a line break even with no sales
+           for number, line in enumerate(lines):
+               file.write(line if number == 0 else "\n" + line)
        return filename
\ No newline at end of file
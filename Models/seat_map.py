@@ -0,0 +1,212 @@
+from .slotted import SlottedModel
+
+
+# Seats are (section name, row, seat) tuples counted from 0, row 0 being closest to the track
+def seat_label(seat):
+    section, row, number = seat
+    return f"{section}, row {row + 1}, seat {number + 1}"
+
+
+# Bits of a row's free-seat bitmap where a run of `count` free seats starts
+def _run_starts(free, count):
+    # After each step bit i is set when seats i to i + length - 1 are all free, the length doubling
+    runs, length = free, 1
+    while length * 2 <= count:
+        runs &= runs >> length
+        length *= 2
+    if length < count:
+        runs &= runs >> (count - length)
+    return runs
+
+
+# Position of the set bit closest to `target`, bits must not be 0
+def _nearest_bit(bits, target):
+    below = bits & ((2 << target) - 1)  # Bits at or before the target
+    above = bits >> target  # Bits at or after it, shifted down to start at 0
+    low = below.bit_length() - 1 if below else None
+    high = target + (above & -above).bit_length() - 1 if above else None
+    if low is None:
+        return high
+    if high is None or target - low <= high - target:
+        return low
+    return high
+
+
+class SeatSection(SlottedModel):
+    __slots__ = ("_name", "_row_count", "_row_width", "_rows", "_free_in_row", "_free")
+
+    # A block of seats in rows of the same width. Each row is one int used as a bitmap,
+    # bit i set when seat i is taken, so a row of 250 seats takes 32 bytes.
+    def __init__(self, name, row_count, row_width):
+        if row_count <= 0 or row_width <= 0:
+            raise ValueError("A section needs at least one row and one seat per row")
+        self._name = name  # Section name, as in a ticket type's seat section
+        self._row_count = row_count  # Rows, the first is the best
+        self._row_width = row_width  # Seats in each row, the middle ones are the best
+        self._rows = [0] * row_count  # Taken-seat bitmap of each row
+        self._free_in_row = [row_width] * row_count  # So full rows are skipped without looking at them
+        self._free = row_count * row_width  # Free seats in the whole section
+
+    # Get the section name
+    def get_name(self):
+        return self._name
+
+    # Get the number of rows
+    def get_row_count(self):
+        return self._row_count
+
+    # Get the number of seats in each row
+    def get_row_width(self):
+        return self._row_width
+
+    # Get how many seats the section has
+    def get_capacity(self):
+        return self._row_count * self._row_width
+
+    # Get how many seats are free
+    def get_free_count(self):
+        return self._free
+
+    # Check if one seat is taken
+    def is_taken(self, row, seat):
+        return bool(self._rows[row] >> seat & 1)
+
+    # Find `count` free seats next to each other in the frontmost row that has them, as
+    # close to the middle of the row as possible. Returns [(row, seat), ...] or None.
+    def find_adjacent(self, count):
+        if count > self._row_width or count > self._free:
+            return None
+        full = (1 << self._row_width) - 1
+        middle = (self._row_width - count) // 2  # Where a centred run would start
+        for row, taken in enumerate(self._rows):
+            if self._free_in_row[row] < count:
+                continue
+            starts = _run_starts(full & ~taken, count)
+            if starts:
+                start = _nearest_bit(starts, middle)
+                return [(row, seat) for seat in range(start, start + count)]
+        return None
+
+    # Find the `count` best free seats, front rows first and middle seats first, whether
+    # or not they are together. Returns [(row, seat), ...] or None if too few are free.
+    def find_scattered(self, count):
+        if count > self._free:
+            return None
+        full = (1 << self._row_width) - 1
+        middle = self._row_width // 2
+        seats = []
+        for row, taken in enumerate(self._rows):
+            if not self._free_in_row[row]:
+                continue
+            free = full & ~taken
+            while free and len(seats) < count:
+                seat = _nearest_bit(free, middle)
+                seats.append((row, seat))
+                free &= ~(1 << seat)
+            if len(seats) == count:
+                return seats
+        return None
+
+    # Mark seats as taken, nothing is changed if one of them already is
+    def take(self, seats):
+        if any(self._rows[row] >> seat & 1 for row, seat in seats):
+            raise ValueError("Seat already taken")
+        for row, seat in seats:
+            self._rows[row] |= 1 << seat
+            self._free_in_row[row] -= 1
+        self._free -= len(seats)
+
+    # Mark seats as free again, returns how many were taken
+    def release(self, seats):
+        freed = 0
+        for row, seat in seats:
+            if self._rows[row] >> seat & 1:
+                self._rows[row] &= ~(1 << seat)
+                self._free_in_row[row] += 1
+                freed += 1
+        self._free += freed
+        return freed
+
+    # Get the taken-seat bitmap of every row as bytes, one bit per seat
+    def to_bytes(self):
+        size = (self._row_width + 7) // 8
+        return b"".join(row.to_bytes(size, "little") for row in self._rows)
+
+    # Replace which seats are taken with a bitmap made by to_bytes()
+    def load_bytes(self, data):
+        size = (self._row_width + 7) // 8
+        if len(data) != size * self._row_count:
+            raise ValueError(f"Bitmap does not fit section {self._name}")
+        self._rows = [int.from_bytes(data[start:start + size], "little") for start in range(0, len(data), size)]
+        self._free_in_row = [self._row_width - row.bit_count() for row in self._rows]
+        self._free = sum(self._free_in_row)
+
+
+class SeatMap(SlottedModel):
+    __slots__ = ("_sections",)
+
+    # The seats of one event, split into sections listed best first
+    def __init__(self, sections):
+        self._sections = {section.get_name(): section for section in sections}  # name -> SeatSection
+
+    # Get one section by name
+    def get_section(self, name):
+        return self._sections[name]
+
+    # Get every section, best first
+    def get_sections(self):
+        return list(self._sections.values())
+
+    # Check if there is a section with this name
+    def has_section(self, name):
+        return name in self._sections
+
+    # Get how many seats the event has
+    def get_capacity(self):
+        return sum(section.get_capacity() for section in self._sections.values())
+
+    # Get how many seats are free
+    def get_free_count(self):
+        return sum(section.get_free_count() for section in self._sections.values())
+
+    # Find the best `count` seats: together if any section has them together, else the
+    # best seats of the first section with enough free. With a section name only that
+    # section is looked at (an unknown name means any). Returns seats or None.
+    def find_best(self, count, section=None):
+        sections = [self._sections[section]] if section in self._sections else list(self._sections.values())
+        for finder in (SeatSection.find_adjacent, SeatSection.find_scattered):
+            for candidate in sections:
+                found = finder(candidate, count)
+                if found is not None:
+                    name = candidate.get_name()
+                    return [(name, row, seat) for row, seat in found]
+        return None
+
+    # Find the best seats and take them, raises ValueError if there are not enough
+    def hold_best(self, count, section=None):
+        seats = self.find_best(count, section)
+        if seats is None:
+            raise ValueError("Not enough seats available")
+        self.take(seats)
+        return seats
+
+    # Mark seats as taken, nothing is changed if one of them already is
+    def take(self, seats):
+        by_section = self._by_section(seats)
+        for name, positions in by_section.items():
+            section = self._sections[name]
+            if any(section.is_taken(row, seat) for row, seat in positions):
+                raise ValueError("Seat already taken")
+        for name, positions in by_section.items():
+            self._sections[name].take(positions)
+
+    # Mark seats as free again, returns how many were taken. Seats of unknown sections are skipped.
+    def release(self, seats):
+        return sum(self._sections[name].release(positions)
+                   for name, positions in self._by_section(seats).items() if name in self._sections)
+
+    def _by_section(self, seats):
+        by_section = {}
+        for name, row, seat in seats:
+            by_section.setdefault(name, []).append((row, seat))
+        return by_section
@@ -0,0 +1,47 @@
+from operator import attrgetter
+
+# Slot names of every class worked out so far
+_SLOT_NAMES = {}
+# Getters reading all slots of a class at once, as a tuple
+_SLOT_GETTERS = {}
+
+
+# Base for model classes that keep their fields in __slots__ instead of a __dict__.
+# Pickles made while the classes still had a __dict__ load the same way as new ones.
+class SlottedModel:
+    __slots__ = ()
+
+    # Get the slot names of this class and all its parents
+    @classmethod
+    def slot_names(cls):
+        names = _SLOT_NAMES.get(cls)
+        if names is None:
+            names = []
+            for klass in reversed(cls.__mro__):
+                slots = klass.__dict__.get("__slots__", ())
+                names.extend((slots,) if isinstance(slots, str) else slots)
+            names = _SLOT_NAMES[cls] = tuple(names)
+        return names
+
+    # Save the fields as a plain dict, the same shape old pickles have
+    def __getstate__(self):
+        cls = type(self)
+        getter = _SLOT_GETTERS.get(cls)
+        if getter is None:
+            names = cls.slot_names()
+            if not names:
+                return {}
+            getter = _SLOT_GETTERS[cls] = attrgetter(*names, *names[:1])  # Always gives a tuple
+        try:
+            return dict(zip(cls.slot_names(), getter(self)))
+        except AttributeError:
+            # Some slot was never set, leave it out
+            return {name: getattr(self, name) for name in self.slot_names() if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # (dict state, slot state) as written by the default pickler
+            dict_state, slot_state = state
+            state = {**(dict_state or {}), **(slot_state or {})}
+        for name, value in state.items():
+            setattr(self, name, value)
@@ -1,10 +1,25 @@
+from .slotted import SlottedModel
+
+
 # Represents an event ticket
-class Ticket:
-    def __init__(self, ticket_id, price, validity_start, validity_end, is_available=True):
+class Ticket(SlottedModel):
+    __slots__ = ("_ticket_id", "_price", "_validity_period", "_is_available", "_event", "_seat")
+
+    def __init__(self, ticket_id, price, validity_start, validity_end, is_available=True, event=None, seat=None):
         self._ticket_id = ticket_id  # Unique ID for this ticket
         self._price = price  # How much the ticket costs
         self._validity_period = (validity_start, validity_end)  # When ticket is valid
         self._is_available = is_available  # Availability status
+        self._event = event  # Which event the ticket is for, if any
+        self._seat = seat  # Numbered seat (section, row, seat), None for general admission
+
+    # Tickets saved before events were linked have no event, nor a seat
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if not hasattr(self, "_event"):
+            self._event = None
+        if not hasattr(self, "_seat"):
+            self._seat = None
 
     # Get the ticket ID
     def get_ticket_id(self):
@@ -49,4 +64,12 @@ class Ticket:
 
     #Get the ticket event
     def get_event(self):
-        return None
\ No newline at end of file
+        return self._event
+
+    # Get the numbered seat
+    def get_seat(self):
+        return self._seat
+
+    # Give the ticket a numbered seat
+    def set_seat(self, seat):
+        self._seat = seat
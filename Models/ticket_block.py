@@ -0,0 +1,53 @@
+from .slotted import SlottedModel
+from .ticket import Ticket
+
+
+# A number of identical tickets stored once with a count
+class TicketBlock(SlottedModel):
+    __slots__ = ("_ticket", "_quantity", "_seats")
+
+    def __init__(self, ticket, quantity, seats=()):
+        if quantity <= 0:
+            raise ValueError("Quantity must be at least 1")
+        self._ticket = ticket  # The ticket every seat in the block is a copy of
+        self._quantity = quantity  # How many tickets the block stands for
+        self._seats = tuple(seats)  # Numbered seats (section, row, seat) of the tickets, empty for general admission
+
+    # Blocks saved before seats were numbered have none
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if not hasattr(self, "_seats"):
+            self._seats = ()
+
+    # Get the ticket the block is made of
+    def get_ticket(self):
+        return self._ticket
+
+    # Get how many tickets are in the block
+    def get_quantity(self):
+        return self._quantity
+
+    # Get the numbered seats of the tickets
+    def get_seats(self):
+        return self._seats
+
+    # Give the tickets their numbered seats
+    def set_seats(self, seats):
+        self._seats = tuple(seats)
+
+    # Get the price of one ticket
+    def get_unit_price(self):
+        return self._ticket.get_price()
+
+    # Get the price of the whole block
+    def get_total(self):
+        return self._ticket.get_price() * self._quantity
+
+    # Make one Ticket object per seat, only done when someone asks for them
+    def expand(self):
+        ticket = self._ticket
+        start, end = ticket.get_validity_period()
+        if self._quantity == 1:
+            return [ticket]
+        return [Ticket(f"{ticket.get_ticket_id()}-{i}", ticket.get_price(), start, end, ticket.is_available(), ticket.get_event())
+                for i in range(1, self._quantity + 1)]
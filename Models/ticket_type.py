@@ -1,5 +1,33 @@
+import weakref
 from abc import ABC, abstractmethod
-class TicketType(ABC):
+
+from .slotted import SlottedModel
+
+# Callbacks told when the price of a ticket type changes, held weakly so they never keep
+# their owner alive
+_price_watchers = []
+
+
+def watch_prices(callback):
+   """Call callback(ticket_type) every time a ticket type's price changes"""
+   if hasattr(callback, "__self__"):
+       _price_watchers.append(weakref.WeakMethod(callback))
+   else:
+       _price_watchers.append(lambda: callback)
+
+
+def _price_changed(ticket_type):
+   for ref in list(_price_watchers):
+       callback = ref()
+       if callback is None:
+           _price_watchers.remove(ref)  # Its owner is gone
+       else:
+           callback(ticket_type)
+
+
+class TicketType(SlottedModel, ABC):
+   __slots__ = ("_type_name", "_base_price", "_description")
+
    # Base class for different types of tickets
    def __init__(self, type_name, base_price, description=""):
        self._type_name = type_name  # Name of this ticket type
@@ -25,11 +53,16 @@ class TicketType(ABC):
    # Change the base price
    def set_base_price(self, price):
        self._base_price = price
+       _price_changed(self)
 
    # Change the description
    def set_description(self, description):
        self._description = description
 
+   # Take a percentage off the base price
+   def apply_discount(self, percentage):
+       self.set_base_price(self._base_price * (1 - percentage / 100))
+
    # Calculate the final price
    @abstractmethod
    def calculate_price(self, quantity=1):
@@ -37,6 +70,8 @@ class TicketType(ABC):
 
 
 class SingleRacePass(TicketType):
+   __slots__ = ("_race_day", "_seat_section")
+
    # Ticket for just one race day
    def __init__(self, type_name, base_price, description, race_day, seat_section):
        super().__init__(type_name, base_price, description)
@@ -65,6 +100,8 @@ class SingleRacePass(TicketType):
 
 
 class WeekendPackage(TicketType):
+   __slots__ = ("_start_date", "_end_date", "_included_events")
+
    # Ticket for the whole weekend with multiple events
    def __init__(self, type_name, base_price, description, start_date, end_date, included_events):
        super().__init__(type_name, base_price, description)
@@ -90,6 +127,8 @@ class WeekendPackage(TicketType):
 
 
 class SeasonMembership(TicketType):
+   __slots__ = ("_season", "_membership_level", "_perks")
+
    # Membership for the entire racing season
    def __init__(self, type_name, base_price, description, season, membership_level, perks):
        super().__init__(type_name, base_price, description)
@@ -115,6 +154,8 @@ class SeasonMembership(TicketType):
 
 
 class GroupDiscount(TicketType):
+    __slots__ = ("_group_size", "_discount_percentage", "_base_ticket_type")
+
     def __init__(self, type_name, base_price, description, group_size, discount_percentage, base_ticket_type):
         super().__init__(type_name, base_price, description)
         self._group_size = group_size
@@ -143,4 +184,9 @@ class GroupDiscount(TicketType):
     
     def set_discount_percentage(self, percentage):  # Added method
         self._discount_percentage = percentage
+        _price_changed(self)
+
+    # A group discount is changed by setting its percentage, not by lowering the base price
+    def apply_discount(self, percentage):
+        self.set_discount_percentage(percentage)
 
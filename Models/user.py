@@ -1,5 +1,11 @@
+from .slotted import SlottedModel
+
+
 # Creates a new user with personal information
-class User:
+class User(SlottedModel):
+    __slots__ = ("_user_id", "_username", "_password", "_salt", "_full_name", "_email",
+                 "_phone_number", "_address", "_purchase_history")
+
     def __init__(self, user_id, username, password, salt, full_name, email, phone_number, address):
         # Store all user details privately
         self._user_id = user_id
@@ -55,6 +61,10 @@ class User:
     def set_password(self, password):
         self._password = password
 
+    # Update the salt used for hashing the password
+    def set_salt(self, salt):
+        self._salt = salt
+
     # Update the full name
     def set_full_name(self, full_name):
         self._full_name = full_name
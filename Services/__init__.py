@@ -0,0 +1,40 @@
+
+import importlib
+
+# Modules are imported the first time one of their names is used: the app never pays
+# for asyncio (the API server, the payment pipeline) and the API server never pays for
+# http.client (the client)
+_EXPORTS = {
+    "BackgroundWorker": "Services.background_worker",
+    "SeatInventory": "Services.seat_inventory",
+    "SharedSeatInventory": "Services.seat_inventory",
+    "PasswordHasher": "Services.password_hasher",
+    "HashingPool": "Services.password_hasher",
+    "get_ticket_types": "Services.catalog",
+    "get_events": "Services.catalog",
+    "BookingService": "Services.booking_service",
+    "BookingError": "Services.errors",
+    "PaymentError": "Services.errors",
+    "PaymentDeclined": "Services.errors",
+    "GatewayError": "Services.errors",
+    "PaymentPipeline": "Services.payments",
+    "FakeGateway": "Services.payments",
+    "open_service": "Services.booking_service",
+    "ApiServer": "Services.api_server",
+    "BookingClient": "Services.api_client",
+    "QuoteTable": "Services.pricing",
+    "SalesColumns": "Services.analytics",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value  # Found directly from now on
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,178 @@
+import heapq
+import threading
+from array import array
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:  # Without NumPy the same breakdowns are worked out with plain loops
+    np = None
+
+# Ways the sales can be broken down
+BREAKDOWNS = ("ticket_type", "customer", "hour", "weekday", "price_band")
+BREAKDOWN_TITLES = {
+    "ticket_type": "Sales by ticket type",
+    "customer": "Sales by customer",
+    "hour": "Sales by hour of day",
+    "weekday": "Sales by weekday",
+    "price_band": "Sales by order total",
+}
+# Orders whose total is at least an edge (and below the next one) fall in its band
+PRICE_BANDS = (0, 100, 250, 500, 1000, 2500)
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _band_labels():
+    labels = [f"${low}-{high - 1}" for low, high in zip(PRICE_BANDS, PRICE_BANDS[1:])]
+    return labels + [f"${PRICE_BANDS[-1]}+"]
+
+
+def _price_band(total):
+    band = 0
+    while band + 1 < len(PRICE_BANDS) and total >= PRICE_BANDS[band + 1]:
+        band += 1
+    return band
+
+
+class SalesColumns:
+    # The order history kept as one array per field (day, hour, weekday, price band,
+    # customer, ticket type, tickets, total), so a breakdown is a handful of vectorised sums instead of a walk
+    # over millions of order objects. A removed order is added again with negative
+    # numbers, so the columns only ever grow, like the order journal.
+    def __init__(self, event_types=None):
+        self._event_types = event_types or {}  # event_id -> ticket type name shown for its orders
+        self._day = array("i")  # date.toordinal() of the order
+        self._hour = array("b")
+        self._weekday = array("b")  # Monday is 0
+        self._band = array("b")  # Position in PRICE_BANDS of the order total
+        self._customer = array("i")  # Position in _customers
+        self._type = array("h")  # Position in _types
+        self._tickets = array("i")
+        self._total = array("d")
+        self._count = array("b")  # 1 for an order, -1 for a removed one
+        self._customers, self._customer_codes = [], {}
+        self._types, self._type_codes = [], {}
+        self._arrays = None  # NumPy copies of the columns, made again after rows are added
+        self._lock = threading.Lock()
+
+    # Get how many rows the columns hold, removed orders count twice
+    def get_row_count(self):
+        return len(self._count)
+
+    # Get the first day with an order, None when there are none
+    def get_first_day(self):
+        with self._lock:
+            return date.fromordinal(min(self._day)) if self._day else None
+
+    def _code(self, value, values, codes):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _ticket_type(self, order):
+        for ticket, _ in order.get_ticket_lines():
+            event = ticket.get_event()
+            if event is not None and event.get_event_id() in self._event_types:
+                return self._event_types[event.get_event_id()]
+            break
+        return order.get_ticket_type()
+
+    # Add orders to the columns, or take them back out with sign=-1
+    def add_orders(self, orders, sign=1):
+        with self._lock:
+            self._arrays = None
+            for order in orders:
+                placed = order.get_order_date()
+                self._day.append(placed.toordinal())
+                self._hour.append(getattr(placed, "hour", 0))  # Old orders may only have a date
+                self._weekday.append(placed.weekday())
+                self._band.append(_price_band(order.get_total()))
+                self._customer.append(self._code(order.get_user_id() or "Unknown", self._customers,
+                                                 self._customer_codes))
+                self._type.append(self._code(self._ticket_type(order), self._types, self._type_codes))
+                self._tickets.append(sign * order.get_ticket_count())
+                self._total.append(sign * order.get_total())
+                self._count.append(sign)
+
+    # Take removed orders back out of every breakdown
+    def remove_orders(self, orders):
+        self.add_orders(orders, sign=-1)
+
+    # Sum orders, tickets and revenue per value of one field, optionally only for days from
+    # start_date and up to end_date (either one alone leaves the other side open), and only
+    # the `limit` rows with the most revenue.
+    # Returns [(label, orders, tickets, revenue)].
+    def group_by(self, by, start_date=None, end_date=None, limit=None):
+        if by not in BREAKDOWNS:
+            raise ValueError(f"Unsupported breakdown. Choose from: {', '.join(BREAKDOWNS)}")
+        with self._lock:
+            labels = self._labels(by)
+            if np is not None:
+                orders, tickets, revenue = self._group_by_numpy(by, start_date, end_date)
+                codes = np.flatnonzero(orders > 0)
+                if limit is not None and limit < len(codes):
+                    codes = codes[np.argpartition(-revenue[codes], limit - 1)[:limit]]
+                codes = codes.tolist()
+            else:
+                orders, tickets, revenue = self._group_by_lists(by, start_date, end_date)
+                codes = [code for code in range(len(orders)) if orders[code] > 0]
+                if limit is not None:
+                    codes = heapq.nlargest(limit, codes, key=revenue.__getitem__)
+        rows = [(labels[code], int(orders[code]), int(tickets[code]), round(float(revenue[code]), 2))
+                for code in codes]
+        if limit is not None or by in ("ticket_type", "customer"):
+            rows.sort(key=lambda row: row[3], reverse=True)
+        return rows  # Otherwise hours, weekdays and price bands stay in their natural order
+
+    def _labels(self, by):
+        if by == "ticket_type":
+            return list(self._types)
+        if by == "customer":
+            return list(self._customers)
+        if by == "hour":
+            return [f"{hour:02d}:00" for hour in range(24)]
+        if by == "weekday":
+            return list(WEEKDAYS)
+        return _band_labels()
+
+    def _group_by_numpy(self, by, start_date, end_date):
+        if self._arrays is None:
+            self._arrays = {name: np.array(column) for name, column in self._columns().items()}
+        columns = self._arrays
+        codes, size = columns[by], self._size(by)
+        weights = [columns["count"], columns["tickets"], columns["total"]]
+        if start_date is not None or end_date is not None:
+            inside = np.ones(len(codes), dtype=bool)
+            if start_date is not None:
+                inside &= columns["day"] >= start_date.toordinal()
+            if end_date is not None:
+                inside &= columns["day"] <= end_date.toordinal()
+            codes = codes[inside]
+            weights = [weight[inside] for weight in weights]
+        return [np.bincount(codes.astype(np.intp), weights=weight, minlength=size) for weight in weights]
+
+    def _columns(self):
+        return {"day": self._day, "ticket_type": self._type, "customer": self._customer, "hour": self._hour,
+                "weekday": self._weekday, "price_band": self._band, "tickets": self._tickets, "total": self._total,
+                "count": self._count}
+
+    # How many different values a field can have
+    def _size(self, by):
+        return {"ticket_type": len(self._types), "customer": len(self._customers), "hour": 24, "weekday": 7,
+                "price_band": len(PRICE_BANDS)}[by]
+
+    def _group_by_lists(self, by, start_date, end_date):
+        codes, size = self._columns()[by], self._size(by)
+        orders, tickets, revenue = [0] * size, [0] * size, [0.0] * size
+        rows = zip(codes, self._count, self._tickets, self._total)
+        if start_date is not None or end_date is not None:
+            first = start_date.toordinal() if start_date is not None else 0
+            last = end_date.toordinal() if end_date is not None else date.max.toordinal()
+            rows = (row for row, day in zip(rows, self._day) if first <= day <= last)
+        for code, count, quantity, total in rows:
+            orders[code] += count
+            tickets[code] += quantity
+            revenue[code] += total
+        return orders, tickets, revenue
@@ -0,0 +1,101 @@
+import http.client
+import json
+from urllib.parse import urlsplit
+
+from Services.errors import BookingError  # Not the service itself, a client has no need for it
+
+
+class BookingClient:
+    # Talks to an ApiServer and offers the same methods as BookingService, so the Tk app
+    # can use either one. The server knows who is logged in from the session token, so the
+    # user_id arguments are only there to match BookingService.
+    # One connection is kept open and reused; use one client per thread.
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self._host = parts.hostname
+        self._port = parts.port or 80
+        self._timeout = timeout
+        self._connection = None
+        self._token = None  # Session token from register or login
+
+    # Get the session token, None when logged out
+    def get_token(self):
+        return self._token
+
+    def _request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self._token:
+            headers["Authorization"] = f"Bearer {self._token}"
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+            try:
+                self._connection.request(method, path, body, headers)
+                response = self._connection.getresponse()
+                reply = json.loads(response.read() or b"{}")
+                break
+            except (ConnectionError, http.client.RemoteDisconnected):
+                # The server closed an idle connection, open a new one and try once more
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise BookingError(reply.get("error", "Request failed."), response.status, reply.get("title", "Error"))
+        return reply
+
+    def list_ticket_types(self):
+        return self._request("GET", "/ticket-types")
+
+    def quote_carts(self, carts):
+        return self._request("POST", "/quotes", {"carts": carts})["totals"]
+
+    def register(self, username, email, password):
+        reply = self._request("POST", "/register", {"username": username, "email": email, "password": password})
+        self._token = reply["token"]
+        return reply["user"]
+
+    def login(self, email, password):
+        reply = self._request("POST", "/login", {"email": email, "password": password})
+        self._token = reply["token"]
+        return reply["user"]
+
+    def logout(self):
+        self._request("POST", "/logout")
+        self._token = None
+
+    def update_profile(self, user_id, full_name, phone, address):
+        return self._request("PUT", "/profile", {"full_name": full_name, "phone": phone, "address": address})
+
+    def delete_account(self, user_id):
+        self._request("DELETE", "/account")
+        self._token = None
+
+    def get_user_orders(self, user_id):
+        return self._request("GET", "/orders")
+
+    def delete_order(self, user_id, order_id):
+        self._request("DELETE", f"/orders/{order_id}")
+
+    def book(self, user_id, ticket_type, quantity, card):
+        return self._request("POST", "/orders", {"ticket_type": ticket_type, "quantity": quantity, "card": card})
+
+    def book_many(self, user_id, items, all_or_nothing=False):
+        return self._request("POST", "/orders/batch", {"items": items, "all_or_nothing": all_or_nothing})
+
+    def sales_report(self):
+        return self._request("GET", "/report")
+
+    def sales_breakdown(self, by, start_date=None, end_date=None, limit=None):
+        dates = [day.isoformat() if hasattr(day, "isoformat") else day for day in (start_date, end_date)]
+        return self._request("POST", "/report/breakdown", {"by": by, "start_date": dates[0], "end_date": dates[1],
+                                                            "limit": limit})
+
+    def set_group_discount(self, percentage):
+        return self._request("PUT", "/discount", {"percentage": percentage})["percentage"]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
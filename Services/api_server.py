@@ -0,0 +1,304 @@
+"""HTTP/JSON API for the booking system, built on asyncio from the standard library.
+
+Run from the project folder:
+    python -m Services.api_server
+    python -m Services.api_server --port 8080 --workers 64 --storage sqlite --admin boss@example.com
+    python -m Services.api_server --hash-workers 4   (passwords hashed on 4 processes)
+
+Endpoints (bodies and replies are JSON; after register or login send the returned
+token as "Authorization: Bearer <token>"):
+    POST   /register       {"username", "email", "password"}  -> {"token", "user"}
+    POST   /login          {"email", "password"}              -> {"token", "user"}
+    POST   /logout
+    GET    /ticket-types
+    POST   /quotes         {"carts": [[{"ticket_type", "quantity"}, ...], ...]}  -> {"totals"}
+    GET    /orders
+    POST   /orders         {"ticket_type", "quantity", "card"}
+    POST   /orders/batch   {"items": [{"ticket_type", "quantity", "card"}, ...], "all_or_nothing"}
+    DELETE /orders/<id>
+    PUT    /profile        {"full_name", "phone", "address"}
+    DELETE /account
+    GET    /report                                           (admins only)
+    POST   /report/breakdown {"by", "start_date", "end_date", "limit"}  -> {"by", "rows", "text"}  (admins only)
+    PUT    /discount       {"percentage"}                    (admins only)
+
+Admins are the accounts whose emails are given with --admin; nobody else can read the
+sales figures or change the discount.
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from Services.booking_service import BookingError, open_service
+from Services.password_hasher import HashingPool, PasswordHasher
+from Storage.engine import email_key
+
+MAX_BODY = 1 << 20  # Largest request body accepted, in bytes
+ADMIN = "admin"  # Route access for sessions of admin accounts only
+
+
+class ApiServer:
+    # Serves a BookingService over HTTP. The event loop only parses requests and writes
+    # replies; the service calls themselves (file access, password hashing) run on a
+    # thread pool so one slow request never holds up the others. Users logged in with one
+    # of the `admins` emails may also use the admin routes.
+    def __init__(self, service, host="127.0.0.1", port=8080, workers=32, admins=()):
+        self._service = service
+        self._host = host
+        self._port = port  # 0 picks a free port
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._admin_emails = {email_key(email) for email in admins}
+        self._sessions = {}  # token -> user_id
+        self._admin_sessions = set()  # Tokens of sessions opened by an admin
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._routes = {
+            ("POST", "/register"): (self._register, False),
+            ("POST", "/login"): (self._login, False),
+            ("POST", "/logout"): (self._logout, True),
+            ("GET", "/ticket-types"): (self._ticket_types, False),
+            ("POST", "/quotes"): (self._quotes, False),
+            ("GET", "/orders"): (self._orders, True),
+            ("POST", "/orders"): (self._book, True),
+            ("POST", "/orders/batch"): (self._book_many, True),
+            ("DELETE", "/orders"): (self._delete_order, True),
+            ("PUT", "/profile"): (self._profile, True),
+            ("DELETE", "/account"): (self._delete_account, True),
+            ("GET", "/report"): (self._report, ADMIN),
+            ("POST", "/report/breakdown"): (self._breakdown, ADMIN),
+            ("PUT", "/discount"): (self._discount, ADMIN),
+        }  # (method, path) -> (handler, needs a logged in user, or ADMIN for an admin)
+
+    # Get the port the server is listening on
+    def get_port(self):
+        return self._port
+
+    # Get the number of logged in sessions
+    def get_session_count(self):
+        return len(self._sessions)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self._host, self._port, backlog=1024)
+        self._port = self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._executor.shutdown()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    # Run the server on its own event loop thread, returns the port once it is listening
+    def start_background(self):
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="api-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self._port
+
+    def stop_background(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, reply = await self._dispatch(method, path, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_reply(writer, status, reply, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError:
+            # Request line or headers could not be read
+            self._write_reply(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request."}, False)
+        finally:
+            writer.close()
+
+    # Read one request, returns None when the client has closed the connection
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    def _write_reply(self, writer, status, reply, keep_alive):
+        data = json.dumps(reply).encode()
+        status = HTTPStatus(status)
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+
+    # Find the handler for a request and run it, returns (status, reply)
+    async def _dispatch(self, method, path, headers, body):
+        parts = path.rstrip("/").split("/")
+        route, argument = "/".join(parts[:2]), "/".join(parts[2:])
+        if (method, path) in self._routes:
+            route, argument = path, ""
+        elif (method, route) not in self._routes:
+            return HTTPStatus.NOT_FOUND, {"error": f"No such endpoint: {method} {path}"}
+        handler, needs_login = self._routes[(method, route)]
+        user_id = None
+        if needs_login:
+            token = headers.get("authorization", "").removeprefix("Bearer ").strip()
+            user_id = self._sessions.get(token)
+            if user_id is None:
+                return HTTPStatus.UNAUTHORIZED, {"error": "You must log in first.", "title": "Not Logged In"}
+            if needs_login is ADMIN and token not in self._admin_sessions:
+                return HTTPStatus.FORBIDDEN, {"error": "Only admins can do this.", "title": "Not Allowed"}
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise ValueError
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"error": "Body must be a JSON object."}
+        try:
+            return HTTPStatus.OK, await handler(data, user_id=user_id, token=headers.get("authorization"),
+                                                argument=argument)
+        except BookingError as error:
+            return error.status, {"error": str(error), "title": error.title}
+        except Exception as error:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Something went wrong: {error}"}
+
+    # Run a service method on the thread pool
+    def _call(self, method, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    def _start_session(self, user):
+        token = secrets.token_urlsafe(24)
+        self._sessions[token] = user["user_id"]
+        if email_key(user["email"]) in self._admin_emails:
+            self._admin_sessions.add(token)
+        return {"token": token, "user": user}
+
+    async def _register(self, data, **_):
+        user = await self._call(self._service.register, data.get("username", ""), data.get("email", ""),
+                                data.get("password", ""))
+        return self._start_session(user)
+
+    async def _login(self, data, **_):
+        user = await self._call(self._service.login, data.get("email", ""), data.get("password", ""))
+        return self._start_session(user)
+
+    async def _logout(self, data, token, **_):
+        token = token.removeprefix("Bearer ").strip()
+        self._sessions.pop(token, None)
+        self._admin_sessions.discard(token)
+        return {}
+
+    async def _ticket_types(self, data, **_):
+        return self._service.list_ticket_types()
+
+    async def _quotes(self, data, **_):
+        carts = data.get("carts")
+        if not isinstance(carts, list):
+            raise BookingError("carts must be a list of carts.")
+        return {"totals": await self._call(self._service.quote_carts, carts)}
+
+    async def _orders(self, data, user_id, **_):
+        return await self._call(self._service.get_user_orders, user_id)
+
+    async def _book(self, data, user_id, **_):
+        return await self._call(self._service.book, user_id, data.get("ticket_type"), data.get("quantity"),
+                                data.get("card", ""))
+
+    async def _book_many(self, data, user_id, **_):
+        items = data.get("items")
+        if not isinstance(items, list):
+            raise BookingError("items must be a list of bookings.")
+        return await self._call(self._service.book_many, user_id, items, bool(data.get("all_or_nothing")))
+
+    async def _delete_order(self, data, user_id, argument, **_):
+        await self._call(self._service.delete_order, user_id, argument)
+        return {}
+
+    async def _profile(self, data, user_id, **_):
+        return await self._call(self._service.update_profile, user_id, data.get("full_name", ""),
+                                data.get("phone", ""), data.get("address", ""))
+
+    async def _delete_account(self, data, user_id, **_):
+        await self._call(self._service.delete_account, user_id)
+        for token in [t for t, owner in self._sessions.items() if owner == user_id]:
+            del self._sessions[token]
+            self._admin_sessions.discard(token)
+        return {}
+
+    async def _report(self, data, **_):
+        return await self._call(self._service.sales_report)
+
+    async def _breakdown(self, data, **_):
+        return await self._call(self._service.sales_breakdown, data.get("by"), data.get("start_date"),
+                                data.get("end_date"), data.get("limit"))
+
+    async def _discount(self, data, **_):
+        return {"percentage": self._service.set_group_discount(data.get("percentage"))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=32, help="Threads running service calls")
+    parser.add_argument("--storage", choices=("pickle", "sqlite", "mmap"), default="pickle")
+    parser.add_argument("--kdf", choices=("scrypt", "pbkdf2"), default="scrypt")
+    parser.add_argument("--kdf-cost", type=int, default=None)
+    parser.add_argument("--hash-workers", type=int, default=0,
+                        help="Processes hashing and checking passwords, 0 hashes on the worker threads")
+    parser.add_argument("--admin", action="append", default=[], metavar="EMAIL",
+                        help="Email of an account allowed to see sales and set the discount, may be repeated")
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(args.kdf, args.kdf_cost)
+    hashing_pool = HashingPool(hasher, args.hash_workers) if args.hash_workers > 0 else None
+    service = open_service(args.storage, hasher=hasher, hashing_pool=hashing_pool)
+    server = ApiServer(service, args.host, args.port, args.workers, admins=args.admin)
+    print(f"Serving the booking API on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if hashing_pool is not None:
+            hashing_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
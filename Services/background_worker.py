@@ -0,0 +1,72 @@
+import queue
+import threading
+
+
+class BackgroundWorker:
+    # Runs slow work (file and database access) on one background thread so the window
+    # never freezes. Jobs run one at a time in the order they were given, so writes never
+    # overlap. Results are handed back on the Tk thread by polling with root.after.
+    def __init__(self, root, poll_ms=50, on_busy_change=None, on_error=None):
+        self._root = root  # Anything with an after(ms, callback) method
+        self._poll_ms = poll_ms  # How often finished jobs are checked for
+        self._on_busy_change = on_busy_change  # Called with (busy, label) when work starts or stops
+        self._on_error = on_error  # Called with the exception when a job has no error handler
+        self._jobs = queue.Queue()  # Jobs waiting for the background thread
+        self._results = queue.Queue()  # Finished jobs waiting for the Tk thread
+        self._pending = []  # Labels of jobs that have not been handed back yet
+        self._thread = threading.Thread(target=self._run, name="background-worker", daemon=True)
+        self._thread.start()
+        self._root.after(self._poll_ms, self._poll)
+
+    # Count the jobs that are queued or running
+    def get_pending_count(self):
+        return len(self._pending)
+
+    # Queue a job; on_done(result) or on_error(exception) is later called on the Tk thread
+    def submit(self, work, on_done=None, on_error=None, label="Working"):
+        self._pending.append(label)
+        if len(self._pending) == 1:
+            self._notify_busy()
+        self._jobs.put((work, on_done, on_error))
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            work, on_done, on_error = job
+            try:
+                self._results.put((on_done, work(), None, on_error))
+            except Exception as error:
+                self._results.put((on_done, None, error, on_error))
+
+    # Hand finished jobs back, runs on the Tk thread
+    def _poll(self):
+        self.deliver_results()
+        self._root.after(self._poll_ms, self._poll)
+
+    # Call the callbacks of every finished job
+    def deliver_results(self):
+        while True:
+            try:
+                on_done, result, error, on_error = self._results.get_nowait()
+            except queue.Empty:
+                return
+            self._pending.pop(0)
+            self._notify_busy()
+            if error is not None:
+                handler = on_error or self._on_error
+                if handler is None:
+                    raise error
+                handler(error)
+            elif on_done is not None:
+                on_done(result)
+
+    def _notify_busy(self):
+        if self._on_busy_change is not None:
+            self._on_busy_change(bool(self._pending), self._pending[0] if self._pending else "")
+
+    # Wait for every queued job to finish, then stop the background thread
+    def shutdown(self):
+        self._jobs.put(None)
+        self._thread.join()
@@ -0,0 +1,499 @@
+import threading
+from concurrent.futures import CancelledError
+from datetime import date, datetime
+
+from Models.user import User
+from Models.ticket import Ticket
+from Models.ticket_type import GroupDiscount, SingleRacePass
+from Models.order import Order
+from Models.payment import Payment
+from Models.seat_map import seat_label
+from Models.sales_report import SalesReport
+from Models.id_generator import IdGenerator, claim_node_id
+from Storage import Compactor, ConflictError, DuplicateEmailError, open_storage, sum_daily_sales
+from Services.analytics import SalesColumns, BREAKDOWNS, BREAKDOWN_TITLES
+from Services.catalog import get_ticket_types, get_events
+from Services.errors import BookingError, PaymentDeclined, PaymentError
+from Services.password_hasher import PasswordHasher
+from Services.pricing import QuoteTable
+from Services.seat_inventory import SharedSeatInventory
+
+# How long seats are held for a booking before they go back on sale
+HOLD_SECONDS = 300
+
+# How many times a change to a user is made again when another process saved the user first
+USER_SAVE_ATTEMPTS = 5
+
+
+# Plain data about a user that can be sent to a client (no password or salt)
+def user_to_dict(user):
+    return {
+        "user_id": user.get_user_id(),
+        "username": user.get_username(),
+        "email": user.get_email(),
+        "full_name": user.get_full_name(),
+        "phone_number": user.get_phone_number(),
+        "address": user.get_address(),
+    }
+
+
+# Plain data about an order that can be sent to a client
+def order_to_dict(order):
+    return {
+        "order_id": order.get_order_id(),
+        "order_date": order.get_order_date().isoformat(),
+        "ticket_type": order.get_ticket_type(),
+        "quantity": order.get_ticket_count(),
+        "total": order.get_total(),
+        "status": order.get_status(),
+        "seats": [seat_label(seat) for seats in order.get_seat_assignments().values() for seat in seats],
+    }
+
+
+# Dates may come as date objects or, from the API, as ISO text
+def _parse_date(value):
+    if not value:
+        return None
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+class BookingService:
+    # Everything the booking system can do, without any window. The Tk app and the
+    # HTTP API both call these methods. Every method is safe to call from several threads
+    # and returns plain dicts, so results can go straight into JSON.
+    def __init__(self, store, inventory, ids, hasher=None, ticket_types=None, events=None, hashing_pool=None,
+                 compactor=None, payments=None):
+        self._store = store  # Where users and orders are saved
+        self._compactor = compactor  # Optional Compactor cleaning up deleted records in the background
+        self._payments = payments  # Optional PaymentPipeline charging cards, else payments are processed at once
+        self._inventory = inventory  # Seats left per event
+        self._ids = ids  # IdGenerator for users, orders, payments and tickets
+        self._hasher = hasher or PasswordHasher()
+        self._hashing_pool = hashing_pool  # Optional HashingPool for checking passwords on other processes
+        self._ticket_types = ticket_types if ticket_types is not None else get_ticket_types()
+        self._events = events if events is not None else get_events()
+        self._quotes = QuoteTable(self._ticket_types)  # Prices looked up instead of worked out per request
+        self._store_lock = threading.Lock()  # The pickle engine is not safe to use from several threads
+        self._columns = None  # SalesColumns of the order history, read on the first breakdown
+        for event in self._events.values():
+            self._inventory.add_event(event)
+
+    # Get the ticket types by name
+    def get_ticket_types(self):
+        return self._ticket_types
+
+    # Get the event each ticket type is for
+    def get_events(self):
+        return self._events
+
+    # Get the storage engine
+    def get_store(self):
+        return self._store
+
+    # Describe every ticket type and its current price for one ticket
+    def list_ticket_types(self):
+        return [{"name": name,
+                 "type_name": ticket.get_type_name(),
+                 "description": ticket.get_description(),
+                 "price": self._quotes.quote(name, 1)}
+                for name, ticket in self._ticket_types.items()]
+
+    def register(self, username, email, password):
+        if not username or not email or not password:
+            raise BookingError("Please fill all fields.", title="Input Error")
+        with self._store_lock:
+            if self._store.find_user_by_email(email):
+                raise BookingError("Email already registered.", status=409)
+        salt, hashed_password = self._hash_password(password)  # Slow on purpose, so done outside the lock
+        user = User(self._ids.next_id("U"), username, hashed_password, salt, "", email, "", "")
+        with self._store_lock:
+            try:
+                self._store.add_user(user)  # Checks the email again, another process may have registered it meanwhile
+            except DuplicateEmailError:
+                raise BookingError("Email already registered.", status=409) from None
+        return user_to_dict(user)
+
+    def login(self, email, password):
+        with self._store_lock:
+            user = self._store.find_user_by_email(email)
+        if user is None:
+            raise BookingError("User not found.", status=404)
+        user_salt = user.get_salt()
+        user_password = user.get_password()
+        if not (user_salt and user_password):
+            raise BookingError("User data corrupted.", status=500)
+        if not self._check_password(user_salt, user_password, password):
+            raise BookingError("Incorrect password.", status=401)
+        if self._hasher.needs_rehash(user_password):
+            # Made with an older algorithm or cost: redo it now that we know the password
+            salt, hashed = self._hash_password(password)
+
+            def rehash(latest):
+                latest.set_salt(salt)
+                latest.set_password(hashed)
+            user = self._change_user(user.get_user_id(), rehash)
+        return user_to_dict(user)
+
+    def _hash_password(self, password):
+        if self._hashing_pool is not None:
+            return self._hashing_pool.submit_hash(password).result()
+        return self._hasher.hash(password)
+
+    def _check_password(self, salt, encoded, password):
+        if self._hashing_pool is not None:
+            return self._hashing_pool.submit_verify(salt, encoded, password).result()
+        return self._hasher.verify(salt, encoded, password)
+
+    def update_profile(self, user_id, full_name, phone, address):
+        full_name, phone, address = full_name.strip(), phone.strip(), address.strip()
+        if not full_name or not phone or not address:
+            raise BookingError("Please fill all fields.", title="Input Error")
+
+        def update(user):
+            user.set_full_name(full_name)
+            user.set_phone_number(phone)
+            user.set_address(address)
+        return user_to_dict(self._change_user(user_id, update))
+
+    # Make a change to the latest copy of a user and save it, unless another process saved
+    # the user since that copy was read; then the change is made again on the newer copy
+    def _change_user(self, user_id, change):
+        for _ in range(USER_SAVE_ATTEMPTS):
+            with self._store_lock:
+                version = self._store.get_user_version(user_id)  # Read first, a newer copy only fails the save
+                user = self._get_user(user_id)
+                change(user)
+                try:
+                    self._store.update_user(user, expected_version=version)
+                    return user
+                except ConflictError:
+                    continue
+        raise BookingError("The account was changed somewhere else at the same time, please try again.",
+                           status=409, title="Busy")
+
+    # Delete a user and all their orders, the seats go back on sale
+    def delete_account(self, user_id):
+        with self._store_lock:
+            self._get_user(user_id)
+            self._store.delete_user(user_id)
+            removed = self._store.delete_user_orders(user_id)
+            self._update_columns(removed=removed)
+        self._return_seats(removed)
+
+    def get_user_orders(self, user_id):
+        with self._store_lock:
+            return [order_to_dict(order) for order in self._store.get_user_orders(user_id)]
+
+    # Delete one of the user's orders, the seats go back on sale
+    def delete_order(self, user_id, order_id):
+        with self._store_lock:
+            order = self._store.find_order(order_id)
+            if order is None or order.get_user_id() != user_id:
+                raise BookingError(f"Order {order_id} not found.", status=404)
+            removed = self._store.delete_order(order_id)
+            self._update_columns(removed=removed)
+        self._return_seats(removed)
+
+    # Keep the sales columns, once read, in step with the store (called with the store lock held)
+    def _update_columns(self, added=(), removed=()):
+        if self._columns is not None:
+            self._columns.add_orders(added)
+            self._columns.remove_orders(removed)
+
+    def _return_seats(self, orders):
+        for order in orders:
+            assignments = order.get_seat_assignments()
+            for event_id, (_, quantity) in order.get_seats_by_event().items():
+                self._inventory.return_seats(event_id, quantity, assignments.get(event_id, ()))
+
+    # Work out the total price of some tickets. Group deals already include their
+    # discount, it must not be taken off a second time.
+    def quote(self, ticket_type, quantity):
+        self._get_ticket_type(ticket_type)
+        return self._quotes.quote(ticket_type, quantity)
+
+    # Total price of each cart, a cart being a list of {"ticket_type", "quantity"} lines
+    def quote_carts(self, carts):
+        lines = []
+        for cart in carts:
+            if not isinstance(cart, list) or not all(isinstance(line, dict) for line in cart):
+                raise BookingError("Each cart must be a list of {ticket_type, quantity} lines.")
+            cart_lines = []
+            for line in cart:
+                self._get_ticket_type(line.get("ticket_type"))
+                quantity = line.get("quantity")
+                if not isinstance(quantity, int) or quantity <= 0:
+                    raise BookingError("Enter a valid quantity.", title="Invalid")
+                cart_lines.append((line["ticket_type"], quantity))
+            lines.append(cart_lines)
+        return [float(total) for total in self._quotes.quote_carts(lines)]
+
+    # Book tickets, returns the order with the price that was charged
+    def book(self, user_id, ticket_type, quantity, card):
+        with self._store_lock:
+            user = self._get_user(user_id)
+        order, event, total_price = self._prepare_order(user, ticket_type, quantity, card, datetime.now())
+
+        # Hold the seats first so no other booking can take them while this one is saved
+        try:
+            hold_id = self._inventory.reserve(event.get_event_id(), order.get_ticket_count(), ttl=HOLD_SECONDS,
+                                              section=self._get_section(ticket_type))
+        except ValueError:
+            raise self._sold_out(event)
+        order.assign_seats(event.get_event_id(), self._inventory.get_hold_seats(hold_id))
+        # Charge the card while the seats are held, they go back on sale if it fails
+        error = self._charge([(order.get_payment(), str(card))])[0]
+        if error is not None:
+            self._inventory.release(hold_id)
+            raise error
+        try:
+            with self._store_lock:
+                self._store.add_order(order)  # Only this order is written, not the whole history
+                self._update_columns(added=[order])
+        except Exception:
+            self._inventory.release(hold_id)
+            self._refund([order.get_payment()])
+            raise
+        self._inventory.confirm(hold_id)
+        result = order_to_dict(order)
+        result["charged"] = total_price
+        return result
+
+    # Book many orders for one user at once. Each item is a dict with ticket_type, quantity
+    # and card. Items that are invalid or sold out are reported and skipped (or stop the
+    # whole batch with all_or_nothing); the rest are saved together in one write.
+    def book_many(self, user_id, items, all_or_nothing=False):
+        with self._store_lock:
+            user = self._get_user(user_id)
+        now = datetime.now()
+        results = [None] * len(items)
+        prepared = []  # (index, order, event, total_price)
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise BookingError("Each item must be an object.")
+                order, event, total_price = self._prepare_order(user, item.get("ticket_type"), item.get("quantity"),
+                                                                item.get("card", ""), now)
+                prepared.append((index, order, event, total_price))
+            except BookingError as error:
+                results[index] = {"index": index, "ok": False, "error": str(error), "title": error.title}
+
+        # Hold the seats of every valid item in one go
+        hold_ids = self._inventory.reserve_many(
+            [(event.get_event_id(), order.get_ticket_count(), self._get_section(items[index]["ticket_type"]))
+             for index, order, event, _ in prepared], ttl=HOLD_SECONDS)
+        booked = []
+        for (index, order, event, total_price), hold_id in zip(prepared, hold_ids):
+            if hold_id is None:
+                error = self._sold_out(event)
+                results[index] = {"index": index, "ok": False, "error": str(error), "title": error.title}
+            else:
+                order.assign_seats(event.get_event_id(), self._inventory.get_hold_seats(hold_id))
+                booked.append((index, order, total_price, hold_id))
+        if all_or_nothing and len(booked) < len(items):
+            self._inventory.release_many([hold_id for *_, hold_id in booked])
+            booked = []
+        if booked:
+            # Charge every card at once while the seats are held
+            errors = self._charge([(order.get_payment(), str(items[index]["card"])) for index, order, _, _ in booked])
+            for (index, *_), error in zip(booked, errors):
+                if error is not None:
+                    results[index] = {"index": index, "ok": False, "error": str(error), "title": error.title}
+            paid = [entry for entry, error in zip(booked, errors) if error is None]
+            self._inventory.release_many([hold_id for (*_, hold_id), error in zip(booked, errors) if error is not None])
+            if all_or_nothing and len(paid) < len(booked):
+                self._refund([order.get_payment() for _, order, _, _ in paid])
+                self._inventory.release_many([hold_id for *_, hold_id in paid])
+                paid = []
+            booked = paid
+        if booked:
+            held = [hold_id for *_, hold_id in booked]
+            try:
+                with self._store_lock:
+                    orders = [order for _, order, _, _ in booked]
+                    self._store.add_orders(orders)  # One write for the whole batch
+                    self._update_columns(added=orders)
+            except Exception:
+                self._inventory.release_many(held)
+                self._refund([order.get_payment() for _, order, _, _ in booked])
+                raise
+            self._inventory.confirm_many(held)
+
+        for index, order, total_price, _ in booked:
+            results[index] = dict(order_to_dict(order), index=index, ok=True, charged=total_price)
+        for index in range(len(items)):
+            if results[index] is None:
+                results[index] = {"index": index, "ok": False, "error": "Not booked, another item failed.",
+                                  "title": "Not Booked"}
+        return {"booked": len(booked),
+                "failed": len(items) - len(booked),
+                "charged": sum(total_price for _, _, total_price, _ in booked),
+                "results": results}
+
+    # Check a booking request and build its order, returns (order, event, total price)
+    def _prepare_order(self, user, ticket_type, quantity, card, now):
+        try:
+            quantity = int(quantity)
+            if quantity <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise BookingError("Enter a valid quantity.", title="Invalid")
+        card = str(card)
+        if len(card) != 16 or not card.isdigit():
+            raise BookingError("Enter a 16-digit card number.", status=402, title="Payment Error")
+        total_price = self.quote(ticket_type, quantity)
+        today = now.strftime("%Y-%m-%d")
+        # Create payment record, it is charged once the seats are held and saved with the order
+        payment = Payment(self._ids.next_id("P"), total_price, "credit_card", transaction_date=today)
+        order = Order(self._ids.next_id("O"), now, "confirmed", user)
+        order.set_payment(payment)
+        # All tickets in an order are the same, so store one ticket and how many of it,
+        # priced so the order adds up to what was charged
+        event = self._events[ticket_type]
+        ticket = Ticket(self._ids.next_id("T"), total_price / quantity, today, today, event=event)
+        order.add_tickets(ticket, quantity)
+        return order, event, total_price
+
+    # The seat section a ticket type is sold in, None for anywhere at its event
+    def _get_section(self, ticket_type):
+        ticket = self._ticket_types[ticket_type]
+        if isinstance(ticket, GroupDiscount):
+            ticket = ticket.get_base_ticket_type()
+        return ticket.get_seat_section() if isinstance(ticket, SingleRacePass) else None
+
+    # Charge payments, through the pipeline all at once if there is one. Returns a
+    # BookingError for each payment that did not go through, None for the others. A charge
+    # given up on because the pipeline was stopped is a failed payment like any other.
+    def _charge(self, charges):
+        if self._payments is None:
+            for payment, _ in charges:
+                payment.process_payment()
+            return [None] * len(charges)
+        futures = [self._payments.submit(payment, card) for payment, card in charges]
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+                errors.append(None)
+            except PaymentDeclined:
+                errors.append(BookingError("The card was declined.", status=402, title="Payment Error"))
+            except (PaymentError, CancelledError):
+                errors.append(BookingError("The payment could not be made, please try again.", status=503,
+                                           title="Payment Error"))
+        return errors
+
+    # Give back payments of orders that were not saved after all
+    def _refund(self, payments):
+        for payment in payments:
+            if self._payments is None:
+                payment.set_status("refunded")
+            else:
+                try:
+                    self._payments.refund(payment)
+                except PaymentError:
+                    pass  # Left charged, the payment keeps its status so it can be found and refunded later
+
+    def _sold_out(self, event):
+        return BookingError(f"Not enough seats left for {event.get_name()} ({event.get_venue()}).",
+                            status=409, title="Sold Out")
+
+    # Build the sales report text from the stored per-day totals
+    def sales_report(self):
+        with self._store_lock:
+            daily = self._store.get_daily_sales()
+        current_date = datetime.now().date()
+        start_date = min(daily) if daily else current_date
+        report = SalesReport(self._ids.next_id("R"), start_date, current_date)
+        for sale_date, (tickets, _, _) in daily.items():
+            report.record_sale(sale_date, tickets)
+        _, total_orders, total_sales = sum_daily_sales(daily)
+        return {"total_orders": total_orders,
+                "total_sales": total_sales,
+                "text": f"Total orders: {total_orders}\nTotal Sales: ${total_sales:.2f}\n\n{report.generate_report()}"}
+
+    # Break the sales down by ticket type, customer, hour, weekday or price band, only for the
+    # days between two dates (dates or ISO text) if given, and only the top `limit` rows by revenue
+    def sales_breakdown(self, by, start_date=None, end_date=None, limit=None):
+        if by not in BREAKDOWNS:
+            raise BookingError(f"Unsupported breakdown. Choose from: {', '.join(BREAKDOWNS)}")
+        try:
+            start_date, end_date = _parse_date(start_date), _parse_date(end_date)
+            if limit is not None:
+                limit = int(limit)
+                if limit <= 0:
+                    raise ValueError
+        except (TypeError, ValueError):
+            raise BookingError("Enter valid dates (YYYY-MM-DD) and a positive limit.", title="Invalid")
+        with self._store_lock:
+            if self._columns is None:
+                # The whole history is read once, later bookings and deletes are added as they happen
+                columns = SalesColumns({event.get_event_id(): name for name, event in self._events.items()})
+                columns.add_orders(self._store.iter_orders())
+                self._columns = columns
+            rows = self._columns.group_by(by, start_date, end_date, limit)
+            if by == "customer" and limit is not None:
+                # Only a few rows, so show who each customer is
+                users = [self._store.find_user_by_id(label) for label, *_ in rows]
+                rows = [(f"{user.get_full_name()} ({label})" if user and user.get_full_name() else label, *numbers)
+                        for user, (label, *numbers) in zip(users, rows)]
+        title = f"Top {limit} customers" if by == "customer" and limit else BREAKDOWN_TITLES[by]
+        today = datetime.now().date()
+        report = SalesReport(self._ids.next_id("R"), start_date or self._columns.get_first_day() or today,
+                             end_date or today)
+        report.add_breakdown(title, rows)
+        return {"by": by,
+                "rows": [{"label": label, "orders": orders, "tickets": tickets, "revenue": revenue}
+                         for label, orders, tickets, revenue in rows],
+                "text": report.generate_report()}
+
+    # Change the group discount, returns the new percentage
+    def set_group_discount(self, percentage):
+        try:
+            percentage = float(percentage)
+            if not (0 <= percentage <= 100):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise BookingError("Enter a valid percentage between 0-100.", title="Invalid")
+        group_ticket = self._ticket_types.get("Group")
+        if not isinstance(group_ticket, GroupDiscount):
+            raise BookingError("Group ticket type not found.", status=404)
+        group_ticket.set_discount_percentage(percentage)
+        return percentage
+
+    # Make sure everything is on disk and close the files
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.stop()  # Waits for a compaction that is under way
+        if self._payments is not None:
+            self._payments.stop()
+        with self._store_lock:
+            self._store.close()
+        self._inventory.close()
+
+    # Must be called with the store lock held
+    def _get_user(self, user_id):
+        user = self._store.find_user_by_id(user_id)
+        if user is None:
+            raise BookingError("User not found.", status=404)
+        return user
+
+    def _get_ticket_type(self, ticket_type):
+        if not isinstance(ticket_type, str) or ticket_type not in self._ticket_types:
+            raise BookingError(f"Unknown ticket type {ticket_type}.", status=404)
+        return self._ticket_types[ticket_type]
+
+
+def open_service(backend="pickle", users_file="users.pickle", orders_file="orders.pickle", db_file="bookings.db",
+                 inventory_file="inventory.db", node_id_dir="node_ids", hasher=None, hashing_pool=None,
+                 ticket_types=None, events=None, compact_interval=300, payments=None):
+    """Open the files and build a BookingService on top of them.
+    Deleted records are compacted away every compact_interval seconds, None turns that off.
+    Cards are charged through `payments`, a started PaymentPipeline, if one is given."""
+    store = open_storage(backend, users_file, orders_file, db_file)
+    compactor = None
+    if compact_interval:
+        compactor = Compactor(store, compact_interval)
+        compactor.start()
+    return BookingService(store, SharedSeatInventory(inventory_file), IdGenerator(claim_node_id(node_id_dir)),
+                          hasher=hasher, ticket_types=ticket_types, events=events, hashing_pool=hashing_pool,
+                          compactor=compactor, payments=payments)
@@ -0,0 +1,32 @@
+from Models.ticket_type import SingleRacePass, WeekendPackage, SeasonMembership, GroupDiscount
+from Models.event import Event
+from Models.seat_map import SeatMap, SeatSection
+
+
+# Create different types of tickets
+def get_ticket_types():
+    race_pass = SingleRacePass("Single Race", 120, "Access to one race day", "Friday", "Main Grandstand")
+    weekend = WeekendPackage("Weekend Pass", 300, "All weekend events", "2025-11-10", "2025-11-12", ["Practice", "Qualifying", "Race"])
+    season = SeasonMembership("Season Ticket", 1000, "All-season access", "2025", "Gold", ["VIP Lounge", "Pit Access", "Free Merch"])
+    group = GroupDiscount("Group Deal", 0, "Discounted for groups", 5, 15,
+                          SingleRacePass("Group Race", 120, "Group race day", "Friday", "South Zone"))
+
+    return {
+        "RacePass": race_pass,
+        "Weekend": weekend,
+        "Season": season,
+        "Group": group
+    }
+
+
+# Create the events each ticket type gives a seat at. Single race days have numbered
+# seats in the section named by their ticket type, the others are general admission.
+def get_events():
+    return {
+        "RacePass": Event("E1", "Race Day", "2025-11-14", "Main Grandstand", 60000,
+                          SeatMap([SeatSection("Main Grandstand", 240, 250)])),
+        "Weekend": Event("E2", "Race Weekend", "2025-11-10", "Yas Marina Circuit", 20000),
+        "Season": Event("E3", "2025 Season", "2025", "All circuits", 5000),
+        "Group": Event("E4", "Race Day", "2025-11-14", "South Zone", 8000,
+                       SeatMap([SeatSection("South Zone", 80, 100)])),
+    }
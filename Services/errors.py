@@ -0,0 +1,21 @@
+class BookingError(Exception):
+    # A request that cannot be done, with a message that can be shown to the user
+    def __init__(self, message, status=400, title="Error"):
+        super().__init__(message)
+        self.status = status  # Matching HTTP status code
+        self.title = title  # Short heading for an error dialog
+
+
+class PaymentError(Exception):
+    # A payment that did not go through
+    pass
+
+
+class PaymentDeclined(PaymentError):
+    # The gateway turned the payment down, trying again would not help
+    pass
+
+
+class GatewayError(PaymentError):
+    # The gateway failed or did not answer in time, the payment may go through if tried again
+    pass
@@ -0,0 +1,104 @@
+import hashlib
+import hmac
+import os
+
+# Default cost of each algorithm: log2(N) for scrypt, iterations for PBKDF2
+DEFAULT_COSTS = {"scrypt": 14, "pbkdf2": 600_000, "sha256": 1}
+ALGORITHMS = tuple(DEFAULT_COSTS)
+
+# Fixed scrypt block size and parallelism
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+def derive(algorithm, cost, salt, password):
+    """Work out the hex digest of a password with the given algorithm and cost"""
+    if algorithm == "scrypt":
+        n = 1 << cost
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                              maxmem=256 * SCRYPT_R * n).hex()
+    if algorithm == "pbkdf2":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, cost).hex()
+    if algorithm == "sha256":
+        # The original single round, only kept so old accounts can still log in
+        return hashlib.sha256(salt + password.encode()).hexdigest()
+    raise ValueError(f"Unsupported algorithm. Choose from: {', '.join(ALGORITHMS)}")
+
+
+def parse_hash(encoded):
+    """Split a stored hash into (algorithm, cost, digest), old hashes are plain SHA-256 digests"""
+    if "$" not in encoded:
+        return "sha256", 1, encoded
+    algorithm, cost, digest = encoded.split("$")
+    return algorithm, int(cost), digest
+
+
+def check_password(salt, encoded, password):
+    """Check a password against a stored salt and hash"""
+    algorithm, cost, digest = parse_hash(encoded)
+    return hmac.compare_digest(derive(algorithm, cost, salt, password), digest)
+
+
+def make_hash(algorithm, cost, password):
+    """Hash a password with a new salt, returns (salt, stored hash)"""
+    salt = os.urandom(16)
+    return salt, f"{algorithm}${cost}${derive(algorithm, cost, salt, password)}"
+
+
+class PasswordHasher:
+    # Hashes passwords with a slow key-derivation function and a tunable cost
+    def __init__(self, algorithm="scrypt", cost=None):
+        if algorithm not in DEFAULT_COSTS or algorithm == "sha256":
+            raise ValueError("Unsupported algorithm. Choose from: scrypt, pbkdf2")
+        self._algorithm = algorithm  # scrypt or pbkdf2
+        self._cost = cost if cost is not None else DEFAULT_COSTS[algorithm]  # Higher is slower and safer
+
+    # Get the algorithm name
+    def get_algorithm(self):
+        return self._algorithm
+
+    # Get the cost setting
+    def get_cost(self):
+        return self._cost
+
+    # Hash a new password, returns (salt, stored hash)
+    def hash(self, password):
+        return make_hash(self._algorithm, self._cost, password)
+
+    # Check a password against what is stored for a user
+    def verify(self, salt, encoded, password):
+        return check_password(salt, encoded, password)
+
+    # Check if a stored hash was made with an older algorithm or cost and should be redone
+    def needs_rehash(self, encoded):
+        algorithm, cost, _ = parse_hash(encoded)
+        return (algorithm, cost) != (self._algorithm, self._cost)
+
+
+class HashingPool:
+    # Runs hashing on several processes so a burst of logins does not queue behind one CPU
+    def __init__(self, hasher, workers=None):
+        # multiprocessing is slow to import and only a pool needs it
+        from concurrent.futures import ProcessPoolExecutor
+        self._hasher = hasher
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    # Get the hasher whose settings are used
+    def get_hasher(self):
+        return self._hasher
+
+    # Start hashing a new password, the future gives (salt, stored hash)
+    def submit_hash(self, password):
+        return self._executor.submit(make_hash, self._hasher.get_algorithm(), self._hasher.get_cost(), password)
+
+    # Start checking a password, the future gives True or False
+    def submit_verify(self, salt, encoded, password):
+        return self._executor.submit(check_password, salt, encoded, password)
+
+    # Check many (salt, stored hash, password) entries at once
+    def verify_many(self, entries):
+        futures = [self.submit_verify(salt, encoded, password) for salt, encoded, password in entries]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        self._executor.shutdown()
@@ -0,0 +1,288 @@
+import asyncio
+import random
+import threading
+from concurrent.futures import CancelledError, Future
+from itertools import count
+
+from Services.errors import GatewayError, PaymentDeclined, PaymentError
+
+
+class FakeGateway:
+    # A payment gateway on this machine, for tests and benchmarks. Every call waits
+    # `latency` seconds plus a random extra averaging `jitter`, so a few calls are much
+    # slower than the rest as over a real network. A share of calls fail (failure_rate,
+    # before anything is charged) and a share stall for `stall` seconds after charging
+    # (stall_rate), the way a lost reply looks to the caller. Charges are keyed by
+    # payment ID, so a payment tried again after a lost reply is only charged once.
+    def __init__(self, latency=0.05, jitter=0.02, failure_rate=0.0, decline_rate=0.0, stall_rate=0.0, stall=5.0,
+                 per_item=0.001, seed=None):
+        self._latency = latency  # Seconds every call takes at least
+        self._jitter = jitter  # Average extra seconds, exponentially spread
+        self._failure_rate = failure_rate  # Share of calls failing with GatewayError
+        self._decline_rate = decline_rate  # Share of payments declined
+        self._stall_rate = stall_rate  # Share of calls that charge and then hang
+        self._stall = stall  # How long a stalled call hangs
+        self._per_item = per_item  # Extra seconds per payment in a batch call
+        self._random = random.Random(seed)
+        self._references = count(1)
+        self._charged = {}  # payment_id -> (reference, amount)
+        self._calls = 0  # Calls made, batches counting once
+        self._in_flight = 0  # Calls under way right now
+        self._max_in_flight = 0  # Most calls that were ever under way at once
+
+    # Get how many calls were made
+    def get_call_count(self):
+        return self._calls
+
+    # Get the most calls that were under way at the same time
+    def get_max_in_flight(self):
+        return self._max_in_flight
+
+    # Get what was charged: {payment_id: (reference, amount)}
+    def get_charged(self):
+        return dict(self._charged)
+
+    # Charge one payment, returns the gateway's reference for it
+    async def charge(self, payment_id, amount, card):
+        return (await self._call([(payment_id, amount, card)], self._latency))[0]
+
+    # Charge several payments in one call, returns a reference or a PaymentError per payment
+    async def charge_batch(self, charges):
+        return await self._call(charges, self._latency + self._per_item * len(charges), batch=True)
+
+    # Give a charged payment back
+    async def refund(self, payment_id):
+        await self._wait(self._latency)
+        self._charged.pop(payment_id, None)
+
+    async def _call(self, charges, latency, batch=False):
+        self._calls += 1
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            await self._wait(latency)
+            if self._random.random() < self._failure_rate:
+                raise GatewayError("The payment gateway is not available")
+            results = []
+            for payment_id, amount, card in charges:
+                if payment_id in self._charged:
+                    results.append(self._charged[payment_id][0])  # Already charged, tried again
+                elif self._random.random() < self._decline_rate:
+                    declined = PaymentDeclined("The card was declined")
+                    if not batch:
+                        raise declined
+                    results.append(declined)
+                else:
+                    reference = f"TX{next(self._references)}"
+                    self._charged[payment_id] = (reference, amount)
+                    results.append(reference)
+            if self._random.random() < self._stall_rate:
+                await asyncio.sleep(self._stall)
+            return results
+        finally:
+            self._in_flight -= 1
+
+    async def _wait(self, latency):
+        await asyncio.sleep(latency + (self._random.expovariate(1 / self._jitter) if self._jitter else 0))
+
+
+class PaymentPipeline:
+    # Charges payments through a gateway on its own event loop thread, so booking threads
+    # only wait for their own charge and never hold a connection each. At most
+    # `concurrency` calls are with the gateway at once. A call is given up on after
+    # `timeout` seconds and failed calls are made again, up to `attempts` tries in all,
+    # waiting about backoff * 2**n between tries. With batch_size above 1, charges that
+    # come in while the gateway is busy (or within batch_wait seconds) go in one call.
+    def __init__(self, gateway, concurrency=16, timeout=2.0, attempts=3, backoff=0.05, batch_size=1, batch_wait=0.002):
+        self._gateway = gateway  # Anything with async charge(), refund() and, for batches, charge_batch()
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._attempts = attempts
+        self._backoff = backoff
+        self._batch_size = batch_size
+        self._batch_wait = batch_wait
+        self._random = random.Random()  # Spreads the retries out
+        self._loop = None
+        self._thread = None
+        self._slots = None  # Semaphore of the gateway calls that may be under way, made on the loop
+        self._queue = None  # Charges waiting to be batched
+        self._tasks = set()  # Batches being sent, kept so they are not garbage collected
+        self._stats = {"charged": 0, "declined": 0, "failed": 0, "refunded": 0, "retries": 0, "timeouts": 0}
+
+    # Get counts of what happened so far: charged, declined, failed, refunded, retries, timeouts
+    def get_stats(self):
+        return dict(self._stats)
+
+    # Start the event loop thread
+    def start(self):
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._slots = asyncio.Semaphore(self._concurrency)
+            if self._batch_size > 1:
+                self._queue = asyncio.Queue()
+                self._loop.create_task(self._collect_batches())
+            started.set()
+            self._loop.run_forever()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))  # Callers see them cancelled
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="payment-pipeline", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    # Stop the event loop thread, charges still under way are given up (their futures are
+    # cancelled) and later ones fail with GatewayError
+    def stop(self):
+        if self._thread is not None:
+            thread, self._thread = self._thread, None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            thread.join()
+
+    # Charge a payment from any thread, returns a concurrent.futures.Future of the payment
+    def submit(self, payment, card):
+        return self._run(self.charge(payment, card))
+
+    # Charge a payment and wait for it, returns the payment or raises PaymentError
+    def pay(self, payment, card):
+        return self._result(self.submit(payment, card))
+
+    # Give a payment's money back and wait for it
+    def refund(self, payment):
+        return self._result(self._run(self._refund(payment)))
+
+    def _run(self, call):
+        if self._thread is None:
+            call.close()
+            future = Future()
+            future.set_exception(GatewayError("The payment pipeline is not running"))
+            return future
+        return asyncio.run_coroutine_threadsafe(call, self._loop)
+
+    # Wait for a call, one given up on by stop() counts as a gateway failure
+    def _result(self, future):
+        try:
+            return future.result()
+        except CancelledError:
+            raise GatewayError("The payment pipeline was stopped before the call finished") from None
+
+    # Charge a payment, on the pipeline's loop. Marks it processed, or declined or failed
+    # and raises PaymentDeclined or GatewayError.
+    async def charge(self, payment, card):
+        if self._queue is None:
+            return await self._charge_one(payment, card)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((payment, card, future))
+        return await future
+
+    async def _charge_one(self, payment, card, attempt=1):
+        while True:
+            try:
+                async with self._slots:
+                    await self._within_timeout(self._gateway.charge(payment.get_payment_id(), payment.get_amount(),
+                                                                    card))
+                return self._charged(payment)
+            except PaymentDeclined:
+                self._declined(payment)
+                raise
+            except GatewayError as error:
+                await self._before_retry(payment, attempt, error)
+                attempt += 1
+
+    async def _refund(self, payment):
+        attempt = 1
+        while True:
+            try:
+                async with self._slots:
+                    await self._within_timeout(self._gateway.refund(payment.get_payment_id()))
+                payment.set_status("refunded")
+                self._stats["refunded"] += 1
+                return payment
+            except GatewayError as error:
+                await self._before_retry(payment, attempt, error, status=payment.get_status())
+                attempt += 1
+
+    # Run a gateway call, a call that takes too long counts as a gateway failure
+    async def _within_timeout(self, call):
+        try:
+            return await asyncio.wait_for(call, self._timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise GatewayError(f"The payment gateway did not answer within {self._timeout} seconds")
+
+    # Wait before trying a failed call again, or raise if that was the last try
+    async def _before_retry(self, payment, attempt, error, status="failed"):
+        if attempt >= self._attempts:
+            payment.set_status(status)
+            self._stats["failed"] += 1
+            raise error
+        self._stats["retries"] += 1
+        delay = self._backoff * 2 ** (attempt - 1)
+        await asyncio.sleep(delay * self._random.uniform(0.5, 1.5))  # So retries do not all come back at once
+
+    # Take charges off the queue and send them in batches. The batch is made up once a
+    # gateway slot is free, so batches grow while the gateway is busy, and no slot is
+    # held while the queue is empty (refunds need them too).
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            await self._slots.acquire()
+            batch = [first]
+            deadline = loop.time() + self._batch_wait
+            while len(batch) < self._batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+            task = loop.create_task(self._send_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    # Send one batch with the slot taken for it, charges that failed are tried again one by one
+    async def _send_batch(self, batch):
+        try:
+            results = await self._within_timeout(self._gateway.charge_batch(
+                [(payment.get_payment_id(), payment.get_amount(), card) for payment, card, _ in batch]))
+        except GatewayError as error:
+            results = [error] * len(batch)
+        finally:
+            self._slots.release()
+        for (payment, card, future), result in zip(batch, results):
+            if isinstance(result, PaymentDeclined):
+                self._declined(payment)
+                future.set_exception(result)
+            elif isinstance(result, Exception):
+                task = asyncio.get_running_loop().create_task(self._retry_after_batch(payment, card, result, future))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            else:
+                future.set_result(self._charged(payment))
+
+    async def _retry_after_batch(self, payment, card, error, future):
+        try:
+            await self._before_retry(payment, 1, error)
+            future.set_result(await self._charge_one(payment, card, attempt=2))
+        except PaymentError as failure:
+            future.set_exception(failure)
+
+    def _charged(self, payment):
+        payment.process_payment()
+        self._stats["charged"] += 1
+        return payment
+
+    def _declined(self, payment):
+        payment.set_status("declined")
+        self._stats["declined"] += 1
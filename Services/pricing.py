@@ -0,0 +1,112 @@
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # Without NumPy the table is kept in plain lists, with the same results
+    np = None
+
+from Models.ticket_type import GroupDiscount, watch_prices
+
+# Largest quantity kept in the table, bigger orders are priced directly
+MAX_QUANTITY = 100
+
+
+class QuoteTable:
+    # Prices of every ticket type for 1 to max_quantity tickets, worked out once so a
+    # quote is a lookup. When a price changes (set_base_price, set_discount_percentage or
+    # Admin.apply_discount) only the rows of that type, and of group deals built on it,
+    # are worked out again, the next time they are asked for.
+    def __init__(self, ticket_types, max_quantity=MAX_QUANTITY):
+        self._ticket_types = ticket_types  # name -> TicketType
+        self._names = list(ticket_types)
+        self._rows = {name: row for row, name in enumerate(self._names)}  # name -> row
+        self._max_quantity = max_quantity
+        # Which rows depend on each ticket type object: its own row, and any group deal using it
+        self._dependents = {}  # id(ticket type) -> set of rows
+        for row, name in enumerate(self._names):
+            ticket = ticket_types[name]
+            while ticket is not None:
+                self._dependents.setdefault(id(ticket), set()).add(row)
+                ticket = ticket.get_base_ticket_type() if isinstance(ticket, GroupDiscount) else None
+        if np is not None:
+            self._table = np.zeros((len(self._names), max_quantity + 1))
+        else:
+            self._table = [[0.0] * (max_quantity + 1) for _ in self._names]
+        self._valid = [False] * len(self._names)  # Rows that match the current prices
+        self._rebuilds = 0  # How many rows were worked out, for tests and benchmarks
+        self._lock = threading.Lock()
+        watch_prices(self.invalidate)
+
+    # Get the largest quantity served from the table
+    def get_max_quantity(self):
+        return self._max_quantity
+
+    # Get how many rows have been worked out so far
+    def get_rebuild_count(self):
+        return self._rebuilds
+
+    # Forget the rows that depend on a ticket type whose price changed
+    def invalidate(self, ticket_type):
+        with self._lock:
+            for row in self._dependents.get(id(ticket_type), ()):
+                self._valid[row] = False
+
+    def _ensure_rows(self, rows):
+        with self._lock:
+            for row in rows:
+                if not self._valid[row]:
+                    ticket = self._ticket_types[self._names[row]]
+                    prices = [0.0] + [float(ticket.calculate_price(q)) for q in range(1, self._max_quantity + 1)]
+                    self._table[row][:] = prices
+                    self._valid[row] = True
+                    self._rebuilds += 1
+
+    def _row(self, name):
+        if name not in self._rows:
+            raise KeyError(f"Unknown ticket type {name}")
+        return self._rows[name]
+
+    # Total price of some tickets of one type
+    def quote(self, name, quantity):
+        row = self._row(name)
+        if not 1 <= quantity <= self._max_quantity:
+            return float(self._ticket_types[name].calculate_price(quantity))
+        self._ensure_rows((row,))
+        return float(self._table[row][quantity])
+
+    # Total prices of many (name, quantity) pairs at once, as an array (or list without NumPy)
+    def quote_many(self, names, quantities):
+        rows = [self._row(name) for name in names]
+        self._ensure_rows(set(rows))
+        top = self._max_quantity
+        if np is None:
+            return [self._table[row][q] if 1 <= q <= top else float(self._ticket_types[name].calculate_price(q))
+                    for row, name, q in zip(rows, names, quantities)]
+        rows = np.asarray(rows, dtype=np.intp)
+        quantities = np.asarray(quantities, dtype=np.intp)
+        inside = (quantities >= 1) & (quantities <= top)
+        prices = np.zeros(len(quantities))
+        prices[inside] = self._table[rows[inside], quantities[inside]]
+        for k in np.flatnonzero(~inside):  # Rare, priced one by one
+            prices[k] = self._ticket_types[names[k]].calculate_price(int(quantities[k]))
+        return prices
+
+    # Total price of each cart, where a cart is a list of (name, quantity) lines
+    def quote_carts(self, carts):
+        if np is None:
+            return self._quote_carts_lists(carts)
+        names, quantities, owners = [], [], []
+        for cart_number, cart in enumerate(carts):
+            for name, quantity in cart:
+                names.append(name)
+                quantities.append(quantity)
+                owners.append(cart_number)
+        prices = self.quote_many(names, quantities)
+        return np.bincount(np.asarray(owners, dtype=np.intp), weights=prices, minlength=len(carts))
+
+    # Without NumPy summing each cart straight from the table beats flattening the lines first
+    def _quote_carts_lists(self, carts):
+        self._ensure_rows(range(len(self._names)))
+        table = {name: self._table[row] for name, row in self._rows.items()}
+        top = self._max_quantity
+        return [sum(table[name][q] if 1 <= q <= top else self.quote(name, q) for name, q in cart) for cart in carts]
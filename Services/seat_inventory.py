@@ -0,0 +1,448 @@
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+import time
+
+
+class SeatInventory:
+    # Thread-safe seat bookkeeping for Event objects in one process.
+    # Seats are first held (optionally for a limited time), then confirmed or released.
+    # Events with a seat map get the best numbered seats of the requested section.
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock  # Where the current time comes from
+        self._events = {}  # event_id -> Event
+        self._locks = {}  # event_id -> lock guarding that event and its holds
+        self._holds = {}  # hold_id -> (event_id, quantity, expires_at or None)
+        self._hold_seats = {}  # hold_id -> numbered seats it holds, until confirmed or released
+        self._expiry = {}  # event_id -> heap of (expires_at, hold_id)
+        self._hold_numbers = itertools.count(1)
+        self._registry_lock = threading.Lock()
+
+    # Start tracking an event
+    def add_event(self, event):
+        with self._registry_lock:
+            event_id = event.get_event_id()
+            self._events[event_id] = event
+            self._locks.setdefault(event_id, threading.Lock())
+            self._expiry.setdefault(event_id, [])
+
+    # Get a tracked event
+    def get_event(self, event_id):
+        return self._events[event_id]
+
+    # Get the seats that can still be held, after dropping expired holds
+    def get_available(self, event_id):
+        with self._locks[event_id]:
+            self._expire(event_id)
+            return self._events[event_id].get_available_seats()
+
+    # Take seats away from an event until they are confirmed or released. Returns a hold ID.
+    # The numbered seats taken, if the event has a seat map, are given by get_hold_seats().
+    def reserve(self, event_id, quantity, ttl=None, section=None):
+        if quantity <= 0:
+            raise ValueError("Quantity must be at least 1")
+        with self._locks[event_id]:
+            self._expire(event_id)
+            seats = self._events[event_id].hold_seats(quantity, section)  # Raises ValueError when sold out
+            hold_id = f"H{next(self._hold_numbers)}"
+            if seats:
+                self._hold_seats[hold_id] = seats
+            expires_at = self._clock() + ttl if ttl is not None else None
+            self._holds[hold_id] = (event_id, quantity, expires_at)
+            if expires_at is not None:
+                heapq.heappush(self._expiry[event_id], (expires_at, hold_id))
+            return hold_id
+
+    # Hold seats for several (event_id, quantity) or (event_id, quantity, section) requests
+    # at once. Returns a hold ID for each request, or None where there were not enough seats left.
+    # Any other error (e.g. KeyError for an event that is not tracked) gives back what was held.
+    def reserve_many(self, requests, ttl=None):
+        if any(request[1] <= 0 for request in requests):
+            raise ValueError("Quantity must be at least 1")
+        hold_ids = []
+        try:
+            for event_id, quantity, *section in requests:
+                try:
+                    hold_ids.append(self.reserve(event_id, quantity, ttl, *section))
+                except ValueError:
+                    hold_ids.append(None)
+        except BaseException:
+            self.release_many([hold_id for hold_id in hold_ids if hold_id is not None])
+            raise
+        return hold_ids
+
+    # Get the numbered seats of a hold that has not been confirmed or released yet
+    def get_hold_seats(self, hold_id):
+        return list(self._hold_seats.get(hold_id, ()))
+
+    # Turn a hold into sold seats. Returns the number of seats.
+    def confirm(self, hold_id):
+        event_id = self._hold_event(hold_id)
+        with self._locks[event_id]:
+            self._expire(event_id)
+            if hold_id not in self._holds:
+                raise KeyError("Hold has expired or does not exist")
+            _, quantity, _ = self._holds.pop(hold_id)
+            self._hold_seats.pop(hold_id, None)
+            return quantity
+
+    # Give the seats of a hold back. Returns the number of seats (0 if it was already gone).
+    def release(self, hold_id):
+        try:
+            event_id = self._hold_event(hold_id)
+        except KeyError:
+            return 0
+        with self._locks[event_id]:
+            hold = self._holds.pop(hold_id, None)
+            if hold is None:
+                return 0
+            self._events[event_id].release_seats(hold[1], self._hold_seats.pop(hold_id, ()))
+            return hold[1]
+
+    # Confirm several holds, raises KeyError if one has expired
+    def confirm_many(self, hold_ids):
+        for hold_id in hold_ids:
+            self.confirm(hold_id)
+
+    # Release several holds, returns the number of seats given back by each
+    def release_many(self, hold_ids):
+        return [self.release(hold_id) for hold_id in hold_ids]
+
+    # Put sold seats back on sale, e.g. when an order is deleted, with the numbered seats it had
+    def return_seats(self, event_id, quantity, seats=()):
+        with self._locks[event_id]:
+            self._events[event_id].release_seats(quantity, seats)
+
+    # Drop every expired hold of every event
+    def expire_holds(self):
+        for event_id in list(self._events):
+            with self._locks[event_id]:
+                self._expire(event_id)
+
+    # Nothing to close, kept so both inventories can be used the same way
+    def close(self):
+        pass
+
+    def _hold_event(self, hold_id):
+        hold = self._holds.get(hold_id)
+        if hold is None:
+            raise KeyError("Hold has expired or does not exist")
+        return hold[0]
+
+    # Must be called with the event's lock held
+    def _expire(self, event_id):
+        heap = self._expiry[event_id]
+        now = self._clock()
+        while heap and heap[0][0] <= now:
+            _, hold_id = heapq.heappop(heap)
+            hold = self._holds.pop(hold_id, None)
+            if hold is not None:
+                self._events[event_id].release_seats(hold[1], self._hold_seats.pop(hold_id, ()))
+
+
+# Tables for the inventory that several processes can share
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    capacity INTEGER NOT NULL,
+    available INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS holds (
+    hold_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    expires_at REAL,
+    seats TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_holds_expiry ON holds(event_id, expires_at);
+CREATE TABLE IF NOT EXISTS seat_sections (
+    event_id TEXT NOT NULL,
+    section TEXT NOT NULL,
+    taken BLOB NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, section)
+);
+"""
+
+
+class SharedSeatInventory:
+    # The same operations as SeatInventory, kept in a SQLite file so every thread and
+    # process using the file sees one set of seats. Each operation is one write transaction.
+    # Seat maps are stored as one bitmap per section; each process keeps a copy and only
+    # reads a section again when its version shows another process changed it.
+    def __init__(self, db_file, clock=time.time):
+        self._db_file = db_file
+        self._clock = clock  # Wall-clock time, so every process agrees on when holds expire
+        self._local = threading.local()  # One connection per thread
+        self._maps = {}  # event_id -> SeatMap of the Event given to add_event
+        self._versions = {}  # (event_id, section) -> version of the bitmap the SeatMap holds
+        self._connection().executescript(SHARED_SCHEMA)
+        self._transaction(self._upgrade_schema)
+
+    # Files made before seats were numbered have holds without seats
+    def _upgrade_schema(self, conn):
+        if "seats" not in [row[1] for row in conn.execute("PRAGMA table_info(holds)")]:
+            conn.execute("ALTER TABLE holds ADD COLUMN seats TEXT")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_file, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # Run func(conn) inside a transaction that has the write lock from the start
+    def _transaction(self, func):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            self._versions.clear()  # Seat maps may hold changes that were rolled back, read them again
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    # Start tracking an event, keeps the seat count and seat map if the event is already known
+    def add_event(self, event):
+        event_id = event.get_event_id()
+        seat_map = event.get_seat_map()
+
+        def work(conn):
+            conn.execute("INSERT OR IGNORE INTO events (event_id, capacity, available) VALUES (?, ?, ?)",
+                         (event_id, event.get_capacity(), event.get_available_seats()))
+            for section in seat_map.get_sections() if seat_map is not None else ():
+                # A section saved with another layout starts again empty
+                conn.execute("INSERT INTO seat_sections (event_id, section, taken) VALUES (?, ?, ?) "
+                             "ON CONFLICT(event_id, section) DO UPDATE SET taken = excluded.taken, version = version + 1 "
+                             "WHERE length(taken) != length(excluded.taken)",
+                             (event_id, section.get_name(), section.to_bytes()))
+        self._transaction(work)
+        if seat_map is not None:
+            self._maps[event_id] = seat_map
+
+    # Copy the shared seat count, and seat map, into the Event object given to add_event
+    def sync_event(self, event):
+        event_id = event.get_event_id()
+
+        def work(conn):
+            self._expire(conn, event_id)
+            self._sync_map(conn, event_id)
+            return self._available(conn, event_id)
+        event.set_available_seats(self._transaction(work))
+
+    def get_available(self, event_id):
+        def work(conn):
+            self._expire(conn, event_id)
+            return self._available(conn, event_id)
+        return self._transaction(work)
+
+    def reserve(self, event_id, quantity, ttl=None, section=None):
+        if quantity <= 0:
+            raise ValueError("Quantity must be at least 1")
+
+        def work(conn):
+            self._expire(conn, event_id)
+            hold_id = self._reserve(conn, event_id, quantity, ttl, section)
+            if hold_id is None:
+                raise ValueError("Not enough seats available")
+            return hold_id
+        return self._transaction(work)
+
+    # All the requests are held in one transaction, with one seat update per event and
+    # one bitmap write per section
+    def reserve_many(self, requests, ttl=None):
+        if any(request[1] <= 0 for request in requests):
+            raise ValueError("Quantity must be at least 1")
+
+        def work(conn):
+            left = {}
+            for event_id in {request[0] for request in requests}:
+                self._expire(conn, event_id)
+                left[event_id] = self._available(conn, event_id)
+                self._sync_map(conn, event_id)
+            # Hold numbers carry on from the last one ever given out, so an old ID is never reused
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'holds'").fetchone()
+            last = row[0] if row else 0
+            expires_at = self._clock() + ttl if ttl is not None else None
+            hold_ids, rows, changed = [], [], set()
+            for event_id, quantity, *section in requests:
+                seats = self._find_seats(event_id, quantity, *section) if left[event_id] >= quantity else None
+                if seats is None:
+                    hold_ids.append(None)
+                    continue
+                if seats:
+                    self._maps[event_id].take(seats)
+                    changed.update((event_id, name) for name, _, _ in seats)
+                left[event_id] -= quantity
+                last += 1
+                rows.append((last, event_id, quantity, expires_at, _encode_seats(seats)))
+                hold_ids.append(f"H{last}")
+            conn.executemany("INSERT INTO holds (hold_id, event_id, quantity, expires_at, seats) VALUES (?, ?, ?, ?, ?)",
+                             rows)
+            conn.executemany("UPDATE events SET available = ? WHERE event_id = ?",
+                             [(seats, event_id) for event_id, seats in left.items()])
+            self._save_sections(conn, changed)
+            return hold_ids
+        return self._transaction(work)
+
+    # Get the numbered seats of a hold that has not been confirmed or released yet
+    def get_hold_seats(self, hold_id):
+        row = self._connection().execute("SELECT seats FROM holds WHERE hold_id = ?", (_hold_number(hold_id),)).fetchone()
+        return _decode_seats(row[0]) if row else []
+
+    def confirm(self, hold_id):
+        return self._transaction(lambda conn: self._confirm(conn, hold_id))
+
+    # All the holds are confirmed in one transaction, or none are if one has expired
+    def confirm_many(self, hold_ids):
+        def work(conn):
+            before = conn.total_changes
+            now = self._clock()
+            conn.executemany("DELETE FROM holds WHERE hold_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                             [(_hold_number(hold_id), now) for hold_id in hold_ids])
+            if conn.total_changes - before != len(hold_ids):
+                raise KeyError("Hold has expired or does not exist")
+        self._transaction(work)
+
+    def release(self, hold_id):
+        return self._transaction(lambda conn: self._release(conn, hold_id))
+
+    def release_many(self, hold_ids):
+        return self._transaction(lambda conn: [self._release(conn, hold_id) for hold_id in hold_ids])
+
+    def return_seats(self, event_id, quantity, seats=()):
+        def work(conn):
+            conn.execute("UPDATE events SET available = MIN(capacity, available + ?) WHERE event_id = ?",
+                         (quantity, event_id))
+            self._free_seats(conn, event_id, seats)
+        self._transaction(work)
+
+    def expire_holds(self):
+        def work(conn):
+            for (event_id,) in conn.execute("SELECT event_id FROM events").fetchall():
+                self._expire(conn, event_id)
+        self._transaction(work)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # Take seats and add a hold, returns None if there are not enough seats left
+    def _reserve(self, conn, event_id, quantity, ttl, section=None):
+        if self._available(conn, event_id) < quantity:
+            return None
+        self._sync_map(conn, event_id)
+        seats = self._find_seats(event_id, quantity, section)
+        if seats is None:
+            return None
+        if seats:
+            self._maps[event_id].take(seats)
+            self._save_sections(conn, {(event_id, name) for name, _, _ in seats})
+        conn.execute("UPDATE events SET available = available - ? WHERE event_id = ?", (quantity, event_id))
+        expires_at = self._clock() + ttl if ttl is not None else None
+        cursor = conn.execute("INSERT INTO holds (event_id, quantity, expires_at, seats) VALUES (?, ?, ?, ?)",
+                              (event_id, quantity, expires_at, _encode_seats(seats)))
+        return f"H{cursor.lastrowid}"
+
+    # Best seats for a request, [] for an event without a seat map, None if there are none.
+    # The map must have been brought up to date in this transaction.
+    def _find_seats(self, event_id, quantity, section=None):
+        seat_map = self._maps.get(event_id)
+        return [] if seat_map is None else seat_map.find_best(quantity, section)
+
+    # Read again the sections of an event's seat map that changed since this process last did
+    def _sync_map(self, conn, event_id):
+        seat_map = self._maps.get(event_id)
+        if seat_map is None:
+            return
+        rows = conn.execute("SELECT section, version FROM seat_sections WHERE event_id = ?", (event_id,)).fetchall()
+        for name, version in rows:
+            if seat_map.has_section(name) and self._versions.get((event_id, name)) != version:
+                (taken,) = conn.execute("SELECT taken FROM seat_sections WHERE event_id = ? AND section = ?",
+                                        (event_id, name)).fetchone()
+                seat_map.get_section(name).load_bytes(taken)
+                self._versions[(event_id, name)] = version
+
+    # Write the changed (event_id, section) bitmaps back, they must have been synced in this transaction
+    def _save_sections(self, conn, changed):
+        for event_id, name in changed:
+            conn.execute("UPDATE seat_sections SET taken = ?, version = version + 1 WHERE event_id = ? AND section = ?",
+                         (self._maps[event_id].get_section(name).to_bytes(), event_id, name))
+            self._versions[(event_id, name)] += 1
+
+    # Free numbered seats in an event's seat map
+    def _free_seats(self, conn, event_id, seats):
+        seat_map = self._maps.get(event_id)
+        if not seats or seat_map is None:
+            return
+        self._sync_map(conn, event_id)
+        seat_map.release(seats)
+        self._save_sections(conn, {(event_id, name) for name, _, _ in seats if seat_map.has_section(name)})
+
+    def _confirm(self, conn, hold_id):
+        hold = self._hold(conn, hold_id)
+        if hold is None:
+            raise KeyError("Hold has expired or does not exist")
+        event_id, quantity, expires_at = hold
+        if expires_at is not None and expires_at <= self._clock():
+            raise KeyError("Hold has expired or does not exist")
+        conn.execute("DELETE FROM holds WHERE hold_id = ?", (_hold_number(hold_id),))
+        return quantity
+
+    def _release(self, conn, hold_id):
+        hold = self._hold(conn, hold_id)
+        if hold is None:
+            return 0
+        event_id, quantity, _ = hold
+        seats = conn.execute("SELECT seats FROM holds WHERE hold_id = ?", (_hold_number(hold_id),)).fetchone()[0]
+        conn.execute("DELETE FROM holds WHERE hold_id = ?", (_hold_number(hold_id),))
+        conn.execute("UPDATE events SET available = available + ? WHERE event_id = ?", (quantity, event_id))
+        self._free_seats(conn, event_id, _decode_seats(seats))
+        return quantity
+
+    def _available(self, conn, event_id):
+        row = conn.execute("SELECT available FROM events WHERE event_id = ?", (event_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown event {event_id}")
+        return row[0]
+
+    def _hold(self, conn, hold_id):
+        return conn.execute("SELECT event_id, quantity, expires_at FROM holds WHERE hold_id = ?",
+                            (_hold_number(hold_id),)).fetchone()
+
+    # Give the seats of expired holds back, must run inside a transaction
+    def _expire(self, conn, event_id):
+        now = self._clock()
+        (expired,) = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM holds WHERE event_id = ? AND expires_at <= ?",
+                                  (event_id, now)).fetchone()
+        if expired:
+            conn.execute("UPDATE events SET available = available + ? WHERE event_id = ?", (expired, event_id))
+            if event_id in self._maps:
+                rows = conn.execute("SELECT seats FROM holds WHERE event_id = ? AND expires_at <= ? AND seats IS NOT NULL",
+                                    (event_id, now)).fetchall()
+                self._free_seats(conn, event_id, [seat for (seats,) in rows for seat in _decode_seats(seats)])
+            conn.execute("DELETE FROM holds WHERE event_id = ? AND expires_at <= ?", (event_id, now))
+
+
+# Numbered seats of a hold as stored in its row, None when it has none
+def _encode_seats(seats):
+    return json.dumps(seats, separators=(",", ":")) if seats else None
+
+
+def _decode_seats(text):
+    return [tuple(seat) for seat in json.loads(text)] if text else []
+
+
+# "H12" -> 12
+def _hold_number(hold_id):
+    try:
+        return int(str(hold_id).lstrip("H"))
+    except ValueError:
+        return -1
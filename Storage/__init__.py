@@ -0,0 +1,45 @@
+
+import importlib
+
+# Engines are imported on first use, so picking pickle never loads sqlite3 and the other way round
+_EXPORTS = {
+    "load_data": "Storage.pickle_files",
+    "save_data": "Storage.pickle_files",
+    "read_records": "Storage.pickle_files",
+    "OrderJournal": "Storage.order_journal",
+    "StorageEngine": "Storage.engine",
+    "ConflictError": "Storage.engine",
+    "DuplicateEmailError": "Storage.engine",
+    "StorageInUseError": "Storage.engine",
+    "PickleStorage": "Storage.pickle_storage",
+    "SQLiteStorage": "Storage.sqlite_storage",
+    "TableStorage": "Storage.table_storage",
+    "OrderTable": "Storage.order_table",
+    "convert_journal": "Storage.order_table",
+    "UserStore": "Storage.user_store",
+    "open_storage": "Storage.backends",
+    "BACKENDS": "Storage.backends",
+    "migrate_pickle_to_sqlite": "Storage.migrate",
+    "migrate_orders_to_user_ids": "Storage.migrate",
+    "OrderIndex": "Storage.order_index",
+    "JournalView": "Storage.journal_view",
+    "SalesAggregates": "Storage.sales_aggregates",
+    "sum_daily_sales": "Storage.sales_aggregates",
+    "export_data": "Storage.export",
+    "UserJournal": "Storage.order_journal",
+    "Compactor": "Storage.compactor",
+    "FileLock": "Storage.file_lock",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value  # Found directly from now on
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,21 @@
+import os
+
+# Storage engines that can be picked by name
+BACKENDS = ("pickle", "sqlite", "mmap")
+
+
+def open_storage(backend, users_file="users.pickle", orders_file="orders.pickle", db_file="bookings.db",
+                 table_file=None):
+    """Open the storage engine with the given name.
+    The mmap engine keeps orders in table_file, by default the orders file name ending in .tbl."""
+    # Only the engine asked for is imported
+    if backend == "pickle":
+        from .pickle_storage import PickleStorage
+        return PickleStorage(users_file, orders_file)
+    if backend == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage(db_file)
+    if backend == "mmap":
+        from .table_storage import TableStorage
+        return TableStorage(users_file, table_file or os.path.splitext(orders_file)[0] + ".tbl")
+    raise ValueError(f"Unsupported storage backend. Choose from: {', '.join(BACKENDS)}")
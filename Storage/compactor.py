@@ -0,0 +1,63 @@
+import threading
+
+
+class Compactor:
+    # Compacts a store on a background thread every `interval` seconds, but only once
+    # at least `min_garbage` of its records are deleted ones, so deletes stay cheap
+    # tombstone writes and the files still shrink back while bookings carry on
+    def __init__(self, store, interval=300, min_garbage=0.25):
+        if interval <= 0:
+            raise ValueError("Interval must be positive")
+        if not (0 <= min_garbage <= 1):
+            raise ValueError("Minimum garbage must be between 0 and 1")
+        self._store = store  # StorageEngine to compact
+        self._interval = interval  # Seconds between two checks
+        self._min_garbage = min_garbage  # Share of deleted records that triggers a compaction
+        self._stop = threading.Event()
+        self._thread = None
+        self._runs = 0  # Compactions that dropped something
+        self._last_error = None  # Exception raised by the last check, None if it went fine
+
+    # Get how many compactions have dropped records
+    def get_run_count(self):
+        return self._runs
+
+    # Get the exception raised by the last check, None if it went fine
+    def get_last_error(self):
+        return self._last_error
+
+    # Check if the background thread is running
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Compact now if there is enough garbage, returns how many records were dropped
+    def run_once(self):
+        if self._store.get_garbage_ratio() < self._min_garbage:
+            return 0
+        dropped = self._store.compact()
+        if dropped:
+            self._runs += 1
+        return dropped
+
+    # Start checking in the background
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="compactor", daemon=True)
+        self._thread.start()
+
+    # Stop the background thread, waiting for a compaction that is under way to finish
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.run_once()
+                self._last_error = None
+            except Exception as error:  # Keep going, the next check may work
+                self._last_error = error
@@ -0,0 +1,165 @@
+from abc import ABC, abstractmethod
+
+
+class ConflictError(Exception):
+    # A user was saved by someone else between reading it and saving a change to it
+    pass
+
+
+class DuplicateEmailError(Exception):
+    # A new user has the email of a user that is already saved, maybe by another process
+    pass
+
+
+class StorageInUseError(Exception):
+    # The files are already open in another process and cannot be shared with it
+    pass
+
+
+class StorageEngine(ABC):
+    # Base class for the places users and orders can be stored
+
+    # Get every registered user
+    @abstractmethod
+    def get_users(self):
+        raise NotImplementedError("Must override in subclass")
+
+    # Find a user by email, ignoring upper/lower case
+    @abstractmethod
+    def find_user_by_email(self, email):
+        raise NotImplementedError("Must override in subclass")
+
+    # Find a user by ID
+    @abstractmethod
+    def find_user_by_id(self, user_id):
+        raise NotImplementedError("Must override in subclass")
+
+    # Save a new user, raises DuplicateEmailError if the email is already registered
+    @abstractmethod
+    def add_user(self, user):
+        raise NotImplementedError("Must override in subclass")
+
+    # Get the version of a user's saved record, None if there is no such user. It changes
+    # every time the user is saved, from this process or another one sharing the files.
+    @abstractmethod
+    def get_user_version(self, user_id):
+        raise NotImplementedError("Must override in subclass")
+
+    # Save changes to an existing user. With expected_version the change is only saved if
+    # the user is still at that version, otherwise ConflictError is raised and nothing is
+    # written, so the caller can read the user again and redo its change. Changing the
+    # email to one another user has raises DuplicateEmailError.
+    @abstractmethod
+    def update_user(self, user, expected_version=None):
+        raise NotImplementedError("Must override in subclass")
+
+    # Remove a user (their orders are removed with delete_user_orders)
+    @abstractmethod
+    def delete_user(self, user_id):
+        raise NotImplementedError("Must override in subclass")
+
+    # Get every order
+    @abstractmethod
+    def get_orders(self):
+        raise NotImplementedError("Must override in subclass")
+
+    # Get the orders placed by one user
+    @abstractmethod
+    def get_user_orders(self, user_id):
+        raise NotImplementedError("Must override in subclass")
+
+    # Get the orders placed between two dates (both included)
+    @abstractmethod
+    def get_orders_between(self, start_date, end_date):
+        raise NotImplementedError("Must override in subclass")
+
+    # Go through the orders one at a time, only those from start_date and up to end_date if
+    # given (either one alone leaves the other side open). Engines that can should read them
+    # in pieces, so memory does not grow with the order count.
+    def iter_orders(self, start_date=None, end_date=None):
+        if start_date is not None and end_date is not None:
+            yield from self.get_orders_between(start_date, end_date)
+        else:
+            for order in self.get_orders():
+                if in_range(order_day(order), start_date, end_date):
+                    yield order
+
+    # Get (tickets, orders, revenue) per day, for every day or only the days in a range
+    # (either bound alone leaves the other side open)
+    @abstractmethod
+    def get_daily_sales(self, start_date=None, end_date=None):
+        raise NotImplementedError("Must override in subclass")
+
+    # Save a new order
+    @abstractmethod
+    def add_order(self, order):
+        raise NotImplementedError("Must override in subclass")
+
+    # Save several new orders, engines that can should do it in one write
+    def add_orders(self, orders):
+        for order in orders:
+            self.add_order(order)
+
+    # Remove one order, returns the orders that were removed
+    @abstractmethod
+    def delete_order(self, order_id):
+        raise NotImplementedError("Must override in subclass")
+
+    # Remove every order placed by one user, returns the orders that were removed
+    @abstractmethod
+    def delete_user_orders(self, user_id):
+        raise NotImplementedError("Must override in subclass")
+
+    # Find one order by its id, None if it is not stored. Engines with an index on the
+    # order id should override this walk over every order.
+    def find_order(self, order_id):
+        return next((order for order in self.iter_orders() if order.get_order_id() == order_id), None)
+
+    # Get the user who placed an order, orders only store the user id
+    def find_order_user(self, order):
+        user_id = order.get_user_id()
+        return None if user_id is None else self.find_user_by_id(user_id)
+
+    # Write every stored order again in the current layout, e.g. so orders saved with a
+    # whole user inside only keep the user id. Returns how many orders were written.
+    @abstractmethod
+    def rewrite_orders(self):
+        raise NotImplementedError("Must override in subclass")
+
+    # Reclaim the space taken by deleted records, returns how many records were dropped.
+    # Engines that delete in place have nothing to do.
+    def compact(self):
+        return 0
+
+    # Get the share of stored records that are deleted ones waiting for compact()
+    def get_garbage_ratio(self):
+        return 0.0
+
+    # Flush anything pending and release files
+    def close(self):
+        pass
+
+
+# Normalise an email so lookups ignore upper/lower case and stray spaces
+def email_key(email):
+    return email.strip().lower()
+
+
+# Keys journal records are matched on, a later record replaces or deletes an earlier one
+def user_key(user):
+    return user.get_user_id()
+
+
+def order_key(order):
+    return order.get_order_id()
+
+
+# Turn an order date (datetime or date) into a plain date
+def order_day(order):
+    order_date = order.get_order_date()
+    return order_date.date() if hasattr(order_date, "date") else order_date
+
+
+# Check if a day is between two dates (both included), a bound left as None does not limit that side
+def in_range(day, start_date=None, end_date=None):
+    return (start_date is None or start_date <= day) and (end_date is None or day <= end_date)
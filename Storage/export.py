@@ -0,0 +1,131 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+from datetime import date
+from itertools import islice
+
+from .backends import open_storage, BACKENDS
+
+# Columns of each kind of export, rows are tuples in this order
+ORDER_FIELDS = ("order_id", "order_date", "user_id", "status", "ticket_type", "tickets", "total")
+TICKET_FIELDS = ("order_id", "ticket_id", "ticket_type", "event_id", "unit_price", "quantity", "valid_from", "valid_to")
+SALES_FIELDS = ("day", "tickets", "orders", "revenue")
+
+FORMATS = ("csv", "jsonl")
+CHUNK_ROWS = 1000  # Rows formatted before each write to the file
+
+
+# Dates and datetimes as ISO text, so CSV and JSON agree
+def _text(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def order_rows(orders):
+    """One row per order"""
+    for order in orders:
+        yield (order.get_order_id(), _text(order.get_order_date()), order.get_user_id(), order.get_status(),
+               order.get_ticket_type(), order.get_ticket_count(), order.get_total())
+
+
+def ticket_rows(orders):
+    """One row per ticket, a block of identical tickets is one row with its quantity"""
+    for order in orders:
+        for ticket, quantity in order.get_ticket_lines():
+            event = ticket.get_event()
+            start, end = ticket.get_validity_period()
+            yield (order.get_order_id(), ticket.get_ticket_id(), ticket.get_type_name(),
+                   event.get_event_id() if event is not None else None, ticket.get_price(), quantity,
+                   _text(start), _text(end))
+
+
+def sales_rows(daily):
+    """One row per day from a {day: (tickets, orders, revenue)} mapping, oldest first"""
+    for day in sorted(daily, key=str):
+        tickets, orders, revenue = daily[day]
+        yield _text(day), tickets, orders, revenue
+
+
+def _chunks(rows):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, CHUNK_ROWS))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(rows, f, fields):
+    """Write rows to an open text file as CSV with a header, returns how many rows were written"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(fields)
+    count = 0
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        f.write(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+        count += len(chunk)
+    f.write(buffer.getvalue())  # Only the header is left when there were no rows
+    return count
+
+
+def write_jsonl(rows, f, fields):
+    """Write rows to an open text file as one JSON object per line, returns how many rows were written"""
+    count = 0
+    for chunk in _chunks(rows):
+        f.write("".join(json.dumps(dict(zip(fields, row))) + "\n" for row in chunk))
+        count += len(chunk)
+    return count
+
+
+def export_data(store, kind, filename, start_date=None, end_date=None):
+    """Stream orders, tickets or per-day sales from a store into a CSV or JSONL file.
+    The format comes from the file name (.csv or .jsonl), and a .gz ending compresses it.
+    Returns how many rows were written."""
+    compress = filename.endswith(".gz")
+    file_format = filename[:-3 if compress else None].rsplit(".", 1)[-1]
+    if file_format not in FORMATS:
+        raise ValueError("Unsupported export format. Name the file .csv or .jsonl (optionally .gz)")
+    if kind == "orders":
+        fields, rows = ORDER_FIELDS, order_rows(store.iter_orders(start_date, end_date))
+    elif kind == "tickets":
+        fields, rows = TICKET_FIELDS, ticket_rows(store.iter_orders(start_date, end_date))
+    elif kind == "sales":
+        fields, rows = SALES_FIELDS, sales_rows(store.get_daily_sales(start_date, end_date))
+    else:
+        raise ValueError("Unsupported export. Choose from: orders, tickets, sales")
+    write = write_csv if file_format == "csv" else write_jsonl
+    if compress:
+        f = gzip.open(filename, "wt", encoding="utf-8", newline="")
+    else:
+        f = open(filename, "w", encoding="utf-8", newline="")
+    with f:
+        return write(rows, f, fields)
+
+
+# Export for finance: python -m Storage.export orders orders.csv.gz --from 2025-01-01 --to 2025-12-31
+def main():
+    parser = argparse.ArgumentParser(description="Export orders, tickets or daily sales to CSV or JSONL")
+    parser.add_argument("kind", choices=("orders", "tickets", "sales"))
+    parser.add_argument("filename", help="Ends in .csv or .jsonl, add .gz to compress")
+    parser.add_argument("--storage", choices=BACKENDS, default="pickle")
+    parser.add_argument("--users-file", default="users.pickle")
+    parser.add_argument("--orders-file", default="orders.pickle")
+    parser.add_argument("--db-file", default="bookings.db")
+    parser.add_argument("--from", dest="start_date", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="end_date", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    store = open_storage(args.storage, args.users_file, args.orders_file, args.db_file)
+    try:
+        count = export_data(store, args.kind, args.filename, args.start_date, args.end_date)
+    finally:
+        store.close()
+    print(f"Exported {count} row(s) to {args.filename}")
+
+
+if __name__ == "__main__":
+    main()
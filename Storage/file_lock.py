@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, msvcrt locks a byte of the file instead
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    # An exclusive lock shared by every process that opens the same lock file. It lives in
+    # a file of its own, so it still holds while the data files are swapped by a compaction.
+    # Taking it again from the thread that holds it is allowed, other threads wait their turn.
+    def __init__(self, filename):
+        self._filename = filename
+        self._file = None  # Opened on first use, kept open until close()
+        self._thread_lock = threading.RLock()  # Threads of this process take turns first
+        self._depth = 0  # How many times the holding thread has taken it
+
+    # Get the lock file name
+    def get_filename(self):
+        return self._filename
+
+    # Check if this process holds the lock
+    def is_held(self):
+        return self._depth > 0
+
+    # Wait for the lock, or with blocking=False give up at once. Returns whether it was taken.
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth == 0:
+            try:
+                taken = self._lock_file(blocking)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            if not taken:
+                self._thread_lock.release()
+                return False
+        self._depth += 1
+        return True
+
+    # Take the lock for this process rather than for one thread, until close(): it keeps
+    # other processes away from files for as long as they are open. Returns whether it was taken.
+    def hold(self, blocking=False):
+        with self._thread_lock:
+            return self._lock_file(blocking)
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _lock_file(self, blocking):
+        if self._file is None:
+            self._file = open(self._filename, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        self._file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.001)
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    # Let go of the lock file, the lock must not be held
+    def close(self):
+        with self._thread_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Name of the lock file kept next to a data file
+def lock_file_for(filename):
+    return os.fspath(filename) + ".lock"
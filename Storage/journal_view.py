@@ -0,0 +1,58 @@
+import os
+import pickle
+from abc import ABC, abstractmethod
+
+
+class JournalView(ABC):
+    # Base class for data worked out from the order journal and saved next to it
+    def __init__(self):
+        self._stamp = (None, 0)  # (file id, size) of the journal this view describes
+
+    # Get the journal stamp this view is up to date with
+    def get_stamp(self):
+        return self._stamp
+
+    # Record the journal stamp this view is up to date with
+    def set_stamp(self, stamp):
+        self._stamp = stamp
+
+    # Take one order read from the journal at the given offset into account
+    @abstractmethod
+    def record(self, offset, order):
+        raise NotImplementedError("Must override in subclass")
+
+    # Take back an order that was deleted after it was recorded
+    @abstractmethod
+    def forget(self, order):
+        raise NotImplementedError("Must override in subclass")
+
+    # Forget everything so the view can be rebuilt from the journal
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError("Must override in subclass")
+
+    @abstractmethod
+    def _get_state(self):
+        raise NotImplementedError("Must override in subclass")
+
+    @abstractmethod
+    def _set_state(self, state):
+        raise NotImplementedError("Must override in subclass")
+
+    # Save the view next to the journal so the next start does not have to rescan it
+    def save(self, filename):
+        temp_name = filename + ".tmp"
+        with open(temp_name, "wb") as f:
+            pickle.dump((self._stamp, self._get_state()), f)
+        os.replace(temp_name, filename)
+
+    # Load a saved view, returns False if there is none or it cannot be read
+    def load(self, filename):
+        try:
+            with open(filename, "rb") as f:
+                stamp, state = pickle.load(f)
+            self._set_state(state)  # Raises ValueError for a state saved in an older layout
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            return False
+        self._stamp = stamp
+        return True
@@ -0,0 +1,52 @@
+import os
+import sys
+
+from .backends import open_storage
+from .engine import order_key, user_key
+from .pickle_files import load_data
+from .sqlite_storage import SQLiteStorage
+
+
+def migrate_pickle_to_sqlite(users_file, orders_file, db_file):
+    """Copy every user and order from the pickle files into a new SQLite database"""
+    if os.path.exists(db_file):
+        raise FileExistsError(f"{db_file} already exists, refusing to migrate into it")
+    users = load_data(users_file, user_key)  # Deleted users and orders are left behind
+    orders = load_data(orders_file, order_key)
+    store = SQLiteStorage(db_file)
+    try:
+        store.add_users(users)
+        store.add_orders(orders)
+    finally:
+        store.close()
+    return len(users), len(orders)
+
+
+def migrate_orders_to_user_ids(backend, users_file, orders_file, db_file):
+    """Rewrite saved orders so each one keeps the id of its user instead of a copy of the user.
+    Returns how many orders were written and the size of the orders file (or database) before and after."""
+    path = db_file if backend == "sqlite" else orders_file
+    before = os.path.getsize(path) if os.path.exists(path) else 0
+    store = open_storage(backend, users_file, orders_file, db_file)
+    try:
+        count = store.rewrite_orders()
+    finally:
+        store.close()
+    return count, before, os.path.getsize(path) if os.path.exists(path) else 0
+
+
+# One-shot migrations:
+#   python -m Storage.migrate users.pickle orders.pickle bookings.db
+#   python -m Storage.migrate --user-ids pickle users.pickle orders.pickle bookings.db
+if __name__ == "__main__":
+    args = sys.argv[1:] or ["users.pickle", "orders.pickle", "bookings.db"]
+    if args[0] == "--user-ids":
+        if len(args) != 5:
+            sys.exit("Usage: python -m Storage.migrate --user-ids pickle|sqlite USERS_FILE ORDERS_FILE DB_FILE")
+        order_count, before, after = migrate_orders_to_user_ids(*args[1:])
+        print(f"Rewrote {order_count} order(s): {before:,} -> {after:,} bytes")
+        sys.exit()
+    if len(args) != 3:
+        sys.exit("Usage: python -m Storage.migrate USERS_FILE ORDERS_FILE DB_FILE")
+    user_count, order_count = migrate_pickle_to_sqlite(*args)
+    print(f"Migrated {user_count} user(s) and {order_count} order(s) into {args[2]}")
@@ -0,0 +1,75 @@
+from .journal_view import JournalView
+
+
+class OrderIndex(JournalView):
+    # Remembers where in the order journal each user's orders are stored
+    def __init__(self):
+        super().__init__()
+        self._locations = {}  # user_id -> {order_id: journal offset}
+        self._owners = {}  # order_id -> user_id
+        self._garbage = 0  # Records in the journal that are deleted orders or their tombstones
+
+    # Get the journal offsets of one user's orders
+    def get_locations(self, user_id):
+        return list(self._locations.get(user_id, {}).values())
+
+    # Get the journal offset of one order, None if it is not stored
+    def get_offset(self, order_id):
+        user_id = self._owners.get(order_id)
+        return None if user_id is None else self._locations[user_id][order_id]
+
+    # Get the offsets of every stored order written before a position in the journal
+    def get_offsets_before(self, end):
+        return {offset for orders in self._locations.values() for offset in orders.values() if offset < end}
+
+    # Check if an order is stored and not deleted
+    def has_order(self, order_id):
+        return order_id in self._owners
+
+    # Count the users that have at least one order
+    def get_user_count(self):
+        return len(self._locations)
+
+    # Count the orders that are stored and not deleted
+    def get_order_count(self):
+        return len(self._owners)
+
+    # Count the journal records compaction would drop
+    def get_garbage_count(self):
+        return self._garbage
+
+    # Remember where a new order was written
+    def add(self, user_id, order_id, offset):
+        self._locations.setdefault(user_id, {})[order_id] = offset
+        self._owners[order_id] = user_id
+
+    def record(self, offset, order):
+        self.add(order.get_user_id(), order.get_order_id(), offset)
+
+    # Forget a deleted order, its record and its tombstone are now garbage
+    def remove(self, order_id):
+        user_id = self._owners.pop(order_id, None)
+        if user_id is None:
+            return
+        orders = self._locations[user_id]
+        del orders[order_id]
+        if not orders:
+            del self._locations[user_id]
+        self._garbage += 2
+
+    def forget(self, order):
+        self.remove(order.get_order_id())
+
+    def clear(self):
+        self._locations = {}
+        self._owners = {}
+        self._garbage = 0
+
+    def _get_state(self):
+        return self._locations, self._garbage
+
+    def _set_state(self, state):
+        if not isinstance(state, tuple):
+            raise ValueError("Index saved before orders had tombstones, rebuild it")
+        self._locations, self._garbage = state
+        self._owners = {order_id: user_id for user_id, orders in self._locations.items() for order_id in orders}
@@ -0,0 +1,240 @@
+import io
+import os
+import pickle
+import shutil
+import sys
+import threading
+
+from .engine import order_key, user_key
+from .pickle_files import ADD, BATCH, frames_end, load_data, read_frames, write_records
+
+
+class OrderJournal:
+    # How often appended records are forced to disk
+    FSYNC_MODES = ("always", "batch", "never")
+
+    # Creates an append-only journal on top of an orders pickle file
+    def __init__(self, filename, fsync="batch", batch_size=32):
+        if fsync not in self.FSYNC_MODES:
+            raise ValueError(f"Unsupported fsync mode. Choose from: {', '.join(self.FSYNC_MODES)}")
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        self._filename = filename  # File holding the snapshot and the records after it
+        self._fsync = fsync  # always, batch or never
+        self._batch_size = batch_size  # Records written between two fsyncs in batch mode
+        self._unsynced = 0  # Records written since the last fsync
+        self._lock = threading.Lock()  # Keeps appends and compaction apart
+        # (file id, position) known to be the end of a whole record, from the last append or
+        # from a read that went to the end of the file; records are only appended there
+        self._clean = (None, 0)
+
+    # Get the key records are matched on, a DELETE record removes the item with the same key
+    def key(self, item):
+        return order_key(item)
+
+    # Get the journal file name
+    def get_filename(self):
+        return self._filename
+
+    # Get the fsync mode
+    def get_fsync_mode(self):
+        return self._fsync
+
+    # Get how many records have not been forced to disk yet
+    def get_unsynced_count(self):
+        return self._unsynced
+
+    # Add one order to the end of the journal without rewriting the others, returns where it was written.
+    # With kind=DELETE the record is a tombstone for an order written earlier.
+    def append(self, order, kind=ADD):
+        with self._lock:
+            self._trim_locked()
+            with open(self._filename, "ab") as f:
+                offset = f.tell()
+                pickle.dump((kind, order), f)
+                f.flush()
+                self._clean = (os.fstat(f.fileno()).st_ino, f.tell())
+                self._unsynced += 1
+                if self._fsync == "always" or (self._fsync == "batch" and self._unsynced >= self._batch_size):
+                    os.fsync(f.fileno())
+                    self._unsynced = 0
+        return offset
+
+    # Add several orders with one write, returns where each was written.
+    # After a crash either all of them are read back or none are.
+    def append_many(self, orders, kind=ADD):
+        if not orders:
+            return []
+        with self._lock:
+            self._trim_locked()
+            with open(self._filename, "ab") as f:
+                start = f.tell()
+                buffer = io.BytesIO()
+                pickle.dump((BATCH, len(orders)), buffer)
+                offsets = []
+                for order in orders:
+                    offsets.append(start + buffer.tell())
+                    pickle.dump((kind, order), buffer)
+                f.write(buffer.getvalue())
+                f.flush()
+                self._clean = (os.fstat(f.fileno()).st_ino, f.tell())
+                if self._fsync == "never":
+                    self._unsynced += len(orders)
+                else:
+                    os.fsync(f.fileno())  # One sync for the whole batch
+                    self._unsynced = 0
+        return offsets
+
+    # Cut off a record a crash left half written at the end of the file, so nothing is
+    # ever appended after it. Returns the number of bytes cut off.
+    def trim(self):
+        with self._lock:
+            return self._trim_locked()
+
+    def _trim_locked(self):
+        file_id, size = self.get_stamp()
+        if file_id is None or (file_id, size) == self._clean:
+            return 0
+        # Only what was written since the last known whole record is read, or the whole
+        # file the first time (or after another process replaced it)
+        start = self._clean[1] if self._clean[0] == file_id and self._clean[1] <= size else 0
+        with open(self._filename, "r+b") as f:
+            end = frames_end(f, start)
+            if end < size:
+                f.truncate(end)
+                os.fsync(f.fileno())
+        self._clean = (file_id, end)
+        return size - end
+
+    # Force every written record to disk
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._unsynced and os.path.exists(self._filename):
+            with open(self._filename, "ab") as f:
+                os.fsync(f.fileno())
+        self._unsynced = 0
+
+    # Read every order in the journal that has not been deleted
+    def load(self):
+        return load_data(self._filename, self.key)
+
+    # Go through the journal from a given position up to (not including) an end position,
+    # giving (offset, kind, order) for each record. Orders inside an old style list snapshot
+    # have no position of their own, their offset is None.
+    def scan_records(self, start=0, end=None):
+        try:
+            f = open(self._filename, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(start)
+            clean = start
+            for offset, record in read_frames(f):
+                clean = f.tell()  # The end of this record (of its whole batch for one in a batch)
+                if end is not None and offset >= end:
+                    return
+                if isinstance(record, list):
+                    for order in record:
+                        yield None, ADD, order
+                else:
+                    yield offset, record[0], record[1]
+            # Read up to the end of the file or a torn record, so the next append knows where to go
+            self._clean = (os.fstat(f.fileno()).st_ino, clean)
+
+    # Go through the orders written from a given position, giving (offset, order) for each one.
+    # Tombstones are left out, so deleted orders are still given.
+    def scan(self, start=0):
+        for offset, kind, order in self.scan_records(start):
+            if kind == ADD:
+                yield offset, order
+
+    # Read the orders stored at the given positions
+    def read_at(self, offsets):
+        orders = []
+        if not offsets:
+            return orders  # Nothing to read, and the file may not exist yet
+        with open(self._filename, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                orders.append(pickle.load(f)[1])
+        return orders
+
+    # Get the stamp of the journal up to the end of the last whole record read or written.
+    # It is the same as get_stamp() unless a crash left a torn record at the end.
+    def get_clean_stamp(self):
+        return self._clean
+
+    # Get the size of the journal and the file it lives in, used to tell if an index is stale
+    def get_stamp(self):
+        try:
+            info = os.stat(self._filename)
+        except FileNotFoundError:
+            return None, 0
+        return info.st_ino, info.st_size
+
+    # Replace the whole journal with a new list of orders, returns where each one was written
+    def save(self, orders):
+        with self._lock:
+            offsets = write_records(self._filename, orders)
+            self._unsynced = 0
+            self._clean = self.get_stamp()
+            return offsets
+
+    # Rewrite the journal with one record per live order, blocks appends until it is done
+    def compact(self):
+        with self._lock:
+            orders = load_data(self._filename, self.key)
+            write_records(self._filename, orders)
+            self._unsynced = 0
+            self._clean = self.get_stamp()
+            return len(orders)
+
+    # First half of compacting while appends carry on: write items to a new file next to
+    # the journal without taking the lock. written(offset, item) is called for each one.
+    # Returns the name of the new file.
+    def write_copy(self, items, written=None):
+        temp_name = self._filename + ".compact"
+        with open(temp_name, "wb") as f:
+            for item in items:
+                offset = f.tell()
+                pickle.dump((ADD, item), f)
+                if written is not None:
+                    written(offset, item)
+        return temp_name
+
+    # Second half: copy whatever was appended after `end` onto the new file and put it in
+    # place of the journal. `end` must be the end of a whole record, e.g. a size taken
+    # right after trim(). Returns where the copied records start in the new file.
+    def swap_in(self, temp_name, end):
+        with self._lock:
+            self._trim_locked()  # A torn record is not copied over
+            with open(temp_name, "ab") as out:
+                tail_start = out.tell()
+                try:
+                    with open(self._filename, "rb") as f:
+                        f.seek(end)
+                        shutil.copyfileobj(f, out)
+                except FileNotFoundError:
+                    pass
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_name, self._filename)
+            self._unsynced = 0
+            self._clean = self.get_stamp()
+        return tail_start
+
+
+class UserJournal(OrderJournal):
+    # The same append-only file for users, records are matched on the user id
+    def key(self, item):
+        return user_key(item)
+
+
+# Offline compaction: python -m Storage.order_journal orders.pickle
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "orders.pickle"
+    count = OrderJournal(path).compact()
+    print(f"Compacted {path}: {count} order(s)")
@@ -0,0 +1,507 @@
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+from array import array
+from collections import namedtuple
+from datetime import date
+
+from .engine import StorageInUseError, order_day
+from .file_lock import FileLock, lock_file_for
+from .order_journal import OrderJournal
+from .pickle_files import ADD, DELETE
+
+# Table file: a header, then one fixed-width record per order
+TABLE_MAGIC = b"ORDTBL01"
+TABLE_HEADER = struct.Struct("<8sI4x")  # magic, generation (names the payload file)
+# order_id, user_id, day (date ordinal, 0 if unknown), second of the day, tickets, total,
+# status, flags, where the pickled order starts in the payload file and how long it is
+RECORD = struct.Struct("<32s32siiidBB2xQI")
+FLAGS_AT = struct.calcsize("<32s32siiidB")  # Position of the flags byte inside a record
+OrderRow = namedtuple("OrderRow", "order_id user_id day second tickets total status flags offset length")
+STATUSES = ("pending", "confirmed", "cancelled")  # Stored as their position + 1, 0 for anything else
+DELETED = 1  # Flag set in place when an order is deleted
+
+# Index file: a header, then open addressing slots of (hash of the order id, record number)
+INDEX_MAGIC = b"ORDHIX01"
+INDEX_HEADER = struct.Struct("<8sIIQQ")  # magic, generation, closed cleanly, slot count, records covered
+SLOT = struct.Struct("<QQ")
+MAX_LOAD = 0.7  # Share of used slots that makes the index double in size
+MIN_SLOTS = 1024
+
+
+# Ids are stored as text, padded with zero bytes
+def _key(value):
+    key = b"" if value is None else str(value).encode()
+    if len(key) > 32:
+        raise ValueError(f"Id {value!r} is too long for the order table (32 bytes at most)")
+    return key
+
+
+# Stable across runs, unlike hash(); 0 marks an empty slot so it is never used
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def _when(order):
+    day = order_day(order)
+    if isinstance(day, str):
+        try:
+            day = date.fromisoformat(day)
+        except ValueError:
+            return 0, 0
+    if not isinstance(day, date):
+        return 0, 0
+    placed = order.get_order_date()
+    second = placed.hour * 3600 + placed.minute * 60 + placed.second if hasattr(placed, "hour") else 0
+    return day.toordinal(), second
+
+
+# Enough slots to stay under MAX_LOAD with this many records
+def _slots_for(count):
+    slots = MIN_SLOTS
+    while count >= slots * MAX_LOAD:
+        slots *= 2
+    return slots
+
+
+def _status_code(status):
+    return STATUSES.index(status) + 1 if status in STATUSES else 0
+
+
+class HashIndex:
+    # Finds the record of an order id in O(1) without reading the table: an open addressing
+    # hash table kept in its own file and used through mmap, so opening it reads nothing
+    def __init__(self, filename, generation, slots):
+        self._filename = filename
+        self._file = open(filename, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._generation = generation
+        self._slots = slots
+        self._covered = INDEX_HEADER.unpack_from(self._map)[4]  # Records inserted so far
+
+    # Make an empty index file, returns it opened
+    @classmethod
+    def create(cls, filename, generation, slots):
+        with open(filename, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, generation, 0, slots, 0))
+            f.truncate(INDEX_HEADER.size + slots * SLOT.size)  # Zero bytes are empty slots
+        return cls(filename, generation, slots)
+
+    # Open an index file, None if it is missing, damaged, for another table or was not closed cleanly
+    @classmethod
+    def open(cls, filename, generation, records):
+        try:
+            with open(filename, "rb") as f:
+                magic, saved_generation, clean, slots, covered = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+        if magic != INDEX_MAGIC or saved_generation != generation or not clean or covered > records:
+            return None
+        if os.path.getsize(filename) != INDEX_HEADER.size + slots * SLOT.size:
+            return None
+        index = cls(filename, generation, slots)
+        index._set_clean(0)  # Until close(), a crash leaves it to be built again
+        return index
+
+    # Get how many slots the index has
+    def get_slots(self):
+        return self._slots
+
+    # Get how many records are in the index
+    def get_covered(self):
+        return self._covered
+
+    # Check if the index is full enough to be built again with more slots
+    def is_full(self):
+        return self._covered >= self._slots * MAX_LOAD
+
+    # Remember that the record with the given number holds this key
+    def insert(self, key, record):
+        h = _hash(key)
+        slot = h % self._slots
+        while True:
+            position = INDEX_HEADER.size + slot * SLOT.size
+            saved_hash, saved_record = SLOT.unpack_from(self._map, position)
+            if saved_hash == 0:
+                SLOT.pack_into(self._map, position, h, record)
+                break
+            if saved_hash == h and saved_record == record:
+                break  # Already there, e.g. caught up again after a crash
+            slot = (slot + 1) % self._slots
+        self._covered = max(self._covered, record + 1)
+
+    # Go through the record numbers that may hold a key, the caller checks each one
+    def candidates(self, key):
+        h = _hash(key)
+        slot = h % self._slots
+        while True:
+            saved_hash, saved_record = SLOT.unpack_from(self._map, INDEX_HEADER.size + slot * SLOT.size)
+            if saved_hash == 0:
+                return
+            if saved_hash == h:
+                yield saved_record
+            slot = (slot + 1) % self._slots
+
+    def _set_clean(self, clean):
+        INDEX_HEADER.pack_into(self._map, 0, INDEX_MAGIC, self._generation, clean, self._slots, self._covered)
+
+    # Write everything out and mark the index as safe to open again
+    def close(self):
+        self._set_clean(1)
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+class OrderTable:
+    # Orders kept as fixed-width records (id, user, day, tickets, total, status) read through
+    # mmap, with each pickled order in a payload file next to it and a HashIndex on the order
+    # id. One order is found and read without touching the others, reports scan the
+    # records without unpickling anything, and deletes flip a flag in place.
+    # Only one process can have a table open, a second one is refused.
+    FSYNC_MODES = OrderJournal.FSYNC_MODES
+
+    def __init__(self, filename, fsync="batch", batch_size=32, lock=None):
+        if fsync not in self.FSYNC_MODES:
+            raise ValueError(f"Unsupported fsync mode. Choose from: {', '.join(self.FSYNC_MODES)}")
+        self._filename = filename  # Fixed-width records
+        self._fsync = fsync  # always, batch or never, as for the order journal
+        self._batch_size = batch_size
+        self._unsynced = 0
+        # An engine passes its own lock, so record numbers it holds on to stay valid
+        # until it lets go: compact() renumbers the records with the lock held
+        self._lock = lock or threading.RLock()
+        self._deleted = None  # Deleted records, counted when first asked for
+        self._deleted_meanwhile = None  # Records deleted while compact() copies the table
+        self._owner = FileLock(lock_file_for(filename))  # Held until close(), across compactions
+        if not self._owner.hold():
+            self._owner.close()
+            raise StorageInUseError(f"{filename} is already open in another process")
+        try:
+            self._open()
+        except BaseException:
+            self._owner.close()
+            raise
+
+    def _open(self):
+        if not os.path.exists(self._filename):
+            with open(self._filename, "wb") as f:
+                f.write(TABLE_HEADER.pack(TABLE_MAGIC, 0))
+        self._records = open(self._filename, "r+b")
+        try:
+            magic, self._generation = TABLE_HEADER.unpack(self._records.read(TABLE_HEADER.size))
+        except struct.error:
+            magic = None
+        if magic != TABLE_MAGIC:
+            self._records.close()
+            raise ValueError(f"{self._filename} is not an order table")
+        size = os.fstat(self._records.fileno()).st_size
+        self._payload = open(self._payload_name(self._generation), "a+b")
+        self._count = self._whole_records((size - TABLE_HEADER.size) // RECORD.size, self._payload_size())
+        if TABLE_HEADER.size + self._count * RECORD.size != size:
+            self._records.truncate(TABLE_HEADER.size + self._count * RECORD.size)  # A write was cut off half way
+        self._records_map = self._payload_map = None
+        index_name = self._filename + ".hix"
+        self._index = HashIndex.open(index_name, self._generation, self._count)
+        if self._index is None:
+            self._index = self._build_index(index_name, self._generation, self._count)
+        else:
+            self._index_records(self._index, self._index.get_covered(), self._count)
+
+    # Leave out the last records if their orders are not all in the payload file, a crash
+    # can keep records whose payload never made it to disk. Returns how many records are kept.
+    def _whole_records(self, count, payload_size):
+        while count:
+            self._records.seek(TABLE_HEADER.size + (count - 1) * RECORD.size)
+            row = OrderRow._make(RECORD.unpack(self._records.read(RECORD.size)))
+            if row.offset + row.length <= payload_size:
+                break
+            count -= 1
+        return count
+
+    def _payload_name(self, generation):
+        return f"{self._filename}.{generation}.dat"
+
+    # Get the table file name
+    def get_filename(self):
+        return self._filename
+
+    # Get how many records the table holds, deleted ones included
+    def get_count(self):
+        return self._count
+
+    # Get how many records are deleted orders waiting for compact()
+    def get_deleted_count(self):
+        with self._lock:
+            if self._deleted is None:
+                self._deleted = sum(1 for _, row in self.iter_rows() if row.flags & DELETED)
+            return self._deleted
+
+    # The records as one memoryview over the mapped file, mapped again once it has grown
+    def _records_view(self):
+        end = TABLE_HEADER.size + self._count * RECORD.size
+        if self._records_map is None or len(self._records_map) < end:
+            self._records_map = mmap.mmap(self._records.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._records_map)[TABLE_HEADER.size:end]
+
+    def _payload_view(self, end):
+        if self._payload_map is None or len(self._payload_map) < end:
+            self._payload_map = mmap.mmap(self._payload.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._payload_map)
+
+    # Put records [start, end) in an index, building a bigger one whenever it fills up
+    def _index_records(self, index, start, end, view=None):
+        view = view if view is not None else self._records_view()
+        for record in range(start, end):
+            order_id = RECORD.unpack_from(view, record * RECORD.size)[0].rstrip(b"\0")
+            index.insert(order_id, record)
+            if index.is_full():
+                return self._index_records(self._grow_index(index, record + 1, view), record + 1, end, view)
+        return index
+
+    def _build_index(self, filename, generation, count, slots=None):
+        slots = slots or _slots_for(count)
+        index = HashIndex.create(filename + ".tmp", generation, slots)
+        index = self._index_records(index, 0, count)
+        index.close()
+        os.replace(filename + ".tmp", filename)
+        return HashIndex.open(filename, generation, count)
+
+    def _grow_index(self, index, count, view):
+        slots = index.get_slots() * 2
+        index.close()
+        bigger = HashIndex.create(self._filename + ".hix.grow", self._generation, slots)
+        bigger = self._index_records(bigger, 0, count, view)
+        bigger.close()
+        os.replace(self._filename + ".hix.grow", self._filename + ".hix")
+        return HashIndex.open(self._filename + ".hix", self._generation, count)
+
+    # Get the record of an order as an OrderRow
+    def get_row(self, record):
+        with self._lock:
+            return OrderRow._make(RECORD.unpack_from(self._records_view(), record * RECORD.size))
+
+    # Find the record number of a stored, not deleted order, None if there is none
+    def find(self, order_id):
+        key = order_id if isinstance(order_id, bytes) else _key(order_id)
+        with self._lock:
+            view = self._records_view()
+            for record in self._index.candidates(key):
+                order_id, *_, flags, _, _ = RECORD.unpack_from(view, record * RECORD.size)
+                if order_id.rstrip(b"\0") == key and not flags & DELETED:
+                    return record
+        return None
+
+    # Read the order stored in a record
+    def read(self, record):
+        with self._lock:
+            row = self.get_row(record)
+            view = self._payload_view(row.offset + row.length)
+            return pickle.loads(view[row.offset:row.offset + row.length])
+
+    # Find and read one order, None if it is not stored
+    def get_order(self, order_id):
+        record = self.find(order_id)
+        return None if record is None else self.read(record)
+
+    # Go through the records without unpickling any order, giving (record number, OrderRow).
+    # Only the records there when the walk started are given, or the first `end` of them.
+    def iter_rows(self, end=None):
+        with self._lock:
+            view = self._records_view()
+        if end is not None:
+            view = view[:end * RECORD.size]
+        for record, fields in enumerate(RECORD.iter_unpack(view)):
+            yield record, OrderRow._make(fields)
+
+    # Add orders to the end of the table, returns their record numbers
+    def append_many(self, orders):
+        if not orders:
+            return []
+        payloads = [pickle.dumps(order) for order in orders]
+        with self._lock:
+            self._payload.seek(0, os.SEEK_END)
+            offset = self._payload.tell()
+            records = []
+            for order, payload in zip(orders, payloads):
+                day, second = _when(order)
+                records.append(RECORD.pack(_key(order.get_order_id()), _key(order.get_user_id()), day, second,
+                                           order.get_ticket_count(), order.get_total(),
+                                           _status_code(order.get_status()), 0, offset, len(payload)))
+                offset += len(payload)
+            self._payload.write(b"".join(payloads))
+            self._payload.flush()
+            if self._fsync != "never":
+                os.fsync(self._payload.fileno())  # On disk before the records that point at it
+            self._records.seek(TABLE_HEADER.size + self._count * RECORD.size)
+            self._records.write(b"".join(records))
+            self._records.flush()
+            first = self._count
+            self._count += len(orders)
+            self._index = self._index_records(self._index, first, self._count)
+            self._unsynced += len(orders)
+            if self._fsync == "always" or (self._fsync == "batch" and self._unsynced >= self._batch_size):
+                self._sync_locked()
+            return list(range(first, self._count))
+
+    def append(self, order):
+        return self.append_many([order])[0]
+
+    # Mark a record as deleted, in place
+    def delete(self, record):
+        with self._lock:
+            position = TABLE_HEADER.size + record * RECORD.size + FLAGS_AT
+            self._records.seek(position)
+            flags = self._records.read(1)[0]
+            if flags & DELETED:
+                return
+            self._records.seek(position)
+            self._records.write(bytes((flags | DELETED,)))
+            self._records.flush()
+            if self._deleted is not None:
+                self._deleted += 1
+            if self._deleted_meanwhile is not None:
+                self._deleted_meanwhile.append(record)
+            self._unsynced += 1
+            if self._fsync == "always":
+                self._sync_locked()
+
+    # Force every write to disk
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._unsynced:
+            os.fsync(self._payload.fileno())
+            os.fsync(self._records.fileno())
+        self._unsynced = 0
+
+    # Copy the live records to a new generation of the files and swap it in, returns how many
+    # deleted records were dropped. The copy and its index are made without the lock, so
+    # orders can still be added and deleted meanwhile; they are carried over while the lock
+    # is held at the end. With repickle=True every order is pickled again in the current layout.
+    def compact(self, repickle=False):
+        with self._lock:
+            self._sync_locked()
+            end = self._count
+            generation = self._generation + 1
+            payload_view = self._payload_view(self._payload_size()) if end else None
+            self._deleted_meanwhile = []
+        temp_name = self._filename + ".compact"
+        index_name = self._filename + ".hix.compact"
+        moved = array("q", [-1]) * end  # New record number of each old one, -1 if dropped
+        try:
+            index = HashIndex.create(index_name, generation, _slots_for(end - self.get_deleted_count() + MIN_SLOTS))
+            with open(temp_name, "wb") as records, open(self._payload_name(generation), "wb") as payload:
+                records.write(TABLE_HEADER.pack(TABLE_MAGIC, generation))
+                kept = 0
+                for record, row in self.iter_rows(end):
+                    if not row.flags & DELETED:
+                        moved[record] = kept
+                        kept = self._copy_record(row, payload_view, records, payload, index, repickle, kept)
+                with self._lock:
+                    # Records added while copying, then deletes made while copying
+                    tail = self._records_view()[end * RECORD.size:]
+                    payload_view = self._payload_view(self._payload_size()) if len(tail) else None
+                    for fields in RECORD.iter_unpack(tail):
+                        kept = self._copy_record(fields, payload_view, records, payload, index, repickle, kept)
+                    for record in self._deleted_meanwhile:
+                        if record < end and moved[record] >= 0:
+                            records.seek(TABLE_HEADER.size + moved[record] * RECORD.size + FLAGS_AT)
+                            records.write(bytes((DELETED,)))
+                    records.flush()
+                    payload.flush()
+                    os.fsync(payload.fileno())
+                    os.fsync(records.fileno())
+                    full = index.is_full()
+                    index.close()
+                    if full:
+                        os.remove(index_name)  # Built again with more slots when the table is opened
+                    else:
+                        os.replace(index_name, self._filename + ".hix")
+                    dropped = self._count - kept
+                    self._swap_in(temp_name)
+                    return dropped
+        finally:
+            self._deleted_meanwhile = None
+
+    def _payload_size(self):
+        return os.fstat(self._payload.fileno()).st_size
+
+    def _copy_record(self, fields, payload_view, records, payload, index, repickle, kept):
+        *columns, offset, length = fields
+        data = payload_view[offset:offset + length]
+        if repickle:
+            data = pickle.dumps(pickle.loads(data))
+        records.write(RECORD.pack(*columns, payload.tell(), len(data)))
+        payload.write(data)
+        index.insert(fields[0].rstrip(b"\0"), kept)
+        return kept + 1
+
+    def _swap_in(self, temp_name):
+        old_payload = self._payload_name(self._generation)
+        self._close_files()
+        os.replace(temp_name, self._filename)  # The new records name the new payload file
+        try:
+            os.remove(old_payload)
+        except OSError:
+            pass  # Still mapped somewhere (e.g. on Windows), it is only wasted space
+        self._deleted = None
+        self._open()
+
+    def _close_files(self):
+        self._index.close()
+        for mapped in (self._records_map, self._payload_map):
+            try:
+                if mapped is not None:
+                    mapped.close()
+            except BufferError:
+                pass  # A walk over the rows still uses it, it goes once that is done
+        self._records.close()
+        self._payload.close()
+
+    def close(self):
+        with self._lock:
+            self._sync_locked()
+            self._close_files()
+            self._owner.close()
+
+
+def convert_journal(orders_file, table_file):
+    """Copy the orders of a pickle journal into a new order table, returns how many were copied"""
+    if os.path.exists(table_file):
+        raise FileExistsError(f"{table_file} already exists, refusing to convert into it")
+    journal = OrderJournal(orders_file)
+    deleted = {}
+    for offset, kind, order in journal.scan_records():
+        if kind == DELETE:
+            deleted[order.get_order_id()] = offset
+    table = OrderTable(table_file, fsync="never")
+    count = 0
+    try:
+        batch = []
+        for offset, kind, order in journal.scan_records():
+            # Orders in an old style list snapshot have no offset and cannot have been deleted
+            if kind == ADD and (offset is None or deleted.get(order.get_order_id(), -1) < offset):
+                batch.append(order)
+            if len(batch) == 1000:
+                count += len(table.append_many(batch))
+                batch = []
+        count += len(table.append_many(batch))
+        table.sync()
+    finally:
+        table.close()
+    return count
+
+
+# One-shot conversion: python -m Storage.order_table orders.pickle orders.tbl
+if __name__ == "__main__":
+    args = sys.argv[1:] or ["orders.pickle", "orders.tbl"]
+    if len(args) != 2:
+        sys.exit("Usage: python -m Storage.order_table ORDERS_FILE TABLE_FILE")
+    print(f"Converted {convert_journal(*args)} order(s) into {args[1]}")
@@ -0,0 +1,97 @@
+import os
+import pickle
+
+# Kinds of records that can follow the snapshot in a data file
+ADD = "add"  # (ADD, item) adds an item, or replaces the earlier one with the same key
+DELETE = "delete"  # (DELETE, item) is a tombstone: the item with the same key is gone
+BATCH = "batch"  # (BATCH, n) is followed by n records that only count if all of them were written
+# What unpickling the bytes of a torn record can raise, a whole record never does
+TORN_ERRORS = (EOFError, pickle.UnpicklingError, UnicodeDecodeError, OverflowError, MemoryError)
+
+
+def read_frames(f):
+    """Go through the records of an open data file, giving (offset, record) for each one.
+    The records of a batch are only given once the whole batch has been read."""
+    while True:
+        offset = f.tell()
+        try:
+            record = pickle.load(f)
+            if isinstance(record, tuple) and record[0] == BATCH:
+                batch = []
+                for _ in range(record[1]):
+                    batch.append((f.tell(), pickle.load(f)))
+        except TORN_ERRORS:
+            # A write was cut off half way (e.g. power loss), ignore the torn tail
+            return
+        if isinstance(record, tuple) and record[0] == BATCH:
+            yield from batch
+        else:
+            yield offset, record
+
+
+def frames_end(f, start=0):
+    """Find where the last whole record after `start` ends in an open data file.
+    Anything after it is a torn write."""
+    f.seek(start)
+    end = start
+    for _ in read_frames(f):
+        end = f.tell()
+    return end
+
+
+def read_records(filename, key=None):
+    """Read a data file and replay any journal records on top of its snapshot.
+    Records are matched on key(item), so later ones replace or delete earlier ones;
+    without a key every ADD record is kept."""
+    if key is None:
+        items = []
+        with open(filename, "rb") as f:
+            for _, record in read_frames(f):
+                if isinstance(record, list):
+                    items = record  # A full snapshot replaces everything before it
+                elif record[0] == ADD:
+                    items.append(record[1])
+        return items
+    items = {}
+    with open(filename, "rb") as f:
+        for _, record in read_frames(f):
+            if isinstance(record, list):
+                items = {key(item): item for item in record}
+            elif record[0] == ADD:
+                items[key(record[1])] = record[1]
+            elif record[0] == DELETE:
+                items.pop(key(record[1]), None)
+    return list(items.values())
+
+
+def write_records(filename, items):
+    """Write items as one journal record each and return where every record starts"""
+    temp_name = filename + ".tmp"
+    offsets = []
+    with open(temp_name, "wb") as f:
+        for item in items:
+            offsets.append(f.tell())
+            pickle.dump((ADD, item), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_name, filename)
+    return offsets
+
+
+def load_data(filename, key=None):
+    """Load data from a pickle file"""
+    try:
+        return read_records(filename, key)
+    except (FileNotFoundError, EOFError):
+        return []
+
+
+def save_data(filename, data):
+    """Save data to a pickle file"""
+    # Write to a temporary file first so a crash never leaves a half written snapshot
+    temp_name = filename + ".tmp"
+    with open(temp_name, "wb") as f:
+        pickle.dump(list(data), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_name, filename)
@@ -0,0 +1,280 @@
+from .engine import StorageEngine, in_range, order_day
+from .file_lock import FileLock, lock_file_for
+from .order_index import OrderIndex
+from .order_journal import OrderJournal
+from .pickle_files import ADD, DELETE
+from .sales_aggregates import SalesAggregates
+from .user_store import UserStore
+
+
+class PickleStorage(StorageEngine):
+    # Keeps users and orders in the original pickle files. Nothing is ever rewritten in
+    # place: changes and deletes are appended as records, and compact() drops the dead
+    # ones in the background while bookings carry on. Several processes can share the
+    # files: each change is written under a lock file, after taking in whatever the
+    # other processes appended since this one last looked.
+    def __init__(self, users_file, orders_file, fsync="batch"):
+        # Keeps threads and other processes apart while records are read in or appended,
+        # and from the swap at the end of a compaction
+        self._lock = FileLock(lock_file_for(orders_file))
+        self._compact_lock = FileLock(lock_file_for(orders_file + ".compact"))  # One compaction at a time
+        self._user_store = UserStore(users_file, self._lock)
+        self._journal = OrderJournal(orders_file, fsync=fsync)  # Orders are appended, never rewritten per booking
+        self._order_index = OrderIndex()  # user_id -> where their orders sit in the journal
+        self._sales = SalesAggregates()  # Running per-day sales totals
+        # Data worked out from the journal, and the file each one is saved in
+        self._views = {self._order_index: orders_file + ".idx", self._sales: orders_file + ".sales"}
+        # Nothing is read until it is first needed, so opening the store is instant however
+        # big the files are, and a run that never looks at orders never reads the index
+        self._views_loaded = False
+        self._seen = (None, 0)  # Stamp of the journal the views have taken in
+
+    # Get the order journal
+    def get_journal(self):
+        return self._journal
+
+    # Get the users journal
+    def get_user_journal(self):
+        return self._user_store.get_journal()
+
+    # Get the per-user order index
+    def get_order_index(self):
+        self._ensure_views()
+        return self._order_index
+
+    # Get the running sales totals
+    def get_sales_aggregates(self):
+        self._ensure_views()
+        return self._sales
+
+    # Check if the users file has been read yet
+    def is_users_loaded(self):
+        return self._user_store.is_loaded()
+
+    # Check if the index and sales totals have been read yet
+    def is_views_loaded(self):
+        return self._views_loaded
+
+    # Read the views in on first use, afterwards take in what other processes appended
+    def _ensure_views(self):
+        with self._lock:
+            if self._views_loaded:
+                self._catch_up()
+            else:
+                self._open_views()
+                self._views_loaded = True
+
+    def _catch_up(self):
+        stamp = self._journal.get_stamp()
+        if stamp == self._seen:
+            return
+        file_id, size = stamp
+        if file_id != self._seen[0] or size < self._seen[1]:
+            # Another process compacted the journal, every position has moved
+            self._open_views()
+        else:
+            self._apply(self._journal.scan_records(self._seen[1]), self._views)
+            self._seen = self._journal.get_clean_stamp()
+
+    def _open_views(self):
+        file_id, size = self._journal.get_stamp()
+        stamps = set()
+        for view, filename in self._views.items():
+            saved_id, saved_size = view.get_stamp() if view.load(filename) else (None, -1)
+            stamps.add((saved_id, saved_size) if saved_id == file_id and saved_size <= size else None)
+        if len(stamps) == 1 and None not in stamps:
+            start = stamps.pop()[1]  # Only the records written after they were saved need reading
+        else:
+            start = 0
+            for view in self._views:
+                view.clear()
+        self._apply(self._journal.scan_records(start), self._views)
+        self._seen = self._journal.get_clean_stamp()
+
+    # Take journal records into account in the given views
+    def _apply(self, records, views):
+        index = next(view for view in views if isinstance(view, OrderIndex))
+        for offset, kind, order in records:
+            if offset is None:
+                # Old files hold one big list, split it so every order gets its own position
+                self._journal.compact()
+                self.rebuild_views()
+                return
+            if kind == ADD:
+                for view in views:
+                    view.record(offset, order)
+            elif kind == DELETE and index.has_order(order.get_order_id()):
+                for view in views:
+                    view.forget(order)
+
+    # Work out the index and sales totals again from the journal alone
+    def rebuild_views(self):
+        with self._lock:
+            self._views_loaded = True
+            for view in self._views:
+                view.clear()
+            self._apply(self._journal.scan_records(), self._views)
+            self._seen = self._journal.get_clean_stamp()
+
+    def get_users(self):
+        return self._user_store.get_users()
+
+    def find_user_by_email(self, email):
+        return self._user_store.find_by_email(email)
+
+    def find_user_by_id(self, user_id):
+        return self._user_store.find_by_id(user_id)
+
+    def add_user(self, user):
+        self._user_store.add(user)
+
+    def get_user_version(self, user_id):
+        return self._user_store.get_version(user_id)
+
+    def update_user(self, user, expected_version=None):
+        self._user_store.update(user, expected_version)
+
+    def delete_user(self, user_id):
+        self._user_store.delete(user_id)
+
+    def get_orders(self):
+        return self._journal.load()
+
+    def get_user_orders(self, user_id):
+        with self._lock:  # Offsets only hold until the next compaction
+            self._ensure_views()
+            return self._journal.read_at(self._order_index.get_locations(user_id))
+
+    def find_order(self, order_id):
+        with self._lock:
+            self._ensure_views()
+            offset = self._order_index.get_offset(order_id)
+            return None if offset is None else self._journal.read_at([offset])[0]
+
+    def get_orders_between(self, start_date, end_date):
+        return [o for o in self._journal.load() if start_date <= order_day(o) <= end_date]
+
+    # Read straight from the journal, one order in memory at a time
+    def iter_orders(self, start_date=None, end_date=None):
+        self._ensure_views()
+        bounded = start_date is not None or end_date is not None
+        for _, order in self._journal.scan():
+            if not self._order_index.has_order(order.get_order_id()):
+                continue  # Deleted, its tombstone comes later in the journal
+            if not bounded or in_range(order_day(order), start_date, end_date):
+                yield order
+
+    def get_daily_sales(self, start_date=None, end_date=None):
+        self._ensure_views()
+        return self._sales.get_daily_sales(start_date, end_date)
+
+    def add_order(self, order):
+        with self._lock:
+            if self._views_loaded:  # Otherwise they pick the order up from the journal when opened
+                self._catch_up()
+            offset = self._journal.append(order)
+            if self._views_loaded:
+                for view in self._views:
+                    view.record(offset, order)
+                self._seen = self._journal.get_stamp()
+
+    # Save several new orders with a single write to the journal
+    def add_orders(self, orders):
+        with self._lock:
+            if self._views_loaded:
+                self._catch_up()
+            offsets = self._journal.append_many(orders)
+            if self._views_loaded:
+                for offset, order in zip(offsets, orders):
+                    for view in self._views:
+                        view.record(offset, order)
+                self._seen = self._journal.get_stamp()
+
+    def delete_order(self, order_id):
+        with self._lock:
+            self._ensure_views()
+            offset = self._order_index.get_offset(order_id)
+            return [] if offset is None else self._delete_at([offset])
+
+    def delete_user_orders(self, user_id):
+        with self._lock:
+            self._ensure_views()
+            return self._delete_at(self._order_index.get_locations(user_id))
+
+    # Write a tombstone for the orders stored at the given offsets. The tombstone holds the
+    # whole order, so the sales totals can be taken back when the journal is read again.
+    def _delete_at(self, offsets):
+        removed = self._journal.read_at(offsets)
+        if len(removed) == 1:
+            self._journal.append(removed[0], kind=DELETE)
+        else:
+            self._journal.append_many(removed, kind=DELETE)
+        for order in removed:
+            for view in self._views:
+                view.forget(order)
+        self._seen = self._journal.get_stamp()
+        return removed
+
+    # Share of the records in both files that compact() would drop
+    def get_garbage_ratio(self):
+        with self._lock:
+            self._ensure_views()
+            garbage, total = self._user_store.get_garbage()
+            garbage += self._order_index.get_garbage_count()
+            total += self._order_index.get_order_count() + self._order_index.get_garbage_count()
+            return garbage / total if total else 0.0
+
+    # Drop deleted orders and users and their tombstones. The files are copied without the
+    # lock, so bookings carry on; only the final swap, which also copies anything written in
+    # the meantime, holds it. Returns how many records were dropped.
+    def compact(self):
+        with self._compact_lock:
+            return self._compact_orders() + self._user_store.compact()
+
+    def _compact_orders(self):
+        with self._lock:
+            self._ensure_views()
+            dropped = self._order_index.get_garbage_count()  # Every record before `end` is live or garbage
+            if not dropped:
+                return 0
+            self._journal.sync()
+            self._journal.trim()
+            end = self._journal.get_stamp()[1]  # The end of a whole record
+            live = self._order_index.get_offsets_before(end)
+        # Records before `end` never change, so they are copied without the lock
+        index = OrderIndex()
+        orders = (order for offset, kind, order in self._journal.scan_records(0, end) if offset in live)
+        temp_name = self._journal.write_copy(orders, index.record)
+        with self._lock:
+            self._catch_up()  # So the sales totals count everything the swap copies over
+            tail_start = self._journal.swap_in(temp_name, end)
+            # The sales totals already count what was written meanwhile, only the index needs it
+            self._apply(self._journal.scan_records(tail_start), [index])
+            self._views = {index: self._views[self._order_index], self._sales: self._views[self._sales]}
+            self._order_index = index
+            self._seen = self._journal.get_clean_stamp()
+            self._save_views()  # Other processes pick these up instead of reading the new journal
+        return dropped
+
+    # Rewrites the whole journal, which also drops deleted orders
+    def rewrite_orders(self):
+        with self._compact_lock, self._lock:
+            count = self._journal.compact()
+            self.rebuild_views()
+            self._save_views()
+            return count
+
+    # Save the views with the stamp of the journal they have taken in, which is behind the
+    # file when other processes appended since; the next open reads those records again
+    def _save_views(self):
+        for view, filename in self._views.items():
+            view.set_stamp(self._seen)
+            view.save(filename)
+
+    def close(self):
+        with self._lock:
+            self._journal.sync()
+            if self._views_loaded:  # Otherwise the saved files are still up to date with what was read
+                self._save_views()
+        self._lock.close()
+        self._compact_lock.close()
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+from .engine import in_range, order_day
+from .journal_view import JournalView
+
+
+class SalesAggregates(JournalView):
+    # Running per-day sales totals, updated as orders are booked and deleted
+    def __init__(self):
+        super().__init__()
+        self._days = {}  # date -> [tickets, orders, revenue]
+
+    # Add one order to the totals of its day
+    def add_order(self, order):
+        self.add_sale(order_day(order), order.get_ticket_count(), 1, order.get_total())
+
+    # Take one order back out of the totals of its day
+    def remove_order(self, order):
+        self.add_sale(order_day(order), -order.get_ticket_count(), -1, -order.get_total())
+
+    # Change the totals of one day
+    def add_sale(self, day, tickets, orders, revenue):
+        totals = self._days.setdefault(day, [0, 0, 0])
+        totals[0] += tickets
+        totals[1] += orders
+        totals[2] += revenue
+        if totals[1] <= 0:
+            del self._days[day]  # Nothing left on this day
+
+    def record(self, offset, order):
+        self.add_order(order)
+
+    def forget(self, order):
+        self.remove_order(order)
+
+    def clear(self):
+        self._days = {}
+
+    # Get (tickets, orders, revenue) per day, for every day or only the days in a range
+    def get_daily_sales(self, start_date=None, end_date=None):
+        if start_date is None and end_date is None:
+            return {day: tuple(totals) for day, totals in sorted(self._days.items(), key=lambda item: str(item[0]))}
+        if start_date is None or end_date is None:  # One side open, only days that are dates can be compared
+            return {day: tuple(totals) for day, totals in sorted(self._days.items(), key=lambda item: str(item[0]))
+                    if isinstance(day, date) and in_range(day, start_date, end_date)}
+        daily = {}
+        day = start_date
+        while day <= end_date:
+            if day in self._days:
+                daily[day] = tuple(self._days[day])
+            day += timedelta(days=1)
+        return daily
+
+    def _get_state(self):
+        return self._days
+
+    def _set_state(self, state):
+        self._days = state
+
+
+# Add up (tickets, orders, revenue) over several days
+def sum_daily_sales(daily):
+    tickets = orders = revenue = 0
+    for day_tickets, day_orders, day_revenue in daily.values():
+        tickets += day_tickets
+        orders += day_orders
+        revenue += day_revenue
+    return tickets, orders, revenue
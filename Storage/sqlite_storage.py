@@ -0,0 +1,292 @@
+import pickle
+import sqlite3
+import threading
+from datetime import date
+
+from .engine import ConflictError, DuplicateEmailError, StorageEngine, email_key, order_day
+
+# Objects are stored pickled, the other columns only exist so they can be indexed
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    seq INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    email TEXT NOT NULL COLLATE NOCASE,
+    data BLOB NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    user_id TEXT,
+    order_date TEXT,
+    tickets INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders(order_date);
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    day TEXT PRIMARY KEY,
+    tickets INTEGER NOT NULL,
+    orders INTEGER NOT NULL,
+    revenue REAL NOT NULL
+);
+"""
+
+INSERT_USER = "INSERT INTO users (user_id, email, data) VALUES (?, ?, ?)"
+INSERT_ORDER = "INSERT INTO orders (order_id, user_id, order_date, tickets, total, data) VALUES (?, ?, ?, ?, ?, ?)"
+
+# Adds to the running totals of one day, creating the day if needed
+ADD_SALE = """
+INSERT INTO sales_daily (day, tickets, orders, revenue) VALUES (?, ?, ?, ?)
+ON CONFLICT(day) DO UPDATE SET tickets = tickets + excluded.tickets,
+                               orders = orders + excluded.orders,
+                               revenue = revenue + excluded.revenue
+"""
+
+
+class SQLiteStorage(StorageEngine):
+    # Keeps users and orders in an indexed SQLite database
+    def __init__(self, db_file):
+        self._db_file = db_file
+        # The connection may be used from worker threads, the lock keeps them in turn
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        # Databases made before users had versions are missing the column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(users)")]
+        if "version" not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # Databases made before emails were unique have a plain index on them. One that
+        # already holds an email twice keeps it, the first of those users is found at login.
+        unique = {row[1]: row[2] for row in self._conn.execute("PRAGMA index_list(users)")}
+        if not unique.get("idx_users_email", 1):
+            try:
+                with self._conn:
+                    self._conn.execute("DROP INDEX idx_users_email")
+                    self._conn.execute("CREATE UNIQUE INDEX idx_users_email ON users(email)")
+            except sqlite3.IntegrityError:
+                pass
+        # Databases made before the sales totals existed are missing two order columns
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(orders)")]
+        if "tickets" in columns:
+            return
+        with self._conn:
+            self._conn.execute("ALTER TABLE orders ADD COLUMN tickets INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("ALTER TABLE orders ADD COLUMN total REAL NOT NULL DEFAULT 0")
+            for seq, data in self._conn.execute("SELECT seq, data FROM orders").fetchall():
+                order = pickle.loads(data)
+                self._conn.execute("UPDATE orders SET tickets = ?, total = ? WHERE seq = ?",
+                                   (order.get_ticket_count(), order.get_total(), seq))
+        self.rebuild_sales()
+
+    # Work out the per-day sales totals again from the orders table
+    def rebuild_sales(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sales_daily")
+            self._conn.execute("INSERT INTO sales_daily (day, tickets, orders, revenue) "
+                               "SELECT order_date, SUM(tickets), COUNT(*), SUM(total) FROM orders GROUP BY order_date")
+
+    # Get the database file name
+    def get_db_file(self):
+        return self._db_file
+
+    def _fetch(self, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    def _write(self, sql, params=()):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def get_users(self):
+        return self._fetch("SELECT data FROM users ORDER BY seq")
+
+    def find_user_by_email(self, email):
+        users = self._fetch("SELECT data FROM users WHERE email = ? LIMIT 1", (email_key(email),))
+        return users[0] if users else None
+
+    def find_user_by_id(self, user_id):
+        users = self._fetch("SELECT data FROM users WHERE user_id = ? LIMIT 1", (str(user_id),))
+        return users[0] if users else None
+
+    def add_user(self, user):
+        try:
+            self._write(INSERT_USER, _user_row(user))
+        except sqlite3.IntegrityError as error:
+            raise _duplicate_email(error, user.get_email())
+
+    def get_user_version(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM users WHERE user_id = ? LIMIT 1", (str(user_id),)).fetchone()
+        return None if row is None else row[0]
+
+    def update_user(self, user, expected_version=None):
+        user_id, email, data = _user_row(user)
+        sql = "UPDATE users SET email = ?, data = ?, version = version + 1 WHERE user_id = ?"
+        try:
+            if expected_version is None:
+                self._write(sql, (email, data, user_id))
+                return
+            # The check and the write are one statement, so no other connection can get in between
+            with self._lock, self._conn:
+                cursor = self._conn.execute(sql + " AND version = ?", (email, data, user_id, expected_version))
+        except sqlite3.IntegrityError as error:
+            raise _duplicate_email(error, user.get_email())
+        if cursor.rowcount == 0:
+            raise ConflictError(f"User {user_id} was saved by someone else since it was read")
+
+    def delete_user(self, user_id):
+        self._write("DELETE FROM users WHERE user_id = ?", (str(user_id),))
+
+    def get_orders(self):
+        return self._fetch("SELECT data FROM orders ORDER BY seq")
+
+    def get_user_orders(self, user_id):
+        return self._fetch("SELECT data FROM orders WHERE user_id = ? ORDER BY seq", (str(user_id),))
+
+    def find_order(self, order_id):
+        orders = self._fetch("SELECT data FROM orders WHERE order_id = ? LIMIT 1", (str(order_id),))
+        return orders[0] if orders else None
+
+    def get_orders_between(self, start_date, end_date):
+        return self._fetch("SELECT data FROM orders WHERE order_date BETWEEN ? AND ? ORDER BY seq",
+                           (start_date.isoformat(), end_date.isoformat()))
+
+    # Read a chunk of rows at a time, starting after the last one seen, so the lock is never
+    # held for the whole walk and orders can still be booked meanwhile
+    def iter_orders(self, start_date=None, end_date=None, chunk_size=1000):
+        sql = "SELECT seq, data FROM orders WHERE seq > ?"
+        params = ()
+        if start_date is not None:
+            sql += " AND order_date >= ?"
+            params += (start_date.isoformat(),)
+        if end_date is not None:
+            sql += " AND order_date <= ?"
+            params += (end_date.isoformat(),)
+        sql += " ORDER BY seq LIMIT ?"
+        last_seq = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, (last_seq, *params, chunk_size)).fetchall()
+            for _, data in rows:
+                yield pickle.loads(data)
+            if len(rows) < chunk_size:
+                return
+            last_seq = rows[-1][0]
+
+    def get_daily_sales(self, start_date=None, end_date=None):
+        sql = "SELECT day, tickets, orders, revenue FROM sales_daily"
+        conditions, params = [], ()
+        if start_date is not None:
+            conditions.append("day >= ?")
+            params += (start_date.isoformat(),)
+        if end_date is not None:
+            conditions.append("day <= ?")
+            params += (end_date.isoformat(),)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY day", params).fetchall()
+        return {_parse_day(day): (tickets, orders, revenue) for day, tickets, orders, revenue in rows}
+
+    def add_order(self, order):
+        self.add_orders([order])
+
+    # All orders, and the sales totals they change, go in as one transaction
+    def add_orders(self, orders):
+        rows = [_order_row(o) for o in orders]
+        with self._lock, self._conn:
+            self._conn.executemany(INSERT_ORDER, rows)
+            self._conn.executemany(ADD_SALE, [(day, tickets, 1, total) for _, _, day, tickets, total, _ in rows])
+
+    def add_users(self, users):
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(INSERT_USER, (_user_row(u) for u in users))
+        except sqlite3.IntegrityError as error:
+            raise _duplicate_email(error, "An email")
+
+    def delete_order(self, order_id):
+        return self._delete_orders("order_id = ?", (str(order_id),))
+
+    def delete_user_orders(self, user_id):
+        return self._delete_orders("user_id = ?", (str(user_id),))
+
+    # Delete orders and take them back out of the sales totals in the same transaction
+    def _delete_orders(self, where, params):
+        with self._lock, self._conn:
+            rows = self._conn.execute(f"SELECT order_date, tickets, total, data FROM orders WHERE {where}",
+                                      params).fetchall()
+            self._conn.executemany(ADD_SALE, [(day, -tickets, -1, -total) for day, tickets, total, _ in rows])
+            self._conn.execute(f"DELETE FROM orders WHERE {where}", params)
+            self._conn.execute("DELETE FROM sales_daily WHERE orders <= 0")
+        return [pickle.loads(data) for _, _, _, data in rows]
+
+    # Rows are read back and pickled again a chunk at a time, then the file is vacuumed
+    # so the space they no longer need is given back
+    def rewrite_orders(self, chunk_size=1000):
+        count = last_seq = 0
+        while True:
+            with self._lock, self._conn:
+                rows = self._conn.execute("SELECT seq, data FROM orders WHERE seq > ? ORDER BY seq LIMIT ?",
+                                          (last_seq, chunk_size)).fetchall()
+                self._conn.executemany("UPDATE orders SET data = ? WHERE seq = ?",
+                                       [(pickle.dumps(pickle.loads(data)), seq) for seq, data in rows])
+            count += len(rows)
+            if len(rows) < chunk_size:
+                break
+            last_seq = rows[-1][0]
+        with self._lock:
+            self._conn.execute("VACUUM")
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# The error to raise for a failed insert: DuplicateEmailError if the unique email index
+# turned it down, the IntegrityError itself for anything else
+def _duplicate_email(error, email):
+    if "users.email" not in str(error):
+        return error
+    duplicate = DuplicateEmailError(f"{email} is already registered")
+    duplicate.__cause__ = error
+    return duplicate
+
+
+# Column values for a user row
+def _user_row(user):
+    return str(user.get_user_id()), email_key(user.get_email()), pickle.dumps(user)
+
+
+# Column values for an order row
+def _order_row(order):
+    user_id = order.get_user_id()
+    day = order_day(order)
+    return (str(order.get_order_id()),
+            str(user_id) if user_id is not None else None,
+            day.isoformat() if hasattr(day, "isoformat") else str(day),
+            order.get_ticket_count(),
+            order.get_total(),
+            pickle.dumps(order))
+
+
+# Dates are stored as ISO text, anything else is handed back as it was stored
+def _parse_day(day):
+    try:
+        return date.fromisoformat(day)
+    except (TypeError, ValueError):
+        return day
@@ -0,0 +1,188 @@
+import threading
+from datetime import date
+
+from .engine import StorageEngine, in_range, order_day
+from .order_table import OrderTable, DELETED, _key
+from .sales_aggregates import SalesAggregates
+from .user_store import UserStore
+
+
+class TableStorage(StorageEngine):
+    # Keeps orders in a fixed-width OrderTable read through mmap, and users in the same
+    # append-only journal as the pickle engine. Opening it reads neither file: finding
+    # an order goes through the hash index, reports scan the fixed-width records. The
+    # table is used by one process at a time (another one opening it gets StorageInUseError),
+    # share files between processes with the pickle or SQLite engines.
+    def __init__(self, users_file, table_file, fsync="batch"):
+        self._lock = threading.RLock()  # Keeps callers apart from a compaction on another thread
+        self._compact_lock = threading.Lock()  # One compaction at a time
+        self._user_store = UserStore(users_file, self._lock)
+        # The table renumbers its records under the same lock, so record numbers found
+        # while it is held can be used until it is let go
+        self._table = OrderTable(table_file, fsync=fsync, lock=self._lock)
+        self._sales = None  # SalesAggregates worked out from the records on first use
+        self._user_orders = None  # user id -> {order id: None}, worked out from the records on first use
+
+    # Get the order table
+    def get_table(self):
+        return self._table
+
+    def get_users(self):
+        return self._user_store.get_users()
+
+    def find_user_by_email(self, email):
+        return self._user_store.find_by_email(email)
+
+    def find_user_by_id(self, user_id):
+        return self._user_store.find_by_id(user_id)
+
+    def add_user(self, user):
+        self._user_store.add(user)
+
+    def get_user_version(self, user_id):
+        return self._user_store.get_version(user_id)
+
+    def update_user(self, user, expected_version=None):
+        self._user_store.update(user, expected_version)
+
+    def delete_user(self, user_id):
+        self._user_store.delete(user_id)
+
+    # Live records, optionally only the ones for days from start_date and up to end_date,
+    # either bound may be left open (an unknown day is 0)
+    def _rows(self, start_date=None, end_date=None):
+        bounded = start_date is not None or end_date is not None
+        first = start_date.toordinal() if start_date is not None else 1
+        last = end_date.toordinal() if end_date is not None else date.max.toordinal()
+        for record, row in self._table.iter_rows():
+            if row.flags & DELETED:
+                continue
+            if bounded and not first <= row.day <= last:
+                if row.day:
+                    continue
+                # Stored without a usable date, only the order itself can tell
+                order = self._read(record, row)
+                if order is None or not in_range(order_day(order), start_date, end_date):
+                    continue
+            yield record, row
+
+    # Read the order of a row found earlier in a walk, which a compaction may have moved
+    # to another record since (None if it was deleted meanwhile)
+    def _read(self, record, row):
+        with self._lock:
+            if record >= self._table.get_count() or self._table.get_row(record).order_id != row.order_id:
+                record = self._table.find(row.order_id.rstrip(b"\0"))
+                if record is None:
+                    return None
+            return self._table.read(record)
+
+    def get_orders(self):
+        with self._lock:
+            return [self._table.read(record) for record, _ in self._rows()]
+
+    # Records of one user's live orders, in the order they were added
+    def _user_records(self, user_id):
+        with self._lock:
+            if self._user_orders is None:
+                user_orders = {}
+                for _, row in self._rows():
+                    user_orders.setdefault(row.user_id.rstrip(b"\0"), {})[row.order_id.rstrip(b"\0")] = None
+                self._user_orders = user_orders
+            records = (self._table.find(order_id) for order_id in self._user_orders.get(_key(user_id), ()))
+            return sorted(record for record in records if record is not None)
+
+    def get_user_orders(self, user_id):
+        with self._lock:
+            return [self._table.read(record) for record in self._user_records(user_id)]
+
+    def get_orders_between(self, start_date, end_date):
+        with self._lock:
+            return [self._table.read(record) for record, _ in self._rows(start_date, end_date)]
+
+    # One order unpickled at a time, the rest of the walk only reads fixed-width records.
+    # The lock is not held between orders, so each one is looked up again if need be.
+    def iter_orders(self, start_date=None, end_date=None):
+        for record, row in self._rows(start_date, end_date):
+            order = self._read(record, row)
+            if order is not None:
+                yield order
+
+    def find_order(self, order_id):
+        return self._table.get_order(order_id)
+
+    def _ensure_sales(self):
+        with self._lock:
+            if self._sales is None:
+                sales = SalesAggregates()
+                days = {}  # Day ordinal -> [tickets, orders, revenue], turned into dates once per day
+                for record, row in self._rows():
+                    if row.day:
+                        totals = days.setdefault(row.day, [0, 0, 0])
+                        totals[0] += row.tickets
+                        totals[1] += 1
+                        totals[2] += row.total
+                    else:
+                        sales.add_order(self._table.read(record))
+                for day, (tickets, orders, revenue) in days.items():
+                    sales.add_sale(date.fromordinal(day), tickets, orders, revenue)
+                self._sales = sales
+            return self._sales
+
+    def get_daily_sales(self, start_date=None, end_date=None):
+        return self._ensure_sales().get_daily_sales(start_date, end_date)
+
+    def add_order(self, order):
+        self.add_orders([order])
+
+    def add_orders(self, orders):
+        with self._lock:
+            self._table.append_many(orders)
+            if self._sales is not None:
+                for order in orders:
+                    self._sales.add_order(order)
+            if self._user_orders is not None:
+                for order in orders:
+                    self._user_orders.setdefault(_key(order.get_user_id()), {})[_key(order.get_order_id())] = None
+
+    def delete_order(self, order_id):
+        with self._lock:
+            record = self._table.find(order_id)
+            return [] if record is None else self._delete_records([record])
+
+    def delete_user_orders(self, user_id):
+        with self._lock:
+            return self._delete_records(self._user_records(user_id))
+
+    # Delete records found while the lock was held, it still has to be
+    def _delete_records(self, records):
+        removed = []
+        for record in records:
+            row = self._table.get_row(record)
+            order = self._table.read(record)
+            self._table.delete(record)
+            if self._sales is not None:
+                self._sales.remove_order(order)
+            if self._user_orders is not None:
+                self._user_orders.get(row.user_id.rstrip(b"\0"), {}).pop(row.order_id.rstrip(b"\0"), None)
+            removed.append(order)
+        return removed
+
+    # Share of the records in the table and the users file that compact() would drop
+    def get_garbage_ratio(self):
+        garbage, total = self._user_store.get_garbage()
+        garbage += self._table.get_deleted_count()
+        total += self._table.get_count()
+        return garbage / total if total else 0.0
+
+    # Drop deleted orders and users, bookings carry on while the table is copied
+    def compact(self):
+        with self._compact_lock:
+            return self._table.compact() + self._user_store.compact()
+
+    def rewrite_orders(self):
+        with self._compact_lock:
+            self._table.compact(repickle=True)
+            return self._table.get_count()
+
+    def close(self):
+        self._table.close()
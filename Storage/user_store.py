@@ -0,0 +1,170 @@
+from .engine import ConflictError, DuplicateEmailError, email_key
+from .order_journal import UserJournal
+from .pickle_files import ADD, DELETE
+
+
+class UserStore:
+    # Users kept in memory and saved to an append-only journal, for the engines that keep
+    # their own files. Every change is one appended record, compact() drops the old ones.
+    # Records appended by other processes are taken in before each use.
+    def __init__(self, users_file, lock):
+        self._journal = UserJournal(users_file, fsync="always")  # Users are few and rarely change
+        self._lock = lock  # The engine's lock, so compaction, changes and other processes take turns
+        self._users = {}  # user_id -> user, kept in memory
+        self._emails = {}  # normalised email -> user, so login never scans
+        self._email_of = {}  # user_id -> normalised email it is indexed under
+        self._offsets = {}  # user_id -> where the user's latest record starts, their version
+        self._records = 0  # Records in the users file, live or not
+        self._loaded = False  # Nothing is read until it is first needed
+        self._seen = (None, 0)  # Stamp of the users file the maps have taken in
+
+    # Get the users journal
+    def get_journal(self):
+        return self._journal
+
+    # Check if the users file has been read yet
+    def is_loaded(self):
+        return self._loaded
+
+    # Read the users file on first use, afterwards only what was appended since
+    def _ensure_loaded(self):
+        with self._lock:
+            stamp = self._journal.get_stamp()
+            if self._loaded and stamp == self._seen:
+                return
+            file_id, size = stamp
+            if not self._loaded or file_id != self._seen[0] or size < self._seen[1]:
+                # First read, or another process compacted the file and every position moved
+                self._users, self._emails, self._email_of, self._offsets = {}, {}, {}, {}
+                self._records = 0
+                start = 0
+            else:
+                start = self._seen[1]
+            self._take(self._journal.scan_records(start))
+            self._seen = self._journal.get_clean_stamp()
+            self._loaded = True
+
+    # Take journal records into account, a later record for the same user replaces the earlier one
+    def _take(self, records):
+        for offset, kind, user in records:
+            self._records += 1
+            self._unindex(user.get_user_id())
+            if kind == ADD:
+                self._index(user)
+                self._offsets[user.get_user_id()] = offset
+
+    def _index(self, user):
+        user_id = user.get_user_id()
+        key = email_key(user.get_email())
+        self._users[user_id] = user
+        self._emails.setdefault(key, user)  # Old files may hold the same email twice, the first one wins
+        self._email_of[user_id] = key
+
+    def _unindex(self, user_id):
+        self._users.pop(user_id, None)
+        self._offsets.pop(user_id, None)
+        key = self._email_of.pop(user_id, None)
+        indexed = self._emails.get(key)
+        if indexed is not None and indexed.get_user_id() == user_id:
+            del self._emails[key]
+
+    def get_users(self):
+        self._ensure_loaded()
+        return list(self._users.values())
+
+    def find_by_email(self, email):
+        self._ensure_loaded()
+        return self._emails.get(email_key(email))
+
+    def find_by_id(self, user_id):
+        self._ensure_loaded()
+        return self._users.get(user_id)
+
+    # Get the version of a user's saved record, None if there is no such user.
+    # It changes whenever the user is saved, by this process or another one.
+    def get_version(self, user_id):
+        with self._lock:
+            self._ensure_loaded()
+            offset = self._offsets.get(user_id)
+            return None if offset is None else (self._seen[0], offset)
+
+    # Append a record and take it in, the maps have already taken in everything before it
+    def _append(self, user, kind=ADD):
+        offset = self._journal.append(user, kind=kind)
+        self._take([(offset, kind, user)])
+        self._seen = self._journal.get_stamp()
+
+    # Save a new user. The email is checked with the lock held and the file read up to
+    # date, so two processes can never both register it.
+    def add(self, user):
+        with self._lock:
+            self._ensure_loaded()
+            if email_key(user.get_email()) in self._emails:
+                raise DuplicateEmailError(f"{user.get_email()} is already registered")
+            self._append(user)
+
+    # Save a changed user. With an expected version the change is only saved if nobody
+    # saved the user since that version was read, otherwise ConflictError is raised.
+    # A new email that another user already has raises DuplicateEmailError.
+    def update(self, user, expected_version=None):
+        with self._lock:
+            self._ensure_loaded()
+            user_id = user.get_user_id()
+            if expected_version is not None and self.get_version(user_id) != expected_version:
+                self._reread(user_id)
+                raise ConflictError(f"User {user_id} was saved by someone else since it was read")
+            owner = self._emails.get(email_key(user.get_email()))
+            if owner is not None and owner.get_user_id() != user_id:
+                self._reread(user_id)
+                raise DuplicateEmailError(f"{user.get_email()} is already registered")
+            self._append(user)  # Replaces the earlier record when the file is read
+
+    # Users are handed out as the objects kept here, so a change that was turned down may
+    # still be on one; put the saved copy back in its place
+    def _reread(self, user_id):
+        offset = self._offsets.get(user_id)
+        if offset is not None:
+            self._unindex(user_id)
+            self._index(self._journal.read_at([offset])[0])
+            self._offsets[user_id] = offset
+
+    def delete(self, user_id):
+        with self._lock:
+            self._ensure_loaded()
+            user = self._users.get(user_id)
+            if user is None:
+                return
+            self._append(user, kind=DELETE)
+
+    # Get (records compact() would drop, records in the file)
+    def get_garbage(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._records - len(self._users), self._records
+
+    # Write the live users to a new file without the lock and swap it in, returns how many records were dropped
+    def compact(self):
+        with self._lock:
+            self._journal.trim()  # So the end of what was read is the end of a whole record
+            self._ensure_loaded()
+            users = list(self._users.values())
+            if self._records == len(users):
+                return 0
+            end = self._seen[1]
+            records = self._records
+        offsets = {}
+        temp_name = self._journal.write_copy(users, lambda offset, user: offsets.__setitem__(user.get_user_id(), offset))
+        with self._lock:
+            self._ensure_loaded()  # Changes from other processes are in the tail the swap copies
+            tail_start = self._journal.swap_in(temp_name, end)
+            # The maps already hold the users changed meanwhile, only their positions moved
+            self._offsets = offsets
+            self._records = len(users)
+            for offset, kind, user in self._journal.scan_records(tail_start):
+                self._records += 1
+                if kind == ADD:
+                    self._offsets[user.get_user_id()] = offset
+                else:
+                    self._offsets.pop(user.get_user_id(), None)
+            self._seen = self._journal.get_clean_stamp()
+            return records - len(users)
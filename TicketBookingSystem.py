@@ -1,66 +1,44 @@
 # Import all needed libraries
 import tkinter as tk
 from tkinter import ttk, messagebox
-from datetime import date, datetime
-import pickle
-import hashlib
 import os
 
-# Import our custom classes
-from Models.user import User
-from Models.ticket import Ticket
-from Models.ticket_type import TicketType, SingleRacePass, WeekendPackage, SeasonMembership, GroupDiscount
-from Models.order import Order
-from Models.payment import Payment
-from Models.admin import Admin
-from Models.sales_report import SalesReport
+# Import the ticket catalog and the service that does the actual work
+from Models.ticket_type import GroupDiscount
+from Services import BackgroundWorker, PasswordHasher, BookingError, get_ticket_types, get_events
 
 # Files where we save data
 USERS_FILE = "users.pickle"
 ORDERS_FILE = "orders.pickle"
-
-# Helper functions for file operations
-def load_data(filename):
-   """Load data from a pickle file"""
-   try:
-       with open(filename, "rb") as f:
-           return pickle.load(f)
-   except (FileNotFoundError, EOFError):
-       return []
-
-def save_data(filename, data):
-   """Save data to a pickle file"""
-   with open(filename, "wb") as f:
-       pickle.dump(data, f)
-
-def hash_password(password):
-   """Make password secure by hashing it"""
-   salt = os.urandom(16)
-   hashed = hashlib.sha256(salt + password.encode()).hexdigest()
-   return salt, hashed
-
-def verify_password(stored_salt, stored_hash, password):
-    """Verify password using stored salt and hash"""
-    return stored_hash == hashlib.sha256(stored_salt + password.encode()).hexdigest()
-
-# Create different types of tickets
-def get_ticket_types():
-    race_pass = SingleRacePass("Single Race", 120, "Access to one race day", "Friday", "Main Grandstand")
-    weekend = WeekendPackage("Weekend Pass", 300, "All weekend events", "2025-11-10", "2025-11-12", ["Practice", "Qualifying", "Race"])
-    season = SeasonMembership("Season Ticket", 1000, "All-season access", "2025", "Gold", ["VIP Lounge", "Pit Access", "Free Merch"])
-    group = GroupDiscount("Group Deal", 0, "Discounted for groups", 5, 15,
-                          SingleRacePass("Group Race", 120, "Group race day", "Friday", "South Zone"))
-
-    return {
-        "RacePass": race_pass,
-        "Weekend": weekend,
-        "Season": season,
-        "Group": group
-    }
-
-
-# Create the ticket types once at startup
+DB_FILE = "bookings.db"
+NODE_ID_DIR = "node_ids"  # Lock files that give every running app its own ID node
+INVENTORY_FILE = "inventory.db"  # Seats left per event, shared by every running app
+
+# Which storage engine to use: "pickle" (default), "sqlite" or "mmap" (an order table read
+# through mmap, for one running app at a time: it cannot share its files with others)
+STORAGE_BACKEND = os.environ.get("BOOKING_STORAGE", "pickle")
+
+# How passwords are hashed: "scrypt" (default) or "pbkdf2", with an optional cost
+# (log2 of N for scrypt, iterations for PBKDF2). Older hashes are upgraded at the next login.
+PASSWORD_HASHER = PasswordHasher(os.environ.get("BOOKING_KDF", "scrypt"),
+                                 int(os.environ["BOOKING_KDF_COST"]) if os.environ.get("BOOKING_KDF_COST") else None)
+
+# Address of a running booking API (python -m Services.api_server). When set the app is a
+# client of that server, otherwise it opens the data files itself.
+API_URL = os.environ.get("BOOKING_API_URL")
+
+# Sales breakdowns offered in the admin panel: shown name -> (field, how many rows to show)
+BREAKDOWNS = {
+    "Ticket type": ("ticket_type", None),
+    "Top 10 customers": ("customer", 10),
+    "Hour of day": ("hour", None),
+    "Weekday": ("weekday", None),
+    "Order total": ("price_band", None),
+}
+
+# Create the ticket types and events once at startup
 TICKET_TYPES = get_ticket_types()
+EVENTS = get_events()
 
 # Main application class
 class BookingSystemApp:
@@ -69,9 +47,15 @@ class BookingSystemApp:
        self.root = root
        self.root.title("Grand Prix Ticket Booking System")
        self.root.geometry("600x500")
-       self.users = load_data(USERS_FILE)  # Initialize user list here
        self.current_user = None  # Track who is logged in
 
+       # Status bar showing when work is running in the background
+       self.status_bar()
+       self.worker = BackgroundWorker(self.root, on_busy_change=self.show_busy, on_error=self.show_worker_error)
+       # Users and orders are loaded in the background, every later job queues up behind this one
+       self.service = None
+       self.worker.submit(self.open_store, label="Loading data")
+
        # Create tabs for different functions
        self.tabs = ttk.Notebook(self.root)
        self.login_tab()      # Tab for login/register
@@ -84,6 +68,41 @@ class BookingSystemApp:
        for i in range(1, 4):
            self.tabs.tab(i, state="disabled")
 
+   def open_store(self):
+       """Open the booking service (runs on the background thread)"""
+       # Imported here so the window can show before the storage engines or HTTP client load
+       from Services import BookingClient, open_service
+       if API_URL:
+           self.service = BookingClient(API_URL)
+       else:
+           self.service = open_service(STORAGE_BACKEND, USERS_FILE, ORDERS_FILE, DB_FILE, INVENTORY_FILE, NODE_ID_DIR,
+                                       hasher=PASSWORD_HASHER, ticket_types=TICKET_TYPES, events=EVENTS)
+
+   def status_bar(self):
+       """Create the status bar at the bottom of the window"""
+       frame = ttk.Frame(self.root)
+       frame.pack(side="bottom", fill="x", padx=5, pady=2)
+       self.status_label = ttk.Label(frame, text="Ready")
+       self.status_label.pack(side="left")
+       self.progress = ttk.Progressbar(frame, mode="indeterminate", length=120)
+       self.progress.pack(side="right")
+
+   def show_busy(self, busy, label):
+       """Show or hide the in-progress indicator"""
+       if busy:
+           self.status_label.config(text=f"{label}...")
+           self.progress.start(10)
+       else:
+           self.status_label.config(text="Ready")
+           self.progress.stop()
+
+   def show_worker_error(self, error):
+       """Show an error raised by a background job"""
+       if isinstance(error, BookingError):
+           messagebox.showerror(error.title, str(error))
+       else:
+           messagebox.showerror("Error", f"Something went wrong: {error}")
+
    def login_tab(self):
        """Create the login and registration tab"""
        tab = ttk.Frame(self.tabs)
@@ -192,6 +211,12 @@ class BookingSystemApp:
        # Sales report button
        ttk.Button(tab, text="Generate Sales Report", command=self.generate_report).pack(pady=10)
 
+       # Sales broken down by ticket type, customer, time or order total
+       ttk.Label(tab, text="Break Down Sales By:").pack()
+       self.breakdown_var = tk.StringVar()
+       ttk.OptionMenu(tab, self.breakdown_var, "Ticket type", *BREAKDOWNS.keys()).pack()
+       ttk.Button(tab, text="Show Breakdown", command=self.show_breakdown).pack(pady=5)
+
        #Modify and apply discount
        ttk.Label(tab, text="Update Group Discount (%):").pack()
        self.discount_entry = ttk.Entry(tab)
@@ -206,46 +231,25 @@ class BookingSystemApp:
     username = self.username_entry.get()
     email = self.email_entry.get()
     password = self.password_entry.get()
-    if not username or not email or not password:
-        messagebox.showerror("Input Error", "Please fill all fields.")
-        return
-    users = load_data(USERS_FILE)
-    if any(u.get_email() == email for u in users):
-        messagebox.showerror("Error", "Email already registered.")
-        return
-    salt, hashed_password = hash_password(password)
-    user_id = f"U{int(datetime.now().timestamp())}"
-    user = User(user_id, username, hashed_password, salt, "", email, "", "")
-    users.append(user)
-    save_data(USERS_FILE, users)
-    self.current_user = user
-    self.users = users  # Update in-memory list
-    self.show_user_menu()
-    messagebox.showinfo("Welcome", f"Welcome, {username}! You have been registered and logged in.") 
+
+    def done(user):
+        self.current_user = user
+        self.show_user_menu()
+        messagebox.showinfo("Welcome", f"Welcome, {username}! You have been registered and logged in.")
+
+    self.worker.submit(lambda: self.service.register(username, email, password), done, label="Registering")
 
    def login(self):
         """Log in an existing user"""
-        email = self.email_entry.get().lower()
+        email = self.email_entry.get()
         password = self.password_entry.get()
-        for user in self.users:
-            print(f"Checking user: {user.get_email().lower()}")
-            if user.get_email().lower() == email:
-                print("Email match found.")
-                user_salt = user.get_salt()
-                user_password = user.get_password()
-                if user_salt and user_password:
-                    if verify_password(user_salt, user_password, password):
-                        self.current_user = user
-                        messagebox.showinfo("Success", f"Welcome, {user.get_full_name()}!")
-                        self.show_user_menu()
-                        return
-                    else:
-                        messagebox.showerror("Error", "Incorrect password.")
-                        return
-                else:
-                    messagebox.showerror("Error", "User data corrupted.")
-                    return
-        messagebox.showerror("Error", "User not found.")
+
+        def done(user):
+            self.current_user = user
+            messagebox.showinfo("Success", f"Welcome, {user['full_name']}!")
+            self.show_user_menu()
+
+        self.worker.submit(lambda: self.service.login(email, password), done, label="Logging in")
 
    def update_profile(self):
         """Update user profile information"""
@@ -253,25 +257,18 @@ class BookingSystemApp:
             messagebox.showerror("Not Logged In", "You must log in first.")
             return
         # Get all fields
-        username = self.fullname_entry.get().strip()
-        phone = self.phone_entry.get().strip()
-        address = self.address_entry.get().strip()
-        # Validate input
-        if not username or not phone or not address:
-            messagebox.showerror("Input Error", "Please fill all fields.")
-            return
-        # Update current user object
-        self.current_user.set_full_name(username)  # Corrected method name
-        self.current_user.set_phone_number(phone)
-        self.current_user.set_address(address)
-        # Update users list
-        users = load_data(USERS_FILE)
-        for i, user in enumerate(users):
-            if user.get_user_id() == self.current_user.get_user_id():
-                users[i] = self.current_user
-                break
-        save_data(USERS_FILE, users)
-        messagebox.showinfo("Profile Updated", "Your profile has been updated.")
+        username = self.fullname_entry.get()
+        phone = self.phone_entry.get()
+        address = self.address_entry.get()
+        user_id = self.current_user["user_id"]
+
+        def done(user):
+            self.current_user = user
+            messagebox.showinfo("Profile Updated", "Your profile has been updated.")
+
+        # Save the updated user in the background
+        self.worker.submit(lambda: self.service.update_profile(user_id, username, phone, address), done,
+                           label="Saving profile")
 
    #Delete the user account
    def delete_account(self):
@@ -279,27 +276,27 @@ class BookingSystemApp:
            return
        confirm = messagebox.askyesno("Confirm", "Delete your account and all orders?")
        if confirm:
-           users = load_data(USERS_FILE)
-           users = [u for u in users if u.get_user_id() != self.current_user.get_user_id()]
-           save_data(USERS_FILE, users)
+           user_id = self.current_user["user_id"]
+           self.current_user = None
 
-           orders = load_data(ORDERS_FILE)
-           orders = [o for o in orders if o.get_user_id() != self.current_user.get_user_id()]
-           save_data(ORDERS_FILE, orders)
+           def done(_):
+               messagebox.showinfo("Deleted", "Account and orders deleted.")
+               self.root.destroy()
 
-           self.current_user = None
-           messagebox.showinfo("Deleted", "Account and orders deleted.")
-           self.root.destroy()
+           self.worker.submit(lambda: self.service.delete_account(user_id), done, label="Deleting account")
 
    #Loads the user orders
    def load_user_orders(self):
     if not self.current_user:
         return
-    orders = load_data(ORDERS_FILE)
-    self.orders_list.delete(0, tk.END)
-    for order in orders:
-        if order.get_user().get_user_id() == self.current_user.get_user_id():
-            self.orders_list.insert(tk.END, f"{order.get_order_id()} | {order.get_ticket_type()} x{len(order.get_tickets())} = ${order.get_total()}")
+    user_id = self.current_user["user_id"]
+
+    def done(orders):
+        self.orders_list.delete(0, tk.END)
+        for order in orders:
+            self.orders_list.insert(tk.END, f"{order['order_id']} | {order['ticket_type']} x{order['quantity']} = ${order['total']:.2f}")
+
+    self.worker.submit(lambda: self.service.get_user_orders(user_id), done, label="Loading orders")
 
    #Deletes the user selected order
    def delete_selected_order(self):
@@ -310,94 +307,80 @@ class BookingSystemApp:
            messagebox.showerror("Error", "Select an order to delete.")
            return
        order_id = self.orders_list.get(selection[0]).split("|")[0].strip()
+       user_id = self.current_user["user_id"]
+
+       def done(_):
+           self.load_user_orders()
+           messagebox.showinfo("Deleted", f"Order {order_id} deleted.")
 
-       orders = load_data(ORDERS_FILE)
-       orders = [o for o in orders if o.get_order_id() != order_id]
-       save_data(ORDERS_FILE, orders)
-       self.load_user_orders()
-       messagebox.showinfo("Deleted", f"Order {order_id} deleted.")
+       self.worker.submit(lambda: self.service.delete_order(user_id, order_id), done, label="Deleting order")
 
    #Updates the ticket information
    def update_ticket_info(self, *args):
-       ticket = TICKET_TYPES[self.ticket_var.get()]
-       info = f"{ticket.get_type_name()}: {ticket.get_description()}\nPrice: ${ticket.calculate_price()}"
-       self.ticket_info_label.config(text=info)
+       name = self.ticket_var.get()
+       ticket = TICKET_TYPES[name]
+       info = f"{ticket.get_type_name()}: {ticket.get_description()}\nPrice: $"
+       self.ticket_info_label.config(text=info + "...")
+
+       def done(totals):
+           if self.ticket_var.get() == name:  # Still the ticket type picked
+               self.ticket_info_label.config(text=f"{info}{totals[0]:.2f}")
+
+       # Read from the service's quote table (or the API server's), queued behind loading the data
+       self.worker.submit(lambda: self.service.quote_carts([[{"ticket_type": name, "quantity": 1}]]), done,
+                          label="Looking up price")
 
 
    def book_ticket(self):
     """Book tickets for a user"""
     if not self.current_user:
         return
+    user_id = self.current_user["user_id"]
     ticket_type = self.ticket_var.get()
     quantity = self.qty_entry.get()
     card = self.card_entry.get()
-    # Validate quantity input
-    try:
-        quantity = int(quantity)
-        if quantity <= 0:
-            raise ValueError
-    except ValueError:
-        messagebox.showerror("Invalid", "Enter a valid quantity.")
-        return
-    if len(card) != 16 or not card.isdigit():
-        messagebox.showerror("Payment Error", "Enter a 16-digit card number.")
-        return
-    # Get the selected ticket object
-    ticket_obj = TICKET_TYPES[ticket_type]
-    total_price = ticket_obj.calculate_price(quantity)
-    # Handle group discount dynamically
-    if ticket_type == "Group" and quantity >= ticket_obj.get_group_size():
-        total_price *= (1 - ticket_obj.get_discount_percentage() / 100)
-    # Create payment record
-    payment_id = f"P{int(datetime.now().timestamp())}"
-    payment = Payment(payment_id, total_price, "credit_card", transaction_date=datetime.now().strftime("%Y-%m-%d"))
-    # Create order
-    order_id = f"O{int(datetime.now().timestamp())}"
-    order = Order(order_id, datetime.now(), "confirmed", self.current_user)
-    # Create and add Ticket objects
-    for _ in range(quantity):
-        ticket_id = f"T{int(datetime.now().timestamp())}"
-        single_ticket_price = ticket_obj.calculate_price(1)  # Price for one ticket
-        ticket = Ticket(ticket_id, single_ticket_price, datetime.now().strftime("%Y-%m-%d"), datetime.now().strftime("%Y-%m-%d"))
-        order.add_ticket(ticket)
-    # Save order
-    orders = load_data(ORDERS_FILE)
-    orders.append(order)
-    save_data(ORDERS_FILE, orders)
-    messagebox.showinfo("Booked", f"Tickets booked!\nOrder ID: {order_id}\nTotal: ${total_price:.2f}")
-    self.qty_entry.delete(0, tk.END)
-    self.card_entry.delete(0, tk.END)
+
+    def done(order):
+        self.qty_entry.delete(0, tk.END)
+        self.card_entry.delete(0, tk.END)
+        message = f"Tickets booked!\nOrder ID: {order['order_id']}\nTotal: ${order['charged']:.2f}"
+        seats = order.get("seats", [])
+        if seats:
+            message += "\nSeats:\n" + "\n".join(seats[:5])
+            if len(seats) > 5:
+                message += f"\n...and {len(seats) - 5} more"
+        messagebox.showinfo("Booked", message)
+
+    # The service checks the quantity and card, holds the seats and saves the order
+    self.worker.submit(lambda: self.service.book(user_id, ticket_type, quantity, card), done,
+                       label="Booking tickets")
 
 
    def generate_report(self):
         """Generate a sales report"""
-        orders = load_data(ORDERS_FILE)
-        report_id = f"R{int(datetime.now().timestamp())}"
-        current_date = datetime.now().date()
-        report = SalesReport(report_id, current_date, current_date)
-        for order in orders:
-            order_date = order.get_order_date().date() if isinstance(order.get_order_date(), datetime) else order.get_order_date()
-            report.record_sale(order_date)
-        total_sales = sum(order.get_total() for order in orders)
-        report_text = f"Total orders: {len(orders)}\nTotal Sales: ${total_sales:.2f}\n\n{report.generate_report()}"
-        messagebox.showinfo("Sales Report", report_text)
+        self.worker.submit(lambda: self.service.sales_report(),
+                           lambda report: messagebox.showinfo("Sales Report", report["text"]),
+                           label="Building sales report")
+
+   def show_breakdown(self):
+        """Show the sales broken down the chosen way"""
+        by, limit = BREAKDOWNS[self.breakdown_var.get()]
+        self.worker.submit(lambda: self.service.sales_breakdown(by, limit=limit),
+                           lambda breakdown: messagebox.showinfo("Sales Breakdown", breakdown["text"]),
+                           label="Breaking down sales")
 
    def update_discount(self):
         """Update the group discount value"""
         new_discount = self.discount_entry.get()
-        try:
-            new_discount = float(new_discount)
-            if not (0 <= new_discount <= 100):
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Invalid", "Enter a valid percentage between 0-100.")
-            return
-        group_ticket = TICKET_TYPES.get("Group")
-        if isinstance(group_ticket, GroupDiscount):
-            group_ticket.set_discount_percentage(new_discount)  # Corrected method name
-            messagebox.showinfo("Updated", f"Group discount updated to {new_discount}%.")
-        else:
-            messagebox.showerror("Error", "Group ticket type not found.")
+
+        def done(percentage):
+            group_ticket = TICKET_TYPES.get("Group")
+            if isinstance(group_ticket, GroupDiscount):
+                group_ticket.set_discount_percentage(percentage)  # Keep the shown price in step with the server
+            self.update_ticket_info()
+            messagebox.showinfo("Updated", f"Group discount updated to {percentage}%.")
+
+        self.worker.submit(lambda: self.service.set_group_discount(new_discount), done, label="Updating discount")
 
 
 # --- Launch the app ---
@@ -405,6 +388,9 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = BookingSystemApp(root)
     root.mainloop()
+    app.worker.shutdown()  # Let queued saves finish
+    if app.service is not None:
+        app.service.close()  # Make sure batched bookings reach the disk before exit
 
 
 
@@ -0,0 +1,84 @@
+"""Time sales breakdowns on the columns against walking the order objects.
+
+Orders are generated in batches of 100,000 and added to a SalesColumns, so millions
+of them fit in memory as columns. Each breakdown is then timed on the columns; for
+sizes up to --walk-limit the orders are also kept and the same totals are worked
+out by walking the objects, the way the sales report did. Uses NumPy when it is
+installed, plain loops over the columns otherwise.
+
+Run from the project folder:
+    python -m benchmarks.bench_analytics
+    python -m benchmarks.bench_analytics --orders 100000 1000000 5000000
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.datagen import make_orders, make_users
+from Services.analytics import SalesColumns, BREAKDOWNS, np
+from Services.catalog import get_events
+from Services.password_hasher import PasswordHasher
+
+BATCH = 100_000
+
+
+def walk_objects(orders, by, event_types):
+    """Totals per label worked out straight from the order objects"""
+    totals = {}
+    for order in orders:
+        placed = order.get_order_date()
+        if by == "ticket_type":
+            ticket = order.get_ticket_lines()[0][0]
+            label = event_types.get(ticket.get_event().get_event_id())
+        elif by == "customer":
+            label = order.get_user_id()
+        elif by == "hour":
+            label = placed.hour
+        elif by == "weekday":
+            label = placed.weekday()
+        else:
+            label = int(order.get_total() // 250)
+        orders_, tickets, revenue = totals.get(label, (0, 0, 0.0))
+        totals[label] = (orders_ + 1, tickets + order.get_ticket_count(), revenue + order.get_total())
+    return totals
+
+
+def timed_ms(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--walk-limit", type=int, default=200_000, help="Largest size also timed on the objects")
+    args = parser.parse_args()
+
+    event_types = {event.get_event_id(): name for name, event in get_events().items()}
+    users = make_users(args.users, PasswordHasher("scrypt", 10))
+    print(f"Columns kept in: {'NumPy arrays' if np is not None else 'arrays with plain loops (NumPy not installed)'}")
+    print(f"{'orders':>10}  {'breakdown':<12}{'columns ms':>12}{'objects ms':>12}")
+    for count in args.orders:
+        columns = SalesColumns(event_types)
+        kept = []
+        start = time.perf_counter()
+        for first in range(0, count, BATCH):
+            batch = make_orders(min(BATCH, count - first), users, seed=first)
+            columns.add_orders(batch)
+            if count <= args.walk_limit:
+                kept.extend(batch)
+        print(f"{count:>10,}  {'(load)':<12}{(time.perf_counter() - start) * 1000:>12.0f}")
+        for by in BREAKDOWNS:
+            on_columns = timed_ms(lambda: columns.group_by(by, limit=10 if by == "customer" else None), args.runs)
+            on_objects = timed_ms(lambda: walk_objects(kept, by, event_types), args.runs) if kept else None
+            print(f"{count:>10,}  {by:<12}{on_columns:>12.1f}" + (f"{on_objects:>12.1f}" if kept else f"{'-':>12}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Load-test the booking API on localhost with many concurrent clients.
+
+The server runs in its own process on fresh data files. Each client registers once,
+then keeps booking tickets and listing its orders over one keep-alive connection
+until time is up. Requests per second, latency percentiles and errors are printed
+for each number of clients.
+
+Run from the project folder:
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --clients 1 64 512 --seconds 5 --storage sqlite
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from Services.api_server import ApiServer
+from Services.booking_service import open_service
+from Services.password_hasher import PasswordHasher
+
+
+def run_server(folder, storage, kdf_cost, port_queue, stop_event):
+    os.chdir(folder)
+    service = open_service(storage, hasher=PasswordHasher("scrypt", kdf_cost))
+    server = ApiServer(service, port=0, workers=64)
+    port_queue.put(server.start_background())
+    stop_event.wait()
+    server.stop_background()
+    service.close()
+
+
+async def request(reader, writer, method, path, data=None, token=None):
+    body = json.dumps(data).encode() if data is not None else b""
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n{auth}"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(port, number, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    status, reply = await request(reader, writer, "POST", "/register",
+                                  {"username": f"load{number}", "email": f"load{number}-{time.time_ns()}@example.com",
+                                   "password": "secret"})
+    token = reply.get("token")
+    booking = {"ticket_type": "RacePass", "quantity": 1, "card": "1234567812345678"}
+    while time.perf_counter() < deadline:
+        for method, path, data in (("POST", "/orders", booking), ("GET", "/orders", None)):
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, method, path, data, token)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    writer.close()
+
+
+async def load(port, clients, seconds):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(port, i, deadline, latencies, errors) for i in range(clients)))
+    return sorted(latencies), errors
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 128, 256])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--storage", choices=("pickle", "sqlite", "mmap"), default="pickle")
+    parser.add_argument("--kdf-cost", type=int, default=10, help="scrypt cost; kept low so registering is not what is measured")
+    args = parser.parse_args()
+
+    print(f"{'clients':>8}{'requests':>10}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for clients in args.clients:
+        with tempfile.TemporaryDirectory() as folder:
+            port_queue, stop_event = multiprocessing.Queue(), multiprocessing.Event()
+            server = multiprocessing.Process(target=run_server,
+                                             args=(folder, args.storage, args.kdf_cost, port_queue, stop_event))
+            server.start()
+            port = port_queue.get()
+            latencies, errors = asyncio.run(load(port, clients, args.seconds))
+            stop_event.set()
+            server.join()
+        print(f"{clients:>8}{len(latencies):>10,}{len(latencies) / args.seconds:>10,.0f}"
+              f"{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.99) * 1000:>9.2f}{len(errors):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compare booking N orders one at a time against booking them as one batch.
+
+Both runs use the real engines on fresh files: a storage backend plus the shared
+seat inventory, exactly as the app and the API server open them. A single booking
+commits twice to the inventory and once to the order store, a batch does that once
+for all its orders, so the gap grows with how long the disk takes to sync; use --dir
+to run on the disk the data really lives on.
+
+Run from the project folder:
+    python -m benchmarks.bench_bulk
+    python -m benchmarks.bench_bulk --orders 100 1000 --storage sqlite mmap --dir /var/tmp
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from Services.booking_service import open_service
+from Services.password_hasher import PasswordHasher
+
+ITEM = {"ticket_type": "Weekend", "quantity": 2, "card": "1234567812345678"}
+
+
+def timed_run(storage, orders, batch, parent):
+    home = os.getcwd()
+    with tempfile.TemporaryDirectory(dir=parent) as folder:
+        os.chdir(folder)
+        service = open_service(storage, hasher=PasswordHasher("scrypt", 10))
+        user_id = service.register("agency", "agency@example.com", "secret")["user_id"]
+        start = time.perf_counter()
+        if batch:
+            booked = service.book_many(user_id, [ITEM] * orders)["booked"]
+        else:
+            booked = sum(1 for _ in range(orders) if service.book(user_id, **ITEM))
+        service.close()  # Includes flushing anything still buffered
+        elapsed = time.perf_counter() - start
+        os.chdir(home)
+    assert booked == orders
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--storage", choices=("pickle", "sqlite", "mmap"), nargs="+", default=["pickle", "sqlite"])
+    parser.add_argument("--dir", default=None, help="Folder to create the data files in")
+    args = parser.parse_args()
+
+    print(f"{'storage':<8}{'orders':>8}{'single/s':>12}{'batch/s':>12}{'speedup':>9}")
+    for storage in args.storage:
+        for orders in args.orders:
+            single = timed_run(storage, orders, False, args.dir)
+            batch = timed_run(storage, orders, True, args.dir)
+            print(f"{storage:<8}{orders:>8,}{orders / single:>12,.0f}{orders / batch:>12,.0f}{single / batch:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
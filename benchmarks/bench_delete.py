@@ -0,0 +1,100 @@
+"""Time deleting orders with tombstones against rewriting the whole orders file.
+
+A delete now appends one tombstone record, so its time should stay the same however
+many orders are stored; the other column loads every order and writes the rest back,
+the way deletes used to work. A quarter of the orders are then deleted and compact()
+runs on a second thread while an order is booked every millisecond or so, to show how
+long compaction takes, how many bookings went through meanwhile and what it did to
+their latency.
+
+Run from the project folder:
+    python -m benchmarks.bench_delete
+    python -m benchmarks.bench_delete --orders 10000 100000 1000000 --deletes 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.datagen import generate, make_orders
+from Services.password_hasher import PasswordHasher
+from Storage import PickleStorage
+from Storage.engine import order_key
+from Storage.pickle_files import load_data, write_records
+
+
+def rewrite_without(orders_file, order_id):
+    """Delete one order the old way, returns the seconds it took"""
+    start = time.perf_counter()
+    write_records(orders_file, [o for o in load_data(orders_file, order_key) if o.get_order_id() != order_id])
+    return time.perf_counter() - start
+
+
+def book_while(store, busy, users, pause):
+    """Book one order every `pause` seconds while busy() holds, returns each booking's latency in ms"""
+    latencies = []
+    chunk = 0
+    while busy():
+        chunk += 1
+        for order in make_orders(100, users, seed=chunk, prefix=f"B{chunk}-"):  # Ids clear of the generated ones
+            start = time.perf_counter()
+            store.add_order(order)
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(pause)
+            if not busy():
+                break
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--deletes", type=int, default=100, help="Orders deleted one by one and timed")
+    parser.add_argument("--rewrites", type=int, default=3, help="Old style deletes timed")
+    parser.add_argument("--booking-pause", type=float, default=0.001, help="Seconds between bookings during compaction")
+    args = parser.parse_args()
+
+    hasher = PasswordHasher("scrypt", 10)
+    print(f"{'orders':>10}{'tombstone ms':>14}{'rewrite ms':>12}{'compact s':>11}{'dropped':>10}{'booked':>10}"
+          f"{'book p50 ms':>13}{'book p99 ms':>13}{'file MB':>15}")
+    for count in args.orders:
+        with tempfile.TemporaryDirectory() as folder:
+            users_file, orders_file, _ = generate(folder, args.users, count, hasher)
+            store = PickleStorage(users_file, orders_file)
+            users = store.get_users()
+            store.get_order_index()  # Read the journal once so the timings below are of the deletes alone
+
+            samples = []
+            for i in range(args.deletes):
+                start = time.perf_counter()
+                store.delete_order(f"O{i * (count // args.deletes)}")
+                samples.append((time.perf_counter() - start) * 1000)
+            for i in range(count // 4):
+                store.delete_order(f"O{i * 4 + 1}")  # Make a quarter of the file garbage
+
+            copy = os.path.join(folder, "rewrite.pickle")
+            write_records(copy, load_data(orders_file, order_key))
+            rewrite_ms = statistics.median(rewrite_without(copy, f"O{i * 4}") for i in range(args.rewrites)) * 1000
+
+            before = os.path.getsize(orders_file)
+            result = []
+            compaction = threading.Thread(target=lambda: result.append(store.compact()))
+            start = time.perf_counter()
+            compaction.start()
+            latencies = book_while(store, compaction.is_alive, users, args.booking_pause)
+            compaction.join()
+            compact_s = time.perf_counter() - start
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] if latencies else 0
+            p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+            size = f"{before / 1e6:.1f}->{os.path.getsize(orders_file) / 1e6:.1f}"
+            store.close()
+            print(f"{count:>10,}{statistics.median(samples):>14.3f}{rewrite_ms:>12.1f}{compact_s:>11.2f}"
+                  f"{result[0]:>10,}{len(latencies):>10,}{p50:>13.3f}{p99:>13.3f}{size:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Export orders to CSV by streaming from the store against loading them all first.
+
+The streaming export reads one order (one chunk of rows with SQLite) at a time, so its
+peak memory should stay the same however many orders there are. The other column
+loads every order with get_orders() before writing, the way the app used to. Each
+export runs twice: once for the time, once under tracemalloc for the peak memory.
+Every run opens the store afresh, so what it reads on first use (e.g. the pickle
+engine's views) is counted, as it is for the export command.
+
+Run from the project folder:
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --orders 10000 100000 1000000 --storage sqlite --format jsonl.gz
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.datagen import generate
+from Services.password_hasher import PasswordHasher
+from Storage import open_storage, export_data, convert_journal
+from Storage.export import ORDER_FIELDS, order_rows
+
+
+def load_all_then_write(store, filename):
+    orders = store.get_orders()
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(ORDER_FIELDS)
+        writer.writerows(list(order_rows(orders)))
+    return len(orders)
+
+
+def measure(open_store, func):
+    """Run func(store) twice, each time on a store just opened, returns (seconds, peak MB)"""
+    def run():
+        store = open_store()
+        try:
+            func(store)
+        finally:
+            store.close()
+
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()  # Tracing slows everything down, so it is kept out of the timed run
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--storage", choices=("pickle", "sqlite", "mmap"), nargs="+", default=["pickle", "sqlite"])
+    parser.add_argument("--format", default="csv", help="csv, jsonl, csv.gz or jsonl.gz")
+    args = parser.parse_args()
+
+    hasher = PasswordHasher("scrypt", 10)
+    print(f"{'storage':<8}{'orders':>10}{'stream s':>10}{'stream MB':>11}{'load-all s':>12}{'load-all MB':>13}")
+    for order_count in args.orders:
+        with tempfile.TemporaryDirectory() as folder:
+            users_file, orders_file, db_file = generate(folder, args.users, order_count, hasher,
+                                                        sqlite="sqlite" in args.storage)
+            table_file = os.path.join(folder, "orders.tbl")
+            if "mmap" in args.storage:
+                convert_journal(orders_file, table_file)
+            for storage in args.storage:
+                def open_store():
+                    return open_storage(storage, users_file, orders_file, db_file, table_file)
+                streamed = os.path.join(folder, f"stream.{args.format}")
+                stream_s, stream_mb = measure(open_store, lambda store: export_data(store, "orders", streamed))
+                loaded_s, loaded_mb = measure(open_store,
+                                              lambda store: load_all_then_write(store, os.path.join(folder, "all.csv")))
+                print(f"{storage:<8}{order_count:>10,}{stream_s:>10.2f}{stream_mb:>11.1f}{loaded_s:>12.2f}{loaded_mb:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
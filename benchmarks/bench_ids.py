@@ -0,0 +1,40 @@
+"""Stress the ID generator from several processes and check no ID is ever given out twice.
+
+Run from the project folder:
+    python -m benchmarks.bench_ids
+    python -m benchmarks.bench_ids --processes 1 4 16 --count 500000
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+
+from Models.id_generator import IdGenerator, claim_node_id
+
+
+def generate(node_dir, count):
+    generator = IdGenerator(claim_node_id(node_dir))
+    return [generator.next_number() for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--count", type=int, default=200_000, help="IDs per process")
+    args = parser.parse_args()
+
+    print(f"{'processes':>10}{'IDs':>12}{'IDs/second':>14}{'duplicates':>12}")
+    for processes in args.processes:
+        with tempfile.TemporaryDirectory() as node_dir, multiprocessing.Pool(processes) as pool:
+            start = time.perf_counter()
+            batches = pool.starmap(generate, [(node_dir, args.count)] * processes)
+            elapsed = time.perf_counter() - start
+        total = processes * args.count
+        duplicates = total - len({n for batch in batches for n in batch})
+        print(f"{processes:>10}{total:>12,}{total / elapsed:>14,.0f}{duplicates:>12}")
+        if duplicates:
+            raise SystemExit("Duplicate IDs found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure reservations per second on one hot event with many bookers at once.
+
+Threads share the in-process SeatInventory; processes share a SharedSeatInventory
+file. Every run also checks that exactly as many seats were taken as were confirmed.
+
+Run from the project folder:
+    python -m benchmarks.bench_inventory
+    python -m benchmarks.bench_inventory --bookers 1 8 64 --seconds 3
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from Models.event import Event
+from Services.seat_inventory import SeatInventory, SharedSeatInventory
+
+CAPACITY = 10_000_000  # Large enough that the event never sells out during a run
+
+
+def book_until(inventory, deadline):
+    booked = 0
+    while time.perf_counter() < deadline:
+        inventory.confirm(inventory.reserve("E1", 1, ttl=300))
+        booked += 1
+    return booked
+
+
+def run_threads(bookers, seconds):
+    inventory = SeatInventory()
+    inventory.add_event(Event("E1", "Grand Prix", "2025-11-14", "Yas Marina", CAPACITY))
+    counts = [0] * bookers
+    deadline = time.perf_counter() + seconds
+
+    def work(i):
+        counts[i] = book_until(inventory, deadline)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(bookers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts), CAPACITY - inventory.get_available("E1")
+
+
+def process_worker(db_file, deadline_in):
+    inventory = SharedSeatInventory(db_file)
+    booked = book_until(inventory, time.perf_counter() + deadline_in)
+    inventory.close()
+    return booked
+
+
+def run_processes(bookers, seconds):
+    with tempfile.TemporaryDirectory() as folder:
+        db_file = os.path.join(folder, "inventory.db")
+        inventory = SharedSeatInventory(db_file)
+        inventory.add_event(Event("E1", "Grand Prix", "2025-11-14", "Yas Marina", CAPACITY))
+        with multiprocessing.Pool(bookers) as pool:
+            booked = sum(pool.starmap(process_worker, [(db_file, seconds)] * bookers))
+        taken = CAPACITY - inventory.get_available("E1")
+        inventory.close()
+    return booked, taken
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookers", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'inventory':<22}{'bookers':>8}{'reservations/s':>16}{'consistent':>12}")
+    for name, run in (("threads (in-process)", run_threads), ("processes (shared)", run_processes)):
+        for bookers in args.bookers:
+            booked, taken = run(bookers, args.seconds)
+            print(f"{name:<22}{bookers:>8}{booked / args.seconds:>16,.0f}{'yes' if booked == taken else 'NO':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Time finding one order by its id in each storage engine.
+
+The same generated orders are stored with every engine (the mmap table is converted
+from the pickle journal). Each engine is opened fresh and timed on its first lookup,
+which includes reading whatever index it needs, then on random lookups once warm, and on
+a first daily sales report, which the mmap table works out from its fixed-width records
+without unpickling any order. The last column is the old way of finding an order:
+unpickling the whole orders file and looking through it.
+
+Run from the project folder:
+    python -m benchmarks.bench_lookup
+    python -m benchmarks.bench_lookup --orders 100000 1000000 --lookups 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+from Services.password_hasher import PasswordHasher
+from Storage import open_storage, convert_journal
+from Storage.pickle_files import load_data
+
+
+def ms_since(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(samples, share):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--storage", choices=("pickle", "sqlite", "mmap"), nargs="+", default=["pickle", "sqlite", "mmap"])
+    args = parser.parse_args()
+
+    hasher = PasswordHasher("scrypt", 10)
+    print(f"{'storage':<8}{'orders':>10}{'first ms':>10}{'p50 us':>9}{'p99 us':>9}{'report ms':>11}{'unpickle all ms':>17}")
+    for count in args.orders:
+        with tempfile.TemporaryDirectory() as folder:
+            users_file, orders_file, db_file = generate(folder, args.users, count, hasher,
+                                                        sqlite="sqlite" in args.storage)
+            table_file = os.path.join(folder, "orders.tbl")
+            if "mmap" in args.storage:
+                convert_journal(orders_file, table_file)
+            start = time.perf_counter()
+            wanted = f"O{count // 2}"
+            next(o for o in load_data(orders_file) if o.get_order_id() == wanted)
+            unpickle_ms = ms_since(start)
+            ids = [f"O{random.randrange(count)}" for _ in range(args.lookups)]
+            for storage in args.storage:
+                store = open_storage(storage, users_file, orders_file, db_file, table_file)
+                store.find_order(wanted)
+                store.close()  # The first run builds and saves the index files, as a previous run would have
+                store = open_storage(storage, users_file, orders_file, db_file, table_file)
+                start = time.perf_counter()
+                store.find_order(wanted)
+                first_ms = ms_since(start)
+                samples = []
+                for order_id in ids:
+                    start = time.perf_counter()
+                    store.find_order(order_id)
+                    samples.append(ms_since(start) * 1000)
+                store.close()
+                store = open_storage(storage, users_file, orders_file, db_file, table_file)
+                start = time.perf_counter()
+                store.get_daily_sales()
+                report_ms = ms_since(start)
+                store.close()
+                print(f"{storage:<8}{count:>10,}{first_ms:>10.1f}{percentile(samples, 0.5):>9.1f}"
+                      f"{percentile(samples, 0.99):>9.1f}{report_ms:>11.1f}{unpickle_ms:>17.0f}")
+
+
+if __name__ == "__main__":
+    main()
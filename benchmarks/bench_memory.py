@@ -0,0 +1,89 @@
+"""Measure how much memory the model classes use per object, with and without __slots__.
+
+The "dict" column is the same fields kept in a plain __dict__, which is how the
+models were stored before they moved to __slots__. Field values are shared
+between the copies, so only the objects themselves are counted.
+
+Run from the project folder:
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --count 200000
+"""
+import argparse
+import tracemalloc
+from datetime import datetime
+
+from Models.event import Event
+from Models.order import Order
+from Models.payment import Payment
+from Models.ticket import Ticket
+from Models.ticket_block import TicketBlock
+from Models.ticket_type import SingleRacePass, WeekendPackage, SeasonMembership, GroupDiscount
+from Models.user import User
+
+# One sample object of every model
+SAMPLES = {
+    "User": User("U1", "user", "hash", b"salt", "Full Name", "user@example.com", "0500000000", "Abu Dhabi"),
+    "Ticket": Ticket("T1", 130, "2025-05-13", "2025-05-13"),
+    "TicketBlock": TicketBlock(Ticket("T1", 130, "2025-05-13", "2025-05-13"), 4),
+    "Order": Order("O1", datetime(2025, 5, 13), "confirmed", None),
+    "Payment": Payment("P1", 520, "credit_card", transaction_date="2025-05-13"),
+    "Event": Event("E1", "Grand Prix", "2025-11-10", "Yas Marina", 60000),
+    "SingleRacePass": SingleRacePass("Single Race", 120, "Access to one race day", "Friday", "Main Grandstand"),
+    "WeekendPackage": WeekendPackage("Weekend Pass", 300, "All weekend events", "2025-11-10", "2025-11-12", []),
+    "SeasonMembership": SeasonMembership("Season Ticket", 1000, "All-season access", "2025", "Gold", []),
+    "GroupDiscount": GroupDiscount("Group Deal", 0, "Discounted for groups", 5, 15, None),
+}
+
+
+def measure(make, count):
+    """Bytes kept alive per object when count objects are made"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [make() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list holding the objects is not part of the objects
+    list_bytes = 8 * len(objects)
+    return (after - before - list_bytes) / count
+
+
+def slotted_copy(sample):
+    state = sample.__getstate__()
+    cls = type(sample)
+
+    def make():
+        obj = cls.__new__(cls)
+        obj.__setstate__(state)
+        return obj
+    return make
+
+
+def dict_copy(sample):
+    # A class of its own per model so instances share dict keys, as they did before
+    cls = type(type(sample).__name__ + "Dict", (), {})
+    state = sample.__getstate__()
+
+    def make():
+        obj = cls()
+        for name, value in state.items():
+            setattr(obj, name, value)
+        return obj
+    return make
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100_000, help="objects made per measurement")
+    args = parser.parse_args()
+
+    print(f"{'model':<18}{'dict B/obj':>12}{'slots B/obj':>13}{'dict MB/1M':>12}{'slots MB/1M':>13}{'saved':>8}")
+    for name, sample in SAMPLES.items():
+        with_dict = measure(dict_copy(sample), args.count)
+        with_slots = measure(slotted_copy(sample), args.count)
+        saved = 1 - with_slots / with_dict
+        print(f"{name:<18}{with_dict:>12.0f}{with_slots:>13.0f}"
+              f"{with_dict * 1e6 / 2 ** 20:>12.1f}{with_slots * 1e6 / 2 ** 20:>13.1f}{saved:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
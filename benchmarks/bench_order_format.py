@@ -0,0 +1,59 @@
+"""Compare the orders file with a whole user inside every order against user ids only.
+
+The same generated orders are written twice: the old way, where each order carries a
+copy of its user (password hash and salt included), and the way they are saved now,
+with only the user id. Each file is then read back with the order journal. Users can be
+given a longer address to show that only the old layout grows with the profile size.
+
+Run from the project folder:
+    python -m benchmarks.bench_order_format
+    python -m benchmarks.bench_order_format --orders 100000 --profile-bytes 0 1000 10000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.datagen import make_orders, make_users, write_old_records
+from Services.password_hasher import PasswordHasher
+from Storage.order_journal import OrderJournal
+from Storage.pickle_files import write_records
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--profile-bytes", type=int, nargs="+", default=[0, 1000], help="Extra address text per user")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    hasher = PasswordHasher("scrypt", 10)
+    print(f"{'orders':>10}{'profile':>9}  {'layout':<10}{'file MB':>9}{'write s':>9}{'load s':>8}{'orders/s':>11}")
+    with tempfile.TemporaryDirectory() as folder:
+        for padding in args.profile_bytes:
+            users = make_users(args.users, hasher)
+            for user in users:
+                user.set_address(user.get_address() + "x" * padding)
+            for count in args.orders:
+                orders = make_orders(count, users)
+                for layout, write in (("whole user", write_old_records), ("user id", write_records)):
+                    filename = os.path.join(folder, "orders.pickle")
+                    write_s = timed(lambda: write(filename, orders), args.runs)
+                    load_s = timed(OrderJournal(filename).load, args.runs)
+                    print(f"{count:>10,}{padding:>9,}  {layout:<10}{os.path.getsize(filename) / 1e6:>9.1f}"
+                          f"{write_s:>9.2f}{load_s:>8.2f}{count / load_s:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
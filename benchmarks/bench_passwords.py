@@ -0,0 +1,51 @@
+"""Measure logins per second for each password hashing setting, inline and on a process pool.
+
+Each login is one password check. "inline" checks a burst one after another on the
+calling thread, the way a single worker thread would; "pool" spreads the same burst
+over a HashingPool.
+
+Run from the project folder:
+    python -m benchmarks.bench_passwords
+    python -m benchmarks.bench_passwords --logins 64 --workers 8
+"""
+import argparse
+import os
+import time
+
+from Services.password_hasher import PasswordHasher, HashingPool, make_hash
+
+# (algorithm, cost) pairs that are measured
+SETTINGS = [("sha256", 1), ("pbkdf2", 100_000), ("pbkdf2", 600_000), ("scrypt", 14), ("scrypt", 15)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=32, help="Logins in one burst")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes in the pool")
+    args = parser.parse_args()
+
+    hasher = PasswordHasher()  # Checking reads the algorithm and cost from each stored hash
+    print(f"{'algorithm':<10}{'cost':>10}{'ms/login':>10}{'inline/s':>10}{'pool/s':>10}")
+    for algorithm, cost in SETTINGS:
+        entries = []
+        for i in range(args.logins):
+            salt, encoded = make_hash(algorithm, cost, f"password{i}")
+            entries.append((salt, encoded, f"password{i}"))
+
+        start = time.perf_counter()
+        assert all(hasher.verify(*entry) for entry in entries)
+        inline = time.perf_counter() - start
+
+        pool = HashingPool(hasher, args.workers)
+        pool.verify_many(entries[:1])  # Start the worker processes before timing
+        start = time.perf_counter()
+        assert all(pool.verify_many(entries))
+        pooled = time.perf_counter() - start
+        pool.shutdown()
+
+        print(f"{algorithm:<10}{cost:>10,}{inline * 1000 / args.logins:>10.2f}"
+              f"{args.logins / inline:>10,.0f}{args.logins / pooled:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure payment throughput and tail latency against the local fake gateway.
+
+Payments are sent through a PaymentPipeline to a FakeGateway with the given latency,
+failure and stall rates, from many booking threads at once, the way the booking
+service calls it. Each setting of concurrency and batch size is run on its own and
+payments per second, latency percentiles, retries, timeouts and failures are printed.
+No network is used, so runs can be repeated and compared offline.
+
+Run from the project folder:
+    python -m benchmarks.bench_payments
+    python -m benchmarks.bench_payments --concurrency 1 8 64 --batch 1 20 --failure-rate 0.05 --stall-rate 0.01
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Models.payment import Payment
+from Services.errors import PaymentError
+from Services.payments import FakeGateway, PaymentPipeline
+
+CARD = "1234567812345678"
+
+
+def pay(pipeline, payment):
+    start = time.perf_counter()
+    try:
+        pipeline.pay(payment, CARD)
+        failed = False
+    except PaymentError:
+        failed = True
+    return time.perf_counter() - start, failed
+
+
+def timed_run(args, concurrency, batch_size):
+    gateway = FakeGateway(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                          stall_rate=args.stall_rate, stall=args.timeout * 2, seed=args.seed)
+    pipeline = PaymentPipeline(gateway, concurrency=concurrency, timeout=args.timeout, attempts=args.attempts,
+                               batch_size=batch_size).start()
+    payments = [Payment(f"P{i}", 50.0, "credit_card") for i in range(args.payments)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as threads:
+        results = list(threads.map(lambda payment: pay(pipeline, payment), payments))
+    elapsed = time.perf_counter() - start
+    stats = pipeline.get_stats()
+    pipeline.stop()
+    latencies = sorted(latency for latency, _ in results)
+    return elapsed, latencies, stats, gateway.get_call_count()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=256, help="Booking threads paying at the same time")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 20], help="Largest number of payments per call")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds every gateway call takes at least")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Average extra seconds per call")
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--stall-rate", type=float, default=0.002, help="Share of calls whose reply is lost")
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'conc':>5}{'batch':>6}{'calls':>8}{'pay/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'retries':>9}{'timeouts':>9}{'failed':>8}")
+    for concurrency in args.concurrency:
+        for batch_size in args.batch:
+            elapsed, latencies, stats, calls = timed_run(args, concurrency, batch_size)
+            print(f"{concurrency:>5}{batch_size:>6}{calls:>8,}{len(latencies) / elapsed:>9,.0f}"
+                  f"{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.99) * 1000:>9.1f}"
+                  f"{latencies[-1] * 1000:>9.1f}{stats['retries']:>9}{stats['timeouts']:>9}{stats['failed']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Time processing large orders one ticket at a time against once per event.
+
+Each order holds single tickets spread over a few events, the way a group or a
+corporate booking would. The per-ticket loop takes one seat per ticket, so an order of
+N tickets makes N seat changes (N transactions through the shared inventory); grouped
+processing (Order.process_order) takes each event's seats in one reservation. The
+last table makes the final event too small for the order: the per-ticket loop leaves
+the seats it already took, grouped processing gives every one of them back.
+
+Run from the project folder:
+    python -m benchmarks.bench_process_order
+    python -m benchmarks.bench_process_order --tickets 10 100 1000 10000 --events 3 --target events shared
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from Models.event import Event
+from Models.order import Order
+from Models.ticket import Ticket
+from Models.user import User
+from Services.seat_inventory import SeatInventory, SharedSeatInventory
+
+USER = User("U1", "bench", "hash", b"salt", "Bench User", "bench@example.com", "", "")
+
+
+def make_order(events, tickets):
+    """An order of single tickets, dealt out over the events in turn"""
+    order = Order("O1", "2025-05-13", "pending", USER)
+    for i in range(tickets):
+        order.add_ticket(Ticket(f"T{i}", 130, "", "", event=events[i % len(events)]))
+    return order
+
+
+def make_target(kind, folder, events):
+    """Returns the inventory to book through, None to change the Event objects directly"""
+    if kind == "events":
+        return None
+    inventory = SeatInventory() if kind == "memory" else SharedSeatInventory(os.path.join(folder, "inventory.db"))
+    for event in events:
+        inventory.add_event(event)
+    return inventory
+
+
+def per_ticket(order, inventory):
+    """The old loop: one seat per ticket, stops at the first event that has none left"""
+    for ticket in order.get_tickets():
+        event = ticket.get_event()
+        if inventory is None:
+            event.reduce_seats(1)
+        else:
+            hold_id = inventory.reserve(event.get_event_id(), 1)
+            if hold_id is None:
+                raise ValueError(f"Not enough seats available for {event.get_name()}")
+            inventory.confirm(hold_id)
+    order.set_status("confirmed")
+
+
+def grouped(order, inventory):
+    order.process_order(inventory)
+
+
+def run(kind, process, events, tickets, short=0):
+    """Returns (ms, seats left taken after a failure). With `short` the last event is that many seats too small."""
+    with tempfile.TemporaryDirectory() as folder:
+        per_event = -(-tickets // events)  # The most tickets any event gets
+        capacities = [per_event * 2] * events
+        capacities[-1] = tickets // events - short if short else capacities[-1]
+        event_list = [Event(f"E{i}", f"Race {i}", "2025-11-14", "Circuit", capacity)
+                      for i, capacity in enumerate(capacities)]
+        inventory = make_target(kind, folder, event_list)
+        order = make_order(event_list, tickets)
+        start = time.perf_counter()
+        try:
+            process(order, inventory)
+        except ValueError:
+            pass
+        ms = (time.perf_counter() - start) * 1000
+        if inventory is None:
+            available = sum(event.get_available_seats() for event in event_list)
+        else:
+            available = sum(inventory.get_available(event.get_event_id()) for event in event_list)
+            if kind == "shared":
+                inventory.close()
+        return ms, sum(capacities) - available
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, nargs="+", default=[10, 100, 1000, 10_000], help="Tickets per order")
+    parser.add_argument("--events", type=int, default=3, help="Events the tickets are spread over")
+    parser.add_argument("--target", choices=("events", "memory", "shared"), nargs="+",
+                        default=["events", "memory", "shared"],
+                        help="Change the Event objects, or book through the in-process or shared inventory")
+    args = parser.parse_args()
+
+    print(f"{'target':<8}{'tickets':>9}{'per ticket ms':>15}{'grouped ms':>12}{'speed-up':>10}")
+    for kind in args.target:
+        for tickets in args.tickets:
+            old, _ = run(kind, per_ticket, args.events, tickets)
+            new, _ = run(kind, grouped, args.events, tickets)
+            print(f"{kind:<8}{tickets:>9,}{old:>15.2f}{new:>12.2f}{old / new:>9.1f}x")
+
+    print("\nLast event one seat short, seats left taken after the order failed:")
+    print(f"{'target':<8}{'tickets':>9}{'per ticket':>12}{'grouped':>9}")
+    for kind in args.target:
+        for tickets in args.tickets:
+            _, old = run(kind, per_ticket, args.events, tickets, short=1)
+            _, new = run(kind, grouped, args.events, tickets, short=1)
+            print(f"{kind:<8}{tickets:>9,}{old:>12,}{new:>9,}")
+
+
+if __name__ == "__main__":
+    main()
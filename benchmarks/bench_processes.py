@@ -0,0 +1,103 @@
+"""Book from several processes sharing one data folder and check that no order is lost.
+
+Every process opens its own BookingService on the same files, the way several copies
+of the app would, waits for the others and then books tickets for random users as fast
+as it can, changing a profile every few bookings. Commits take turns on a lock file and
+each process first takes in what the others appended, so afterwards the orders file
+must hold every booking; the 'lost' column counts the ones missing. Throughput is shown
+for each process count, with the speed-up over a single process.
+
+Run from the project folder:
+    python -m benchmarks.bench_processes
+    python -m benchmarks.bench_processes --processes 1 2 4 8 16 --bookings 1000 --storage pickle sqlite
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+from Services.booking_service import open_service
+from Services.password_hasher import PasswordHasher
+from Storage import open_storage
+
+CARD = "1234567812345678"
+
+
+def book_in_process(storage, files, worker, bookings, user_count, update_every, ready, go, results):
+    """Book in one process once `go` is set, puts each booking's latency in ms on `results`"""
+    service = open_service(storage, hasher=PasswordHasher("scrypt", 10), compact_interval=None, **files)
+    service.get_store().find_order("warm-up")  # Read the index before the clock starts
+    rng = random.Random(worker)
+    latencies = []
+    ready.release()
+    go.wait()
+    for i in range(bookings):
+        user_id = f"U{rng.randrange(user_count)}"
+        start = time.perf_counter()
+        service.book(user_id, "RacePass", 1, CARD)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if update_every and i % update_every == 0:
+            service.update_profile(user_id, f"User {worker}-{i}", "0500000000", f"Street {worker}-{i}")
+    service.close()
+    results.put(latencies)
+
+
+def run(storage, processes, bookings, user_count, order_count, update_every, hasher):
+    """Returns (seconds, every latency, orders missing afterwards)"""
+    with tempfile.TemporaryDirectory() as folder:
+        users_file, orders_file, db_file = generate(folder, user_count, order_count, hasher, sqlite=storage == "sqlite")
+        files = dict(users_file=users_file, orders_file=orders_file, db_file=db_file,
+                     inventory_file=os.path.join(folder, "inventory.db"), node_id_dir=os.path.join(folder, "node_ids"))
+        ready, go, results = multiprocessing.Semaphore(0), multiprocessing.Event(), multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=book_in_process,
+                                           args=(storage, files, worker, bookings, user_count, update_every,
+                                                 ready, go, results))
+                   for worker in range(processes)]
+        for worker in workers:
+            worker.start()
+        for _ in workers:
+            ready.acquire()
+        start = time.perf_counter()
+        go.set()
+        latencies = [latency for _ in workers for latency in results.get()]
+        seconds = time.perf_counter() - start
+        for worker in workers:
+            worker.join()
+        store = open_storage(storage, users_file, orders_file, db_file)
+        stored = sum(1 for _ in store.iter_orders())
+        store.close()
+        return seconds, latencies, order_count + processes * bookings - stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--bookings", type=int, default=500, help="Bookings made by each process")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=10_000, help="Orders stored before the run")
+    parser.add_argument("--update-every", type=int, default=10, help="Bookings between two profile changes, 0 for none")
+    parser.add_argument("--storage", choices=("pickle", "sqlite"), nargs="+", default=["pickle"])
+    args = parser.parse_args()
+
+    hasher = PasswordHasher("scrypt", 10)
+    print(f"{'storage':<8}{'processes':>10}{'bookings':>10}{'seconds':>9}{'per s':>9}{'speed-up':>10}"
+          f"{'p50 ms':>8}{'p99 ms':>8}{'lost':>6}")
+    for storage in args.storage:
+        single = None
+        for processes in args.processes:
+            seconds, latencies, lost = run(storage, processes, args.bookings, args.users, args.orders,
+                                           args.update_every, hasher)
+            latencies.sort()
+            rate = len(latencies) / seconds
+            if processes == 1:
+                single = rate
+            speed_up = f"{rate / single:.2f}x" if single else "-"
+            print(f"{storage:<8}{processes:>10}{len(latencies):>10,}{seconds:>9.2f}{rate:>9,.0f}{speed_up:>10}"
+                  f"{latencies[len(latencies) // 2]:>8.2f}{latencies[int(len(latencies) * 0.99)]:>8.2f}{lost:>6}")
+
+
+if __name__ == "__main__":
+    main()
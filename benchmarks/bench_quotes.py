@@ -0,0 +1,56 @@
+"""Price thousands of carts with the quote table against calling calculate_price per line.
+
+Each cart has 1 to 4 lines of a random ticket type and quantity. The discount is
+changed between rounds so the cost of redoing the affected rows is included.
+Uses NumPy when it is installed, plain lists otherwise.
+
+Run from the project folder:
+    python -m benchmarks.bench_quotes
+    python -m benchmarks.bench_quotes --carts 1000 100000
+"""
+import argparse
+import random
+import time
+
+from Services.catalog import get_ticket_types
+from Services.pricing import QuoteTable, np
+
+
+def make_carts(count, names, seed=42):
+    rng = random.Random(seed)
+    return [[(rng.choice(names), rng.randint(1, 12)) for _ in range(rng.randint(1, 4))] for _ in range(count)]
+
+
+def price_directly(ticket_types, carts):
+    return [sum(ticket_types[name].calculate_price(quantity) for name, quantity in cart) for cart in carts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carts", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    ticket_types = get_ticket_types()
+    table = QuoteTable(ticket_types)
+    group = ticket_types["Group"]
+    print(f"Quote table storage: {'NumPy' if np is not None else 'lists (NumPy not installed)'}")
+    print(f"{'carts':>9}{'direct ms':>12}{'table ms':>11}{'speedup':>9}")
+    for count in args.carts:
+        carts = make_carts(count, list(ticket_types))
+        direct = lookup = 0.0
+        for round_number in range(args.rounds):
+            group.set_discount_percentage(10 + round_number)  # Only the group row has to be redone
+            start = time.perf_counter()
+            expected = price_directly(ticket_types, carts)
+            direct += time.perf_counter() - start
+            start = time.perf_counter()
+            totals = table.quote_carts(carts)
+            lookup += time.perf_counter() - start
+            assert all(abs(a - b) < 1e-6 for a, b in zip(expected, totals))
+        print(f"{count:>9,}{direct * 1000 / args.rounds:>12.2f}{lookup * 1000 / args.rounds:>11.2f}"
+              f"{direct / lookup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
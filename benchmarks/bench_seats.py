@@ -0,0 +1,101 @@
+"""Time finding and holding the best seats in a 100,000 seat map.
+
+A circuit of several sections is filled at random to each fill level, then the best
+N seats are held (found and marked taken) and released again, so the fill stays the
+same. Front rows and middle seats are best and seats together are preferred, so at high
+fill levels the search walks many rows and may fall back to seats apart. The last
+table books through the shared SQLite inventory, with and without a seat map, to show
+what numbering the seats adds to a booking.
+
+Run from the project folder:
+    python -m benchmarks.bench_seats
+    python -m benchmarks.bench_seats --rows 100 --width 250 --sections 4 --fill 0 50 90 99 --quantity 1 2 4 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from Models.event import Event
+from Models.seat_map import SeatMap, SeatSection
+from Services.seat_inventory import SharedSeatInventory
+
+
+def percentile(samples, share):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * share))]
+
+
+def make_map(sections, rows, width):
+    return SeatMap([SeatSection(f"S{i}", rows, width) for i in range(sections)])
+
+
+def fill(seat_map, share, rng):
+    """Take a random share of the seats"""
+    seats = [(section.get_name(), row, seat) for section in seat_map.get_sections()
+             for row in range(section.get_row_count()) for seat in range(section.get_row_width())]
+    seat_map.take(rng.sample(seats, int(len(seats) * share)))
+
+
+def book_shared(folder, seat_map, bookings, quantity):
+    """Book through a shared inventory, returns each booking's latency in ms"""
+    inventory = SharedSeatInventory(os.path.join(folder, f"inventory-{seat_map is not None}.db"))
+    capacity = seat_map.get_capacity() if seat_map is not None else 100_000
+    inventory.add_event(Event("E1", "Race Day", "2025-11-14", "Circuit", capacity, seat_map))
+    latencies = []
+    for _ in range(bookings):
+        start = time.perf_counter()
+        hold_id = inventory.reserve("E1", quantity, ttl=300)
+        inventory.get_hold_seats(hold_id)
+        inventory.confirm(hold_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    inventory.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=100, help="Rows per section")
+    parser.add_argument("--width", type=int, default=250, help="Seats per row")
+    parser.add_argument("--fill", type=int, nargs="+", default=[0, 50, 90, 99], help="Percent of seats taken first")
+    parser.add_argument("--quantity", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--holds", type=int, default=2000, help="Holds timed per fill level and quantity")
+    parser.add_argument("--bookings", type=int, default=500, help="Bookings through the shared inventory")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    seat_map = make_map(args.sections, args.rows, args.width)
+    size = sum(len(section.to_bytes()) for section in seat_map.get_sections())
+    print(f"{seat_map.get_capacity():,} seats, {size / 1024:.1f} KB of bitmaps")
+    print(f"{'fill %':>7}{'seats':>7}{'hold p50 us':>13}{'hold p99 us':>13}{'release p50 us':>16}{'together %':>12}")
+    for share in args.fill:
+        seat_map = make_map(args.sections, args.rows, args.width)
+        fill(seat_map, share / 100, rng)
+        for quantity in args.quantity:
+            holds, releases, together = [], [], 0
+            for _ in range(args.holds):
+                start = time.perf_counter()
+                try:
+                    seats = seat_map.hold_best(quantity)
+                except ValueError:
+                    break  # Sold out
+                holds.append((time.perf_counter() - start) * 1e6)
+                together += seats[-1][2] - seats[0][2] == quantity - 1 and len({row for _, row, _ in seats}) == 1
+                start = time.perf_counter()
+                seat_map.release(seats)
+                releases.append((time.perf_counter() - start) * 1e6)
+            if holds:
+                print(f"{share:>7}{quantity:>7}{percentile(holds, 0.5):>13.1f}{percentile(holds, 0.99):>13.1f}"
+                      f"{percentile(releases, 0.5):>16.1f}{together * 100 / len(holds):>12.0f}")
+
+    print(f"\n{'shared inventory':<18}{'p50 ms':>8}{'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as folder:
+        for name, seats in (("count only", None), ("seat map", make_map(args.sections, args.rows, args.width))):
+            latencies = book_shared(folder, seats, args.bookings, 2)
+            print(f"{name:<18}{percentile(latencies, 0.5):>8.2f}{percentile(latencies, 0.99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
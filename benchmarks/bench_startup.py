@@ -0,0 +1,105 @@
+"""Measure how long the app takes to start: imports, opening the store and the first requests.
+
+Every measurement runs in a fresh Python process so nothing is already imported or
+cached. Import cost comes from python -X importtime (the cumulative time of the
+top-level module); the rest is wall clock around open_service and the first login,
+order list and sales report, on generated data of the given size. Users and the order
+index are only read when first needed, so their cost shows up in the first request
+that uses them instead of in opening the store.
+
+Run from the project folder:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --users 10000 --orders 100000 --storage pickle sqlite
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.datagen import generate, user_email, PASSWORD
+from Services.password_hasher import PasswordHasher
+
+# Modules the app and the API server start from
+MODULES = ("Models", "Storage", "Services", "Services.booking_service", "Services.api_server", "TicketBookingSystem")
+
+# Timed in the child process, prints one JSON line of milliseconds
+PHASES_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from Services import open_service, PasswordHasher
+times = {"import": time.perf_counter() - start}
+storage, users_file, orders_file, db_file, inventory_file, node_id_dir, email, password = sys.argv[1:]
+
+def timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    times[name] = time.perf_counter() - start
+    return result
+
+service = timed("open_service", lambda: open_service(storage, users_file, orders_file, db_file, inventory_file,
+                                                     node_id_dir, hasher=PasswordHasher("scrypt", 10)))
+user = timed("first_login", lambda: service.login(email, password))
+timed("first_orders", lambda: service.get_user_orders(user["user_id"]))
+timed("first_report", service.sales_report)
+timed("close", service.close)
+print(json.dumps({name: seconds * 1000 for name, seconds in times.items()}))
+"""
+PHASES = ("import", "open_service", "first_login", "first_orders", "first_report", "close")
+
+
+def import_time(module):
+    """Cumulative import time of a module in ms, and whether importing it loaded tkinter"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             f"import sys, {module}; print('tkinter' in sys.modules)"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, None  # e.g. no tkinter on this machine
+    for line in reversed(result.stderr.splitlines()):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000, result.stdout.strip() == "True"
+    return None, None
+
+
+def phase_times(storage, files):
+    """Time the start of one fresh process, returns {phase: ms}"""
+    result = subprocess.run([sys.executable, "-c", PHASES_SCRIPT, storage, *files, user_email(0), PASSWORD],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--storage", choices=("pickle", "sqlite"), nargs="+", default=["pickle"])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<26}{'import ms':>10}  tkinter")
+    for module in MODULES:
+        samples = [import_time(module) for _ in range(args.runs)]
+        if samples[0][0] is None:
+            print(f"{module:<26}{'n/a':>10}")
+            continue
+        print(f"{module:<26}{statistics.median(ms for ms, _ in samples):>10.1f}  {'yes' if samples[0][1] else 'no'}")
+
+    with tempfile.TemporaryDirectory() as folder:
+        users_file, orders_file, db_file = generate(folder, args.users, args.orders, PasswordHasher("scrypt", 10),
+                                                    sqlite="sqlite" in args.storage)
+        files = (users_file, orders_file, db_file, os.path.join(folder, "inventory.db"),
+                 os.path.join(folder, "node_ids"))
+        print(f"\nFresh process, {args.users:,} users and {args.orders:,} orders (median of {args.runs}, ms):")
+        print(f"{'storage':<8}" + "".join(f"{phase:>14}" for phase in PHASES))
+        for storage in args.storage:
+            phase_times(storage, files)  # The first run builds the index files and warms the disk cache
+            runs = [phase_times(storage, files) for _ in range(args.runs)]
+            print(f"{storage:<8}" + "".join(f"{statistics.median(run[phase] for run in runs):>14.1f}"
+                                            for phase in PHASES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare the pickle and SQLite storage engines on the lookups the app does.
+
+Run from the project folder:
+    python -m benchmarks.bench_storage                  # 10k, 100k and 1M orders
+    python -m benchmarks.bench_storage --sizes 10000    # just one size
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from Models.order import Order
+from Models.ticket import Ticket
+from Models.user import User
+from Storage import PickleStorage, SQLiteStorage, save_data
+
+
+def make_data(order_count, seed=42):
+    """Create users and orders that look like the ones the app books"""
+    rng = random.Random(seed)
+    user_count = max(order_count // 10, 1)
+    users = [User(f"U{i}", f"user{i}", "hash", b"salt", f"User {i}", f"user{i}@example.com", "", "")
+             for i in range(user_count)]
+    start = datetime(2025, 1, 1)
+    orders = []
+    for i in range(order_count):
+        order_date = start + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        order = Order(f"O{i}", order_date, "confirmed", rng.choice(users))
+        order.add_ticket(Ticket(f"T{i}", 130, order_date.strftime("%Y-%m-%d"), order_date.strftime("%Y-%m-%d")))
+        orders.append(order)
+    return users, orders
+
+
+def time_call(func, repeat):
+    """Average wall-clock time of one call in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def run_backend(store, users, orders, rng):
+    emails = [rng.choice(users).get_email().upper() for _ in range(50)]
+    user_ids = [rng.choice(users).get_user_id() for _ in range(10)]
+    day = datetime(2025, 6, 1).date()
+    extra = iter(range(10 ** 9))
+
+    def new_order():
+        n = next(extra)
+        order = Order(f"N{n}", datetime(2025, 6, 1), "confirmed", users[0])
+        order.add_ticket(Ticket(f"NT{n}", 130, "2025-06-01", "2025-06-01"))
+        return order
+
+    results = {
+        "find_user_by_email": time_call(lambda: store.find_user_by_email(emails[rng.randrange(len(emails))]), 50),
+        "get_user_orders": time_call(lambda: store.get_user_orders(user_ids[rng.randrange(len(user_ids))]), 5),
+        "get_orders_between (1 day)": time_call(lambda: store.get_orders_between(day, day), 3),
+        "add_order": time_call(lambda: store.add_order(new_order()), 20),
+        "delete_order": time_call(lambda: store.delete_order(orders[rng.randrange(len(orders))].get_order_id()), 1),
+    }
+    store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        users, orders = make_data(size)
+        with tempfile.TemporaryDirectory() as folder:
+            users_file = os.path.join(folder, "users.pickle")
+            orders_file = os.path.join(folder, "orders.pickle")
+            save_data(users_file, users)
+            save_data(orders_file, orders)
+            pickle_results = run_backend(PickleStorage(users_file, orders_file), users, orders, random.Random(1))
+
+            sqlite_store = SQLiteStorage(os.path.join(folder, "bookings.db"))
+            sqlite_store.add_users(users)
+            sqlite_store.add_orders(orders)
+            sqlite_results = run_backend(sqlite_store, users, orders, random.Random(1))
+
+        print(f"\n{size:,} orders, {len(users):,} users (ms per call)")
+        print(f"{'operation':<28}{'pickle':>12}{'sqlite':>12}")
+        for name in pickle_results:
+            print(f"{name:<28}{pickle_results[name]:>12.3f}{sqlite_results[name]:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Create a folder of synthetic users and orders in the app's own file formats.
+
+Every user has the password "password", hashed with the chosen setting so the
+data can be logged into. Orders use the real ticket types and events, spread over
+the year before the given end date.
+
+Run from the project folder:
+    python -m benchmarks.datagen --users 1000 --orders 10000 --out loadtest
+    python -m benchmarks.datagen --users 10000 --orders 100000 --out loadtest --sqlite
+"""
+import argparse
+import copyreg
+import os
+import pickle
+import random
+from datetime import datetime, timedelta
+
+from Models.order import Order
+from Models.ticket import Ticket
+from Models.user import User
+from Services.catalog import get_ticket_types, get_events
+from Services.password_hasher import PasswordHasher
+from Storage import save_data, migrate_pickle_to_sqlite
+from Models.slotted import SlottedModel
+from Storage.pickle_files import ADD, write_records
+
+PASSWORD = "password"  # Password of every generated user
+
+
+def user_email(number):
+    return f"user{number}@example.com"
+
+
+def make_users(count, hasher):
+    """Create users that can log in with PASSWORD"""
+    # One hash shared by everyone, hashing thousands of passwords would take minutes
+    salt, hashed = hasher.hash(PASSWORD)
+    return [User(f"U{i}", f"user{i}", hashed, salt, f"User {i}", user_email(i), f"050{i:07d}", f"Street {i}")
+            for i in range(count)]
+
+
+def make_orders(count, users, end=None, seed=42, prefix="O"):
+    """Create orders the way the booking service does, for random users, types and days"""
+    rng = random.Random(seed)
+    ticket_types = get_ticket_types()
+    events = get_events()
+    names = list(ticket_types)
+    end = end or datetime.now()
+    orders = []
+    for i in range(count):
+        name = rng.choice(names)
+        quantity = rng.randint(1, 6)
+        order_date = end - timedelta(minutes=rng.randrange(365 * 24 * 60))
+        day = order_date.strftime("%Y-%m-%d")
+        order = Order(f"{prefix}{i}", order_date, "confirmed", rng.choice(users))
+        order.add_tickets(Ticket(f"T{i}", ticket_types[name].calculate_price(1), day, day, event=events[name]), quantity)
+        orders.append(order)
+    return orders
+
+
+class OldOrderPickler(pickle.Pickler):
+    # Pickles orders the way they were saved before only the user id was kept: with a
+    # whole copy of the user, password hash and salt included, inside every order
+    def reducer_override(self, obj):
+        if type(obj) is not Order:
+            return NotImplemented
+        state = SlottedModel.__getstate__(obj)
+        del state["_user_id"]
+        return copyreg.__newobj__, (Order,), state
+
+
+def write_old_records(filename, orders):
+    """Write orders to a journal file in the old layout, one record each"""
+    with open(filename, "wb") as f:
+        for order in orders:
+            OldOrderPickler(f).dump((ADD, order))
+
+
+def generate(folder, user_count, order_count, hasher=None, sqlite=False, seed=42):
+    """Write users.pickle and orders.pickle (and bookings.db if asked) into a folder.
+    Returns the paths of the users file, the orders file and the database."""
+    os.makedirs(folder, exist_ok=True)
+    users_file = os.path.join(folder, "users.pickle")
+    orders_file = os.path.join(folder, "orders.pickle")
+    db_file = os.path.join(folder, "bookings.db")
+    users = make_users(user_count, hasher or PasswordHasher())
+    save_data(users_file, users)
+    write_records(orders_file, make_orders(order_count, users, seed=seed))
+    if sqlite:
+        migrate_pickle_to_sqlite(users_file, orders_file, db_file)
+    return users_file, orders_file, db_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=10_000)
+    parser.add_argument("--out", default="loadtest", help="Folder to write the files into")
+    parser.add_argument("--sqlite", action="store_true", help="Also build bookings.db from the pickle files")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate(args.out, args.users, args.orders, sqlite=args.sqlite, seed=args.seed)
+    print(f"Wrote {args.users:,} user(s) and {args.orders:,} order(s) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
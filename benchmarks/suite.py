@@ -0,0 +1,165 @@
+"""Time the booking system's hot paths on synthetic data, save JSON and check for regressions.
+
+For each storage engine and scale (users:orders) a fresh data folder is generated,
+then every operation the app offers is timed through the headless BookingService,
+so no window or display is needed. Results are written as JSON so two commits can
+be compared; with --baseline the run fails (exit code 1) when any operation got
+slower than the threshold allows.
+
+Run from the project folder:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --scales 1000:10000 10000:100000 --storage pickle sqlite
+    python -m benchmarks.suite --output new.json --baseline results.json --threshold 1.5
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.datagen import generate, user_email, PASSWORD
+from Services.booking_service import open_service
+from Services.password_hasher import PasswordHasher
+
+CARD = "1234567812345678"
+OPERATIONS = ("open_store", "login", "register", "book", "load_user_orders", "generate_report",
+              "delete_selected_order", "delete_account")
+
+
+def time_once(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_scale(storage, user_count, order_count, runs, hasher, seed):
+    """Time every operation at one scale, returns {operation: [milliseconds, ...]}"""
+    if user_count < 2 * runs:
+        raise ValueError("Need at least two users per run")
+    rng = random.Random(seed)
+    timings = {name: [] for name in OPERATIONS}
+    with tempfile.TemporaryDirectory() as folder:
+        users_file, orders_file, db_file = generate(folder, user_count, order_count, hasher,
+                                                    sqlite=storage == "sqlite", seed=seed)
+        files = dict(users_file=users_file, orders_file=orders_file, db_file=db_file,
+                     inventory_file=os.path.join(folder, "inventory.db"), node_id_dir=os.path.join(folder, "node_ids"))
+
+        service = None
+        for _ in range(runs):
+            if service is not None:
+                service.close()
+            start = time.perf_counter()
+            service = open_service(storage, hasher=hasher, **files)  # The first run also builds the indexes
+            timings["open_store"].append((time.perf_counter() - start) * 1000)
+
+        # Users that are deleted during the run are never picked again
+        alive = list(range(user_count))
+        rng.shuffle(alive)
+        for i in range(runs):
+            number = alive[i]
+            timings["login"].append(time_once(lambda: service.login(user_email(number), PASSWORD)))
+            timings["register"].append(time_once(lambda: service.register(f"new{i}", f"new{i}@example.com", PASSWORD)))
+            timings["book"].append(time_once(lambda: service.book(f"U{number}", "RacePass", 2, CARD)))
+            timings["load_user_orders"].append(time_once(lambda: service.get_user_orders(f"U{number}")))
+            timings["generate_report"].append(time_once(service.sales_report))
+            order_id = service.get_user_orders(f"U{number}")[0]["order_id"]
+            timings["delete_selected_order"].append(time_once(lambda: service.delete_order(f"U{number}", order_id)))
+            timings["delete_account"].append(time_once(lambda: service.delete_account(f"U{alive[-1 - i]}")))
+        service.close()
+    return timings
+
+
+def summarize(storage, user_count, order_count, operation, samples):
+    samples = sorted(samples)
+    return {"storage": storage, "users": user_count, "orders": order_count, "operation": operation,
+            "runs": len(samples),
+            "median_ms": round(statistics.median(samples), 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            "min_ms": round(samples[0], 3)}
+
+
+def result_key(result):
+    return result["storage"], result["users"], result["orders"], result["operation"]
+
+
+def compare(baseline, current, threshold):
+    """Compare two result lists, returns [(key, old median, new median, ratio, regressed)]"""
+    old = {result_key(r): r["median_ms"] for r in baseline}
+    rows = []
+    for result in current:
+        key = result_key(result)
+        if key in old:
+            ratio = result["median_ms"] / old[key] if old[key] else 1.0
+            rows.append((key, old[key], result["median_ms"], ratio, ratio > threshold))
+    return rows
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_scale(text):
+    users, _, orders = text.partition(":")
+    return int(users), int(orders)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=parse_scale, nargs="+", default=[(100, 1000), (1000, 10_000), (10_000, 100_000)],
+                        help="users:orders pairs")
+    parser.add_argument("--storage", choices=("pickle", "sqlite"), nargs="+", default=["pickle", "sqlite"])
+    parser.add_argument("--runs", type=int, default=5, help="Times each operation is timed per scale")
+    parser.add_argument("--kdf", choices=("scrypt", "pbkdf2"), default="scrypt")
+    parser.add_argument("--kdf-cost", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="Fail when a median is more than this many times the baseline's")
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(args.kdf, args.kdf_cost)
+    results = []
+    print(f"{'storage':<8}{'users':>8}{'orders':>10}  {'operation':<22}{'median ms':>10}{'p95 ms':>10}")
+    for storage in args.storage:
+        for user_count, order_count in args.scales:
+            timings = run_scale(storage, user_count, order_count, args.runs, hasher, args.seed)
+            for operation in OPERATIONS:
+                result = summarize(storage, user_count, order_count, operation, timings[operation])
+                results.append(result)
+                print(f"{storage:<8}{user_count:>8,}{order_count:>10,}  {operation:<22}"
+                      f"{result['median_ms']:>10.2f}{result['p95_ms']:>10.2f}")
+
+    report = {"meta": {"commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "kdf": hasher.get_algorithm(), "kdf_cost": hasher.get_cost(), "runs": args.runs},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(baseline["results"], results, args.threshold)
+        print(f"\nAgainst {args.baseline} (commit {baseline['meta'].get('commit')}), threshold {args.threshold}x:")
+        for (storage, users, orders, operation), old, new, ratio, regressed in rows:
+            print(f"{storage:<8}{users:>8,}{orders:>10,}  {operation:<22}{old:>10.2f}{new:>10.2f}{ratio:>8.2f}x"
+                  f"{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
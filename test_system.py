@@ -1,13 +1,40 @@
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from datetime import date
+from datetime import date, datetime
 from Models.user import User
 from Models.ticket import Ticket
 from Models.ticket_type import SingleRacePass, WeekendPackage, SeasonMembership, GroupDiscount
 from Models.event import Event
+from Models.seat_map import SeatMap, SeatSection, seat_label
 from Models.order import Order
 from Models.payment import Payment
 from Models.admin import Admin
 from Models.sales_report import SalesReport
+from Models.id_generator import IdGenerator, claim_node_id, split_id, SEQUENCE_COUNT
+from Services import (QuoteTable, SalesColumns, BackgroundWorker, SeatInventory, SharedSeatInventory, PasswordHasher, HashingPool,
+                      BookingService, BookingError, ApiServer, BookingClient, PaymentPipeline, FakeGateway, PaymentDeclined,
+                      GatewayError)
+from Services.password_hasher import derive
+from Services.catalog import get_ticket_types
+from benchmarks import datagen, suite
+from Storage import (export_data, load_data, save_data, Compactor, OrderJournal, PickleStorage, SQLiteStorage, migrate_pickle_to_sqlite,
+                     migrate_orders_to_user_ids, TableStorage, OrderTable, convert_journal, open_storage, ConflictError,
+                     DuplicateEmailError, StorageInUseError, FileLock)
+from Storage.order_table import HashIndex
+from Storage.pickle_files import ADD, DELETE
 
 
 class TestUser(unittest.TestCase):
@@ -157,6 +184,57 @@ class TestEvent(unittest.TestCase):
         self.event.increase_seats(5)
         self.assertEqual(self.event.check_availability(), 95)
 
+    def test_seat_map_is_not_saved_with_the_event(self):
+        event = Event("E9", "Race Day", "2025-11-14", "Main Grandstand", 100000, SeatMap([SeatSection("A", 400, 250)]))
+        self.assertEqual(len(event.hold_seats(2, "A")), 2)
+        self.assertLess(len(pickle.dumps(event)), 500)
+        self.assertIsNone(pickle.loads(pickle.dumps(event)).get_seat_map())
+        with self.assertRaises(ValueError):
+            Event("E9", "Race Day", "2025-11-14", "Main Grandstand", 10, SeatMap([SeatSection("A", 2, 10)]))
+
+
+class TestSeatMap(unittest.TestCase):
+
+    def setUp(self):
+        self.section = SeatSection("Main", 3, 10)
+        self.seats = SeatMap([self.section, SeatSection("Upper", 2, 4)])
+
+    def test_best_seats_are_together_front_and_middle(self):
+        self.assertEqual(self.section.find_adjacent(4), [(0, 3), (0, 4), (0, 5), (0, 6)])
+        self.section.take([(0, seat) for seat in range(2, 8)])
+        self.assertEqual(self.section.find_adjacent(2), [(0, 0), (0, 1)])
+        self.assertEqual(self.section.find_adjacent(3), [(1, 3), (1, 4), (1, 5)])  # Row 0 has no three together
+        self.assertEqual(seat_label(("Main", 1, 3)), "Main, row 2, seat 4")
+
+    def test_falls_back_to_seats_apart(self):
+        self.section.take([(row, seat) for row in range(3) for seat in range(10) if seat % 2])
+        self.assertIsNone(self.section.find_adjacent(2))
+        self.assertEqual(self.seats.find_best(2, "Main"), [("Main", 0, 4), ("Main", 0, 6)])
+        self.assertEqual(len(self.seats.find_best(3)), 3)
+        self.assertEqual(self.seats.find_best(3)[0][0], "Upper")  # Together in the next section beats apart
+        self.assertIsNone(self.seats.find_best(16, "Main"))
+
+    def test_take_and_release(self):
+        seats = self.seats.hold_best(5, "Main")
+        self.assertEqual(self.seats.get_free_count(), 33)
+        with self.assertRaises(ValueError):
+            self.seats.take([("Upper", 0, 0)] + seats[:1])
+        self.assertFalse(self.seats.get_section("Upper").is_taken(0, 0))  # Nothing taken when one seat fails
+        self.assertEqual(self.seats.release(seats + [("Gone", 0, 0)]), 5)
+        self.assertEqual(self.seats.get_free_count(), 38)
+
+    def test_bitmap_round_trip(self):
+        section = SeatSection("Main", 400, 250)
+        section.take([(row, seat) for row in range(0, 400, 7) for seat in range(0, 250, 3)])
+        data = section.to_bytes()
+        self.assertEqual(len(data), 400 * 32)
+        copy = SeatSection("Main", 400, 250)
+        copy.load_bytes(data)
+        self.assertEqual((copy.get_free_count(), copy.find_adjacent(6)), (section.get_free_count(), section.find_adjacent(6)))
+        with self.assertRaises(ValueError):
+            SeatSection("Main", 10, 10).load_bytes(data)
+
+
 class TestOrder(unittest.TestCase):
     def setUp(self):
         ticket1 = Ticket(1, 100.0, "2025-01-01", "2025-01-05")
@@ -168,6 +246,93 @@ class TestOrder(unittest.TestCase):
         self.order.add_ticket(ticket1)
         self.order.add_ticket(ticket2)
 
+    def test_total_and_count(self):
+        self.assertEqual(self.order.get_total(), 250.0)
+        self.assertEqual(self.order.get_ticket_count(), 2)
+        self.order.remove_ticket(self.order.get_tickets()[0])
+        self.assertEqual(self.order.get_total(), 150.0)
+        self.assertEqual(self.order.get_ticket_count(), 1)
+
+    def test_ticket_block(self):
+        self.order.add_tickets(Ticket("T9", 130, "2025-05-13", "2025-05-13"), 500)
+        self.assertEqual(self.order.get_ticket_count(), 502)
+        self.assertEqual(self.order.get_total(), 250.0 + 130 * 500)
+        self.assertEqual(len(self.order.get_blocks()), 1)
+        tickets = self.order.get_tickets()
+        self.assertEqual(len(tickets), 502)
+        self.assertEqual(tickets[-1].get_ticket_id(), "T9-500")
+        with self.assertRaises(ValueError):
+            self.order.add_tickets(Ticket("T10", 130, "", ""), 0)
+
+    def test_seats_by_event(self):
+        race = Event("E1", "Grand Prix", "2025-05-01", "Yas Marina", 100)
+        self.order.add_tickets(Ticket("T3", 130, "", "", event=race), 4)
+        self.order.add_ticket(Ticket("T4", 130, "", "", event=race))
+        seats = self.order.get_seats_by_event()
+        self.assertEqual(list(seats), ["E1"])
+        self.assertEqual(seats["E1"][1], 5)
+
+    def test_process_order_takes_seats_once_per_event(self):
+        race = Event("E1", "Grand Prix", "2025-05-01", "Yas Marina", 10, SeatMap([SeatSection("Main", 2, 5)]))
+        final = Event("E2", "Final", "2025-05-02", "Yas Marina", 50)
+        order = Order(102, "2025-05-13", "pending", self.user)
+        order.add_ticket(Ticket("T1", 130, "", "", event=race))
+        order.add_tickets(Ticket("T2", 130, "", "", event=race), 3)
+        order.add_tickets(Ticket("T3", 90, "", "", event=final), 20)
+        self.assertTrue(order.process_order())
+        self.assertEqual(order.get_status(), "confirmed")
+        self.assertEqual((race.get_available_seats(), final.get_available_seats()), (6, 30))
+        self.assertEqual(order.get_tickets()[0].get_seat(), ("Main", 0, 0))
+        self.assertEqual(len(order.get_seat_assignments()["E1"]), 4)
+        self.assertNotIn("E2", order.get_seat_assignments())  # General admission
+        with self.assertRaises(ValueError):
+            order.process_order()  # Already confirmed
+
+    def test_process_order_is_all_or_nothing(self):
+        race = Event("E1", "Grand Prix", "2025-05-01", "Yas Marina", 10, SeatMap([SeatSection("Main", 2, 5)]))
+        final = Event("E2", "Final", "2025-05-02", "Yas Marina", 5)
+        order = Order(102, "2025-05-13", "pending", self.user)
+        order.add_tickets(Ticket("T2", 130, "", "", event=race), 4)
+        order.add_tickets(Ticket("T3", 90, "", "", event=final), 6)
+        with self.assertRaises(ValueError):
+            order.process_order()
+        self.assertEqual(order.get_status(), "pending")
+        self.assertEqual((race.get_available_seats(), final.get_available_seats()), (10, 5))
+        self.assertEqual(race.get_seat_map().get_free_count(), 10)
+        with self.assertRaises(ValueError):
+            self.order.process_order()  # Its tickets are for no event
+
+    def test_old_pickled_order_loads(self):
+        # Orders saved before blocks existed only carry the ticket list
+        state = self.order.__getstate__()
+        for name in ("_blocks", "_ticket_count", "_total"):
+            del state[name]
+        loaded = Order.__new__(Order)
+        loaded.__setstate__(state)
+        self.assertEqual(loaded.get_total(), 250.0)
+        self.assertEqual(loaded.get_ticket_count(), 2)
+        self.assertEqual(loaded.get_blocks(), [])
+
+    def test_old_order_with_whole_user_loads(self):
+        buffer = io.BytesIO()
+        datagen.OldOrderPickler(buffer).dump(self.order)
+        loaded = pickle.loads(buffer.getvalue())
+        self.assertEqual(loaded.get_user_id(), 1)
+        self.assertIsNone(loaded.get_user())  # The copy of the user is dropped
+
+    def test_slots_and_pickle(self):
+        self.assertFalse(hasattr(self.order, "__dict__"))
+        loaded = pickle.loads(pickle.dumps(self.order))
+        self.assertEqual(loaded.get_total(), 250.0)
+        # Only the user id is saved, never the user's profile or password
+        self.assertEqual(loaded.get_user_id(), 1)
+        self.assertIsNone(loaded.get_user())
+        self.assertNotIn(b"password123", pickle.dumps(self.order))
+        # Pickles written by the default slot pickler (dict state, slot state) also load
+        user = User.__new__(User)
+        user.__setstate__((None, self.user.__getstate__()))
+        self.assertEqual(user.get_username(), "testuser")
+
 class TestPayment(unittest.TestCase):
 
     def setUp(self):
@@ -195,6 +360,79 @@ class TestPayment(unittest.TestCase):
         self.assertTrue(self.payment.verify_payment())
 
 
+class TestPaymentPipeline(unittest.TestCase):
+
+    def make_pipeline(self, gateway, **options):
+        pipeline = PaymentPipeline(gateway, **options).start()
+        self.addCleanup(pipeline.stop)
+        return pipeline
+
+    def payments(self, count):
+        return [Payment(f"P{i}", 10.0 * i, "credit_card") for i in range(count)]
+
+    def test_concurrency_is_limited(self):
+        gateway = FakeGateway(latency=0.01, jitter=0)
+        pipeline = self.make_pipeline(gateway, concurrency=4)
+        payments = self.payments(20)
+        for future in [pipeline.submit(payment, "1234567812345678") for payment in payments]:
+            future.result()
+        self.assertTrue(all(payment.get_status() == "processed" for payment in payments))
+        self.assertEqual(gateway.get_max_in_flight(), 4)
+        self.assertEqual(len(gateway.get_charged()), 20)
+
+    def test_failures_are_retried(self):
+        gateway = FakeGateway(latency=0.001, jitter=0, failure_rate=0.5, seed=1)
+        pipeline = self.make_pipeline(gateway, attempts=20, backoff=0.001)
+        for future in [pipeline.submit(payment, "1234567812345678") for payment in self.payments(20)]:
+            future.result()
+        self.assertGreater(pipeline.get_stats()["retries"], 0)
+        self.assertEqual(pipeline.get_stats()["charged"], 20)
+
+    def test_timeouts_give_up_but_never_charge_twice(self):
+        # Every reply is lost after the charge went through
+        gateway = FakeGateway(latency=0.001, jitter=0, stall_rate=1.0, stall=1.0)
+        pipeline = self.make_pipeline(gateway, timeout=0.02, attempts=3, backoff=0.001)
+        payment = self.payments(1)[0]
+        with self.assertRaises(GatewayError):
+            pipeline.pay(payment, "1234567812345678")
+        self.assertEqual(payment.get_status(), "failed")
+        self.assertEqual(pipeline.get_stats()["timeouts"], 3)
+        self.assertEqual(len(gateway.get_charged()), 1)
+
+    def test_declined_is_not_retried(self):
+        gateway = FakeGateway(latency=0.001, jitter=0, decline_rate=1.0)
+        pipeline = self.make_pipeline(gateway, attempts=5)
+        payment = self.payments(1)[0]
+        with self.assertRaises(PaymentDeclined):
+            pipeline.pay(payment, "1234567812345678")
+        self.assertEqual(payment.get_status(), "declined")
+        self.assertEqual(gateway.get_call_count(), 1)
+
+    def test_stop_fails_charges_under_way(self):
+        pipeline = PaymentPipeline(FakeGateway(latency=5, jitter=0)).start()
+        payment = self.payments(1)[0]
+        future = pipeline.submit(payment, "1234567812345678")
+        time.sleep(0.05)
+        pipeline.stop()
+        self.assertTrue(future.cancelled())
+        with self.assertRaises(GatewayError):
+            pipeline.pay(payment, "1234567812345678")
+        with self.assertRaises(GatewayError):
+            pipeline.refund(payment)
+
+    def test_batches(self):
+        gateway = FakeGateway(latency=0.02, jitter=0)
+        pipeline = self.make_pipeline(gateway, concurrency=1, batch_size=10, batch_wait=0.01)
+        payments = self.payments(30)
+        for future in [pipeline.submit(payment, "1234567812345678") for payment in payments]:
+            future.result()
+        self.assertTrue(all(payment.get_status() == "processed" for payment in payments))
+        self.assertLessEqual(gateway.get_call_count(), 5)
+        pipeline.refund(payments[0])
+        self.assertEqual(payments[0].get_status(), "refunded")
+        self.assertEqual(len(gateway.get_charged()), 29)
+
+
 class TestAdmin(unittest.TestCase):
 
     def setUp(self):
@@ -214,6 +452,16 @@ class TestAdmin(unittest.TestCase):
         self.admin.set_access_level("limited")
         self.assertEqual(self.admin.get_access_level(), "limited")
 
+    def test_apply_discount(self):
+        race = SingleRacePass("Race", 100, "One race", "Friday", "A")
+        group = GroupDiscount("Group", 0, "Groups", 5, 10, race)
+        self.admin.apply_discount(race, 25)
+        self.assertEqual(race.get_base_price(), 75)
+        self.admin.apply_discount(group, 30)
+        self.assertEqual(group.get_discount_percentage(), 30)
+        with self.assertRaises(ValueError):
+            self.admin.apply_discount(race, 120)
+
 
 class TestSalesReport(unittest.TestCase):
 
@@ -228,12 +476,1441 @@ class TestSalesReport(unittest.TestCase):
         self.assertEqual(sales[date(2025, 5, 1)], 2)
         self.assertEqual(sales[date(2025, 5, 2)], 1)
 
+    def test_record_sale_quantity(self):
+        self.report.record_sale(date(2025, 5, 2), 4)
+        self.assertEqual(self.report.get_sales_data()[date(2025, 5, 2)], 5)
+
     def test_generate_report(self):
         summary = self.report.generate_report()
         self.assertIn("2025-05-01: 2 ticket(s) sold", summary)
         self.assertIn("2025-05-02: 1 ticket(s) sold", summary)
         self.assertIn("Sales Report: 1 from 2025-05-01 to 2025-05-31", summary)
 
+    def test_export_report(self):
+        with tempfile.TemporaryDirectory() as folder:
+            filename = self.report.export_report(os.path.join(folder, "report.txt.gz"))
+            with gzip.open(filename, "rt") as f:
+                self.assertEqual(f.read(), self.report.generate_report())
+
+
+class TestOrderJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "orders.pickle")
+        self.user = User("U1", "testuser", "hash", b"salt", "Test User", "test@example.com", "", "")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_order(self, order_id):
+        order = Order(order_id, datetime(2025, 5, 13), "confirmed", self.user)
+        order.add_ticket(Ticket("T" + order_id, 130, "2025-05-13", "2025-05-13"))
+        return order
+
+    def test_append_keeps_existing_snapshot(self):
+        save_data(self.path, [self.make_order("O1")])
+        journal = OrderJournal(self.path, fsync="always")
+        journal.append(self.make_order("O2"))
+        journal.append(self.make_order("O3"))
+        self.assertEqual([o.get_order_id() for o in load_data(self.path)], ["O1", "O2", "O3"])
+
+    def test_append_to_missing_file(self):
+        journal = OrderJournal(self.path)
+        journal.append(self.make_order("O1"))
+        self.assertEqual(len(journal.load()), 1)
+
+    def test_batch_fsync(self):
+        journal = OrderJournal(self.path, fsync="batch", batch_size=3)
+        journal.append(self.make_order("O1"))
+        journal.append(self.make_order("O2"))
+        self.assertEqual(journal.get_unsynced_count(), 2)
+        journal.append(self.make_order("O3"))
+        self.assertEqual(journal.get_unsynced_count(), 0)
+        journal.append(self.make_order("O4"))
+        journal.sync()
+        self.assertEqual(journal.get_unsynced_count(), 0)
+
+    def test_compact(self):
+        save_data(self.path, [self.make_order("O0")])
+        journal = OrderJournal(self.path, fsync="never")
+        for i in range(1, 5):
+            journal.append(self.make_order(f"O{i}"))
+        self.assertEqual(journal.compact(), 5)
+        offsets = [offset for offset, _ in journal.scan()]
+        self.assertNotIn(None, offsets)
+        self.assertEqual([o.get_order_id() for o in journal.read_at(offsets[::-1])], ["O4", "O3", "O2", "O1", "O0"])
+
+    def test_append_returns_offset(self):
+        journal = OrderJournal(self.path)
+        journal.append(self.make_order("O1"))
+        offset = journal.append(self.make_order("O2"))
+        self.assertEqual(journal.read_at([offset])[0].get_order_id(), "O2")
+
+    def test_torn_tail_is_ignored(self):
+        journal = OrderJournal(self.path)
+        journal.append(self.make_order("O1"))
+        with open(self.path, "ab") as f:
+            f.write(pickle.dumps(("add", self.make_order("O2")))[:20])
+        self.assertEqual([o.get_order_id() for o in journal.load()], ["O1"])
+
+    def test_append_after_a_torn_record(self):
+        record = pickle.dumps(("add", self.make_order("O2")))
+        for cut in range(1, len(record)):
+            OrderJournal(self.path).save([self.make_order("O1")])
+            with open(self.path, "ab") as f:
+                f.write(record[:cut])  # The app crashed while writing O2
+            journal = OrderJournal(self.path)  # Opened again after the restart
+            journal.append(self.make_order("O3"))
+            journal.append_many([self.make_order("O4"), self.make_order("O5")])
+            self.assertEqual([o.get_order_id() for o in journal.load()], ["O1", "O3", "O4", "O5"], f"cut at {cut}")
+
+    def test_append_many(self):
+        journal = OrderJournal(self.path, fsync="batch")
+        journal.append(self.make_order("O1"))
+        offsets = journal.append_many([self.make_order("O2"), self.make_order("O3")])
+        self.assertEqual(journal.get_unsynced_count(), 0)
+        self.assertEqual([o.get_order_id() for o in journal.read_at(offsets)], ["O2", "O3"])
+        self.assertEqual([offset for offset, _ in journal.scan()][1:], offsets)
+
+    def test_torn_batch_is_ignored(self):
+        journal = OrderJournal(self.path)
+        journal.append(self.make_order("O1"))
+        journal.append_many([self.make_order("O2"), self.make_order("O3")])
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 10)  # The last order of the batch is cut off
+        self.assertEqual([o.get_order_id() for o in journal.load()], ["O1"])
+
+    def test_invalid_fsync_mode(self):
+        with self.assertRaises(ValueError):
+            OrderJournal(self.path, fsync="sometimes")
+
+    def test_tombstones(self):
+        journal = OrderJournal(self.path)
+        journal.append_many([self.make_order("O1"), self.make_order("O2")])
+        journal.append(self.make_order("O1"), kind=DELETE)
+        self.assertEqual([o.get_order_id() for o in journal.load()], ["O2"])
+        self.assertEqual([kind for _, kind, _ in journal.scan_records()], [ADD, ADD, DELETE])
+        self.assertEqual(journal.compact(), 1)
+        self.assertEqual([o.get_order_id() for _, o in journal.scan()], ["O2"])
+
+
+class StorageEngineTests:
+    # Shared checks every storage engine must pass
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = self.open_store(self.tmp.name)
+        self.alice = User("U1", "alice", "hash", b"salt", "Alice", "Alice@Example.com", "", "")
+        self.bob = User("U2", "bob", "hash", b"salt", "Bob", "bob@example.com", "", "")
+        self.store.add_user(self.alice)
+        self.store.add_user(self.bob)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def make_order(self, order_id, user, day):
+        order = Order(order_id, datetime(2025, 5, day, 12), "confirmed", user)
+        order.add_ticket(Ticket("T" + order_id, 130, "2025-05-13", "2025-05-13"))
+        return order
+
+    def test_find_user(self):
+        self.assertEqual(self.store.find_user_by_email("alice@example.COM").get_user_id(), "U1")
+        self.assertEqual(self.store.find_user_by_id("U2").get_username(), "bob")
+        self.assertIsNone(self.store.find_user_by_email("nobody@example.com"))
+
+    def test_email_is_registered_once(self):
+        with self.assertRaises(DuplicateEmailError):
+            self.store.add_user(User("U9", "alice2", "hash", b"salt", "Alice", " ALICE@example.com", "", ""))
+        self.assertIsNone(self.store.find_user_by_id("U9"))
+
+    def test_update_and_delete_user(self):
+        self.alice.set_phone_number("555")
+        self.store.update_user(self.alice)
+        self.assertEqual(self.store.find_user_by_id("U1").get_phone_number(), "555")
+        self.store.delete_user("U1")
+        self.assertIsNone(self.store.find_user_by_id("U1"))
+        self.assertEqual(len(self.store.get_users()), 1)
+
+    def test_email_cannot_be_changed_to_a_registered_one(self):
+        version = self.store.get_user_version("U1")
+        self.alice.set_email(" BOB@example.com")
+        with self.assertRaises(DuplicateEmailError):
+            self.store.update_user(self.alice)
+        with self.assertRaises(DuplicateEmailError):
+            self.store.update_user(self.alice, expected_version=version)
+        self.assertEqual(self.store.find_user_by_email("bob@example.com").get_user_id(), "U2")
+        self.assertEqual(self.store.find_user_by_id("U1").get_email(), "Alice@Example.com")
+        self.assertEqual(self.store.get_user_version("U1"), version)
+
+    def test_email_index_follows_changes(self):
+        self.alice.set_email("alice.new@example.com")
+        self.store.update_user(self.alice)
+        self.assertIsNone(self.store.find_user_by_email("alice@example.com"))
+        self.assertEqual(self.store.find_user_by_email(" ALICE.NEW@example.com").get_user_id(), "U1")
+        self.store.delete_user("U1")
+        self.assertIsNone(self.store.find_user_by_email("alice.new@example.com"))
+        self.assertEqual(self.store.find_user_by_email("bob@example.com").get_user_id(), "U2")
+
+    def test_update_user_checks_version(self):
+        version = self.store.get_user_version("U1")
+        self.alice.set_phone_number("555")
+        self.store.update_user(self.alice, expected_version=version)
+        self.assertNotEqual(self.store.get_user_version("U1"), version)
+        self.alice.set_phone_number("666")
+        with self.assertRaises(ConflictError):
+            self.store.update_user(self.alice, expected_version=version)
+        self.store.close()
+        self.store = self.open_store(self.tmp.name)
+        self.assertEqual(self.store.find_user_by_id("U1").get_phone_number(), "555")  # Only the first change was saved
+        self.assertIsNone(self.store.get_user_version("U9"))
+
+    def test_orders(self):
+        self.store.add_order(self.make_order("O1", self.alice, 1))
+        self.store.add_orders([self.make_order("O2", self.bob, 2), self.make_order("O3", self.alice, 3)])
+        self.assertEqual([o.get_order_id() for o in self.store.get_user_orders("U1")], ["O1", "O3"])
+        between = self.store.get_orders_between(date(2025, 5, 2), date(2025, 5, 3))
+        self.assertEqual([o.get_order_id() for o in between], ["O2", "O3"])
+        self.store.delete_order("O1")
+        self.assertEqual([o.get_order_id() for o in self.store.get_orders()], ["O2", "O3"])
+        self.store.delete_user_orders("U1")
+        self.assertEqual([o.get_order_id() for o in self.store.get_orders()], ["O2"])
+
+    def test_find_order(self):
+        self.store.add_orders([self.make_order("O1", self.alice, 1), self.make_order("O2", self.bob, 2)])
+        self.assertEqual(self.store.find_order("O2").get_user_id(), "U2")
+        self.store.delete_order("O2")
+        self.assertIsNone(self.store.find_order("O2"))
+        self.assertIsNone(self.store.find_order("O9"))
+
+    def test_orders_keep_user_id_only(self):
+        self.store.add_order(self.make_order("O1", self.alice, 1))
+        order = self.store.get_user_orders("U1")[0]
+        self.assertIsNone(order.get_user())
+        self.assertEqual(self.store.find_order_user(order).get_email(), "Alice@Example.com")
+        self.assertEqual(self.store.rewrite_orders(), 1)
+        self.assertEqual(self.store.get_daily_sales(), {date(2025, 5, 1): (1, 1, 130)})
+
+    def test_daily_sales(self):
+        self.store.add_order(self.make_order("O1", self.alice, 1))
+        self.store.add_order(self.make_order("O2", self.bob, 1))
+        self.store.add_order(self.make_order("O3", self.alice, 3))
+        daily = self.store.get_daily_sales()
+        self.assertEqual(daily[date(2025, 5, 1)], (2, 2, 260))
+        self.assertEqual(list(self.store.get_daily_sales(date(2025, 5, 2), date(2025, 5, 3))), [date(2025, 5, 3)])
+        self.store.delete_order("O2")
+        self.assertEqual(self.store.get_daily_sales()[date(2025, 5, 1)], (1, 1, 130))
+        self.store.delete_user_orders("U1")
+        self.assertEqual(self.store.get_daily_sales(), {})
+
+    def test_iter_orders(self):
+        self.store.add_orders([self.make_order(f"O{day}", self.alice, day) for day in range(1, 6)])
+        self.assertEqual([o.get_order_id() for o in self.store.iter_orders()], ["O1", "O2", "O3", "O4", "O5"])
+        between = self.store.iter_orders(date(2025, 5, 2), date(2025, 5, 3))
+        self.assertEqual([o.get_order_id() for o in between], ["O2", "O3"])
+
+    def test_a_single_date_bound_leaves_the_other_side_open(self):
+        self.store.add_orders([self.make_order(f"O{day}", self.alice, day) for day in range(1, 6)])
+        self.assertEqual([o.get_order_id() for o in self.store.iter_orders(start_date=date(2025, 5, 4))], ["O4", "O5"])
+        self.assertEqual([o.get_order_id() for o in self.store.iter_orders(end_date=date(2025, 5, 2))], ["O1", "O2"])
+        self.assertEqual(list(self.store.get_daily_sales(start_date=date(2025, 5, 5))), [date(2025, 5, 5)])
+        self.assertEqual(list(self.store.get_daily_sales(end_date=date(2025, 5, 1))), [date(2025, 5, 1)])
+        sales_file = os.path.join(self.tmp.name, "sales.csv")
+        self.assertEqual(export_data(self.store, "sales", sales_file, start_date=date(2025, 5, 3)), 3)
+        orders_file = os.path.join(self.tmp.name, "orders.jsonl")
+        self.assertEqual(export_data(self.store, "orders", orders_file, end_date=date(2025, 5, 3)), 3)
+
+    def test_export(self):
+        order = self.make_order("O1", self.alice, 1)
+        order.add_tickets(Ticket("T9", 50, "2025-05-14", "2025-05-15"), 3)
+        self.store.add_orders([order, self.make_order("O2", self.bob, 2)])
+        orders_file = os.path.join(self.tmp.name, "orders.csv.gz")
+        self.assertEqual(export_data(self.store, "orders", orders_file), 2)
+        with gzip.open(orders_file, "rt", newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([(r["order_id"], r["user_id"], r["tickets"], float(r["total"])) for r in rows],
+                         [("O1", "U1", "4", 280), ("O2", "U2", "1", 130)])
+        tickets_file = os.path.join(self.tmp.name, "tickets.jsonl")
+        export_data(self.store, "tickets", tickets_file, date(2025, 5, 1), date(2025, 5, 1))
+        with open(tickets_file) as f:
+            tickets = [json.loads(line) for line in f]
+        self.assertEqual([(t["ticket_id"], t["quantity"]) for t in tickets], [("TO1", 1), ("T9", 3)])
+        sales_file = os.path.join(self.tmp.name, "sales.csv")
+        export_data(self.store, "sales", sales_file)
+        with open(sales_file, newline="") as f:
+            day, tickets, orders, revenue = list(csv.reader(f))[1]
+        self.assertEqual((day, tickets, orders, float(revenue)), ("2025-05-01", "4", "1", 280))
+        with self.assertRaises(ValueError):
+            export_data(self.store, "orders", os.path.join(self.tmp.name, "orders.xml"))
+
+class TestPickleStorage(StorageEngineTests, unittest.TestCase):
+
+    def open_store(self, folder):
+        return PickleStorage(os.path.join(folder, "users.pickle"), os.path.join(folder, "orders.pickle"))
+
+
+# One of several processes sharing the same files: books orders and adds one to a
+# counter kept in the first user's phone number, redoing the change on a conflict
+def share_store(users_file, orders_file, worker, count):
+    store = PickleStorage(users_file, orders_file)
+    store.get_order_index()  # Loaded up front, so it has to take in the other processes' orders
+    user = store.find_user_by_id("U1")
+    conflicts = 0
+    for i in range(count):
+        order = Order(f"W{worker}-{i}", datetime(2025, 5, 13), "confirmed", user)
+        order.add_ticket(Ticket(f"TW{worker}-{i}", 10, "2025-05-13", "2025-05-13"))
+        store.add_order(order)
+        while True:
+            version = store.get_user_version("U1")
+            latest = store.find_user_by_id("U1")
+            latest.set_phone_number(str(int(latest.get_phone_number()) + 1))
+            try:
+                store.update_user(latest, expected_version=version)
+                break
+            except ConflictError:
+                conflicts += 1
+    store.close()
+    return conflicts
+
+
+class TestPickleOrderIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.users_file = os.path.join(self.tmp.name, "users.pickle")
+        self.orders_file = os.path.join(self.tmp.name, "orders.pickle")
+        self.alice = User("U1", "alice", "hash", b"salt", "Alice", "alice@example.com", "", "")
+        self.bob = User("U2", "bob", "hash", b"salt", "Bob", "bob@example.com", "", "")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_order(self, order_id, user):
+        order = Order(order_id, datetime(2025, 5, 13), "confirmed", user)
+        order.add_ticket(Ticket("T" + order_id, 130, "2025-05-13", "2025-05-13"))
+        return order
+
+    def test_old_snapshot_file_is_indexed(self):
+        save_data(self.orders_file, [self.make_order("O1", self.alice), self.make_order("O2", self.bob)])
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual([o.get_order_id() for o in store.get_user_orders("U2")], ["O2"])
+        store.close()
+
+    def test_index_reopens_and_catches_up(self):
+        store = PickleStorage(self.users_file, self.orders_file)
+        store.add_order(self.make_order("O1", self.alice))
+        store.close()
+        # Booked by a run that never saved its index
+        OrderJournal(self.orders_file).append(self.make_order("O2", self.alice))
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual([o.get_order_id() for o in store.get_user_orders("U1")], ["O1", "O2"])
+        store.delete_user_orders("U1")
+        self.assertEqual(store.get_user_orders("U1"), [])
+        self.assertEqual(store.get_order_index().get_user_count(), 0)
+        store.close()
+
+
+    def test_sales_totals_survive_restart(self):
+        store = PickleStorage(self.users_file, self.orders_file)
+        store.add_order(self.make_order("O1", self.alice))
+        store.close()
+        OrderJournal(self.orders_file).append(self.make_order("O2", self.bob))
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual(store.get_daily_sales(), {date(2025, 5, 13): (2, 2, 260)})
+        store.close()
+        # A lost or damaged totals file is worked out again from the journal
+        os.remove(self.orders_file + ".sales")
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual(store.get_daily_sales(), {date(2025, 5, 13): (2, 2, 260)})
+        store.close()
+
+    def test_files_are_read_on_first_use(self):
+        save_data(self.users_file, [self.alice, self.bob])
+        store = PickleStorage(self.users_file, self.orders_file)
+        store.add_order(self.make_order("O1", self.alice))
+        self.assertFalse(store.is_users_loaded())
+        self.assertFalse(store.is_views_loaded())
+        self.assertEqual(store.find_user_by_email("bob@example.com").get_user_id(), "U2")
+        self.assertTrue(store.is_users_loaded())
+        # Orders booked before the index was read are picked up from the journal
+        self.assertEqual([o.get_order_id() for o in store.get_user_orders("U1")], ["O1"])
+        self.assertTrue(store.is_views_loaded())
+        store.close()
+
+    def test_deletes_are_tombstones(self):
+        store = PickleStorage(self.users_file, self.orders_file)
+        store.add_orders([self.make_order("O1", self.alice), self.make_order("O2", self.alice),
+                          self.make_order("O3", self.bob)])
+        file_id = store.get_journal().get_stamp()[0]
+        self.assertEqual([o.get_order_id() for o in store.delete_order("O2")], ["O2"])
+        self.assertEqual(store.delete_order("O2"), [])
+        self.assertEqual(store.get_journal().get_stamp()[0], file_id)  # Appended to, not rewritten
+        self.assertEqual([o.get_order_id() for o in store.iter_orders()], ["O1", "O3"])
+        self.assertEqual(store.get_daily_sales(), {date(2025, 5, 13): (2, 2, 260)})
+        self.assertAlmostEqual(store.get_garbage_ratio(), 2 / 4)
+        store.close()
+        # Read back from the journal alone, the tombstone still counts
+        os.remove(self.orders_file + ".idx")
+        os.remove(self.orders_file + ".sales")
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual([o.get_order_id() for o in store.get_user_orders("U1")], ["O1"])
+        self.assertEqual(store.get_daily_sales(), {date(2025, 5, 13): (2, 2, 260)})
+        self.assertEqual([o.get_order_id() for o in store.get_orders()], ["O1", "O3"])
+        store.close()
+
+    def test_compact_keeps_changes_made_meanwhile(self):
+        store = PickleStorage(self.users_file, self.orders_file)
+        for i in range(1, 4):
+            store.add_order(self.make_order(f"O{i}", self.alice))
+        store.delete_order("O2")
+        journal = store.get_journal()
+        write_copy = journal.write_copy
+
+        def write_copy_while_booking(items, written=None):
+            temp_name = write_copy(items, written)
+            store.add_order(self.make_order("O4", self.bob))  # Booked while the copy was written
+            store.delete_order("O1")
+            return temp_name
+        journal.write_copy = write_copy_while_booking
+        self.assertEqual(store.compact(), 2)
+        self.assertEqual([o.get_order_id() for o in store.get_user_orders("U1")], ["O3"])
+        self.assertEqual([o.get_order_id() for o in store.get_user_orders("U2")], ["O4"])
+        self.assertEqual(store.get_daily_sales(), {date(2025, 5, 13): (2, 2, 260)})
+        self.assertEqual(store.get_order_index().get_garbage_count(), 2)
+        store.close()
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual([o.get_order_id() for o in store.iter_orders()], ["O3", "O4"])
+        self.assertEqual(store.compact(), 2)
+        self.assertEqual(store.get_garbage_ratio(), 0.0)
+        self.assertEqual(len(list(store.get_journal().scan_records())), 2)
+        store.close()
+
+    def test_users_are_appended(self):
+        save_data(self.users_file, [self.alice])  # Old files hold one list of users
+        store = PickleStorage(self.users_file, self.orders_file)
+        store.add_user(self.bob)
+        self.alice.set_email("alice@new.example.com")
+        store.update_user(self.alice)
+        store.delete_user("U2")
+        store.close()
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual([u.get_user_id() for u in store.get_users()], ["U1"])
+        self.assertEqual(store.find_user_by_email("alice@new.example.com").get_user_id(), "U1")
+        self.assertIsNone(store.find_user_by_email("bob@example.com"))
+        self.assertEqual(store.compact(), 3)
+        self.assertEqual(len(list(store.get_user_journal().scan_records())), 1)
+        self.assertEqual(store.find_user_by_email("alice@new.example.com").get_user_id(), "U1")
+        store.close()
+
+    def test_migrate_orders_to_user_ids(self):
+        save_data(self.users_file, [self.alice, self.bob])
+        datagen.write_old_records(self.orders_file, [self.make_order("O1", self.alice),
+                                                     self.make_order("O2", self.bob)])
+        count, before, after = migrate_orders_to_user_ids("pickle", self.users_file, self.orders_file, "unused.db")
+        self.assertEqual(count, 2)
+        self.assertLess(after, before)
+        with open(self.orders_file, "rb") as f:
+            self.assertNotIn(b"alice@example.com", f.read())
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual([o.get_order_id() for o in store.get_user_orders("U2")], ["O2"])
+        store.close()
+
+    def test_compactor_runs_in_background(self):
+        store = PickleStorage(self.users_file, self.orders_file)
+        store.add_orders([self.make_order("O1", self.alice), self.make_order("O2", self.bob)])
+        compactor = Compactor(store, interval=0.01, min_garbage=0.5)
+        self.assertEqual(compactor.run_once(), 0)  # Nothing deleted yet
+        compactor.start()
+        store.delete_order("O1")
+        deadline = time.monotonic() + 5
+        while compactor.get_run_count() == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        compactor.stop()
+        self.assertIsNone(compactor.get_last_error())
+        self.assertEqual(compactor.get_run_count(), 1)
+        self.assertEqual([o.get_order_id() for o in store.get_orders()], ["O2"])
+        store.close()
+
+    def test_file_lock_is_shared_between_holders(self):
+        lock_file = os.path.join(self.tmp.name, "orders.pickle.lock")
+        first, second = FileLock(lock_file), FileLock(lock_file)
+        with first:
+            with first:  # The holder may take it again
+                self.assertFalse(second.acquire(blocking=False))
+        self.assertTrue(second.acquire(blocking=False))
+        second.release()
+        first.close()
+        second.close()
+
+    def test_changes_from_another_store_are_taken_in(self):
+        first = PickleStorage(self.users_file, self.orders_file)
+        first.add_user(self.alice)
+        first.add_order(self.make_order("O1", self.alice))
+        self.assertEqual(first.get_order_index().get_order_count(), 1)
+        # A second store on the same files stands in for another process
+        second = PickleStorage(self.users_file, self.orders_file)
+        second.add_order(self.make_order("O2", self.alice))
+        second.delete_order("O1")
+        user = second.find_user_by_id("U1")
+        user.set_address("Yas Island")
+        second.update_user(user)
+        self.assertEqual(first.find_user_by_id("U1").get_address(), "Yas Island")
+        self.assertIsNone(first.find_order("O1"))
+        self.assertEqual(first.find_order("O2").get_order_id(), "O2")
+        self.assertEqual(first.get_daily_sales()[date(2025, 5, 13)][1], 1)
+        # After the other store compacts, every position has moved
+        self.assertEqual(second.compact(), 3)
+        first.add_order(self.make_order("O3", self.alice))
+        self.assertEqual([o.get_order_id() for o in first.get_user_orders("U1")], ["O2", "O3"])
+        self.assertEqual([o.get_order_id() for o in second.get_user_orders("U1")], ["O2", "O3"])
+        first.close()
+        second.close()
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual(store.get_daily_sales()[date(2025, 5, 13)][1], 2)
+        store.close()
+
+    def test_torn_records_are_cut_off_before_appending(self):
+        first = PickleStorage(self.users_file, self.orders_file)
+        first.add_user(self.alice)
+        first.add_order(self.make_order("O1", self.alice))
+        for path, item in ((self.users_file, ("add", self.bob)), (self.orders_file, ("add", self.make_order("O2", self.bob)))):
+            with open(path, "ab") as f:
+                data = pickle.dumps(item)
+                f.write(data[:len(data) // 2])  # Another process crashed while writing
+        self.assertEqual(len(first.get_users()), 1)
+        self.assertEqual(len(first.get_order_index().get_locations("U1")), 1)
+        second = PickleStorage(self.users_file, self.orders_file)  # The process started again
+        second.add_user(self.bob)
+        second.add_order(self.make_order("O3", self.bob))
+        # The first store read the torn records too, it picks up what came after them
+        self.assertEqual(first.find_user_by_id("U2").get_username(), "bob")
+        self.assertEqual([o.get_order_id() for o in first.get_user_orders("U2")], ["O3"])
+        first.close()
+        second.close()
+        store = PickleStorage(self.users_file, self.orders_file)
+        self.assertEqual([u.get_user_id() for u in store.get_users()], ["U1", "U2"])
+        self.assertEqual([o.get_order_id() for o in store.get_orders()], ["O1", "O3"])
+        store.close()
+
+    def test_email_is_registered_once_across_stores(self):
+        first = PickleStorage(self.users_file, self.orders_file)
+        second = PickleStorage(self.users_file, self.orders_file)  # Stands in for another process
+        self.assertIsNone(second.find_user_by_email("alice@example.com"))  # Both have read the file
+        first.add_user(self.alice)
+        with self.assertRaises(DuplicateEmailError):
+            second.add_user(User("U9", "alice2", "hash", b"salt", "Alice", "ALICE@example.com", "", ""))
+        self.assertIsNone(first.find_user_by_id("U9"))
+        first.close()
+        second.close()
+
+    def test_processes_never_lose_orders(self):
+        save_data(self.users_file, [User("U1", "alice", "hash", b"salt", "Alice", "alice@example.com", "0", "")])
+        store = PickleStorage(self.users_file, self.orders_file)
+        store.get_order_index()
+        with multiprocessing.Pool(4) as pool:
+            conflicts = pool.starmap(share_store, [(self.users_file, self.orders_file, worker, 25) for worker in range(4)])
+        self.assertEqual(store.get_order_index().get_order_count(), 100)
+        self.assertEqual(store.get_daily_sales()[date(2025, 5, 13)][1], 100)
+        self.assertEqual(store.find_user_by_id("U1").get_phone_number(), "100")  # No update was lost either
+        self.assertGreaterEqual(sum(conflicts), 0)
+        store.close()
+        orders = load_data(self.orders_file)
+        self.assertEqual(len({o.get_order_id() for o in orders}), 100)
+
+
+class TestSQLiteStorage(StorageEngineTests, unittest.TestCase):
+
+    def open_store(self, folder):
+        return SQLiteStorage(os.path.join(folder, "bookings.db"))
+
+    def test_migrate_from_pickle(self):
+        users_file = os.path.join(self.tmp.name, "users.pickle")
+        orders_file = os.path.join(self.tmp.name, "orders.pickle")
+        db_file = os.path.join(self.tmp.name, "migrated.db")
+        save_data(users_file, [self.alice, self.bob])
+        save_data(orders_file, [self.make_order("O1", self.alice, 1)])
+        self.assertEqual(migrate_pickle_to_sqlite(users_file, orders_file, db_file), (2, 1))
+        migrated = SQLiteStorage(db_file)
+        self.assertEqual(migrated.get_user_orders("U1")[0].get_order_id(), "O1")
+        migrated.close()
+        with self.assertRaises(FileExistsError):
+            migrate_pickle_to_sqlite(users_file, orders_file, db_file)
+
+    def test_email_index_is_made_unique(self):
+        self.store.close()
+        db_file = os.path.join(self.tmp.name, "bookings.db")
+        with sqlite3.connect(db_file) as conn:  # As databases were made before emails were unique
+            conn.execute("DROP INDEX idx_users_email")
+            conn.execute("CREATE INDEX idx_users_email ON users(email)")
+        self.store = self.open_store(self.tmp.name)
+        with self.assertRaises(DuplicateEmailError):
+            self.store.add_user(User("U9", "bob2", "hash", b"salt", "Bob", "bob@example.com", "", ""))
+
+    def test_iter_orders_in_chunks(self):
+        self.store.add_orders([self.make_order(f"O{day}", self.alice, day) for day in range(1, 6)])
+        orders = self.store.iter_orders(chunk_size=2)
+        self.assertEqual([next(orders).get_order_id() for _ in range(3)], ["O1", "O2", "O3"])
+        self.store.add_order(self.make_order("O6", self.bob, 6))  # Booked while the walk is paused
+        self.assertEqual([o.get_order_id() for o in orders], ["O4", "O5", "O6"])
+
+
+class TestTableStorage(StorageEngineTests, unittest.TestCase):
+
+    def open_store(self, folder):
+        return TableStorage(os.path.join(folder, "users.pickle"), os.path.join(folder, "orders.tbl"))
+
+    def reopen(self):
+        self.store.close()
+        self.store = self.open_store(self.tmp.name)
+
+    def test_index_grows_and_survives_restart(self):
+        self.store.add_orders([self.make_order(f"O{i}", self.alice, 1) for i in range(2000)])
+        self.assertEqual(self.store.find_order("O1999").get_order_id(), "O1999")
+        self.reopen()
+        self.assertEqual(self.store.get_table().find("O1234"), 1234)
+        self.assertEqual(self.store.get_daily_sales(), {date(2025, 5, 1): (2000, 2000, 260000)})
+
+    def test_index_is_rebuilt_after_a_crash(self):
+        self.store.add_orders([self.make_order("O1", self.alice, 1), self.make_order("O2", self.bob, 2)])
+        table_file = self.store.get_table().get_filename()
+        crashed_file = os.path.join(self.tmp.name, "crashed.tbl")
+        for suffix in ("", ".0.dat", ".hix"):  # The files as a crash leaves them, the index never closed cleanly
+            shutil.copyfile(table_file + suffix, crashed_file + suffix)
+        self.assertEqual(HashIndex.open(crashed_file + ".hix", 0, 2), None)
+        crashed = OrderTable(crashed_file)
+        self.assertEqual(crashed.get_order("O2").get_user_id(), "U2")
+        crashed.close()
+
+    def test_second_opener_is_refused(self):
+        table_file = self.store.get_table().get_filename()
+        with self.assertRaises(StorageInUseError):
+            self.open_store(self.tmp.name)
+        with self.assertRaises(StorageInUseError):
+            OrderTable(table_file)
+        self.reopen()  # Free again once closed
+        self.store.add_order(self.make_order("O1", self.alice, 1))
+        self.assertEqual(self.store.find_order("O1").get_user_id(), "U1")
+
+    def test_records_past_the_payload_are_dropped(self):
+        self.store.add_orders([self.make_order("O1", self.alice, 1), self.make_order("O2", self.bob, 2)])
+        self.store.close()
+        payload_file = os.path.join(self.tmp.name, "orders.tbl.0.dat")
+        with open(payload_file, "r+b") as f:  # O2's order never made it to disk
+            f.truncate(os.path.getsize(payload_file) - 1)
+        self.store = self.open_store(self.tmp.name)
+        self.assertEqual(self.store.get_table().get_count(), 1)
+        self.assertIsNone(self.store.find_order("O2"))
+        self.store.add_order(self.make_order("O3", self.bob, 2))
+        self.assertEqual([o.get_order_id() for o in self.store.get_orders()], ["O1", "O3"])
+
+    def test_deletes_flag_in_place_and_compact(self):
+        self.store.add_orders([self.make_order(f"O{i}", self.alice, 1) for i in range(4)])
+        size = os.path.getsize(self.store.get_table().get_filename())
+        self.store.delete_order("O1")
+        self.assertEqual(os.path.getsize(self.store.get_table().get_filename()), size)
+        self.assertAlmostEqual(self.store.get_garbage_ratio(), 1 / 6)  # Two users, four orders
+        table = self.store.get_table()
+        iter_rows = table.iter_rows
+
+        def rows_while_booking(end=None):
+            yield from iter_rows(end)
+            self.store.add_order(self.make_order("O4", self.bob, 2))  # Booked while the copy is made
+            self.store.delete_order("O2")
+        table.iter_rows = rows_while_booking
+        self.assertEqual(self.store.compact(), 1)
+        self.assertEqual(table.get_count(), 4)
+        self.assertEqual([o.get_order_id() for o in self.store.get_orders()], ["O0", "O3", "O4"])
+        self.reopen()
+        self.assertEqual(self.store.find_order("O4").get_user_id(), "U2")
+        self.assertIsNone(self.store.find_order("O2"))
+        self.assertEqual(self.store.compact(), 1)
+
+    def test_compaction_waits_for_user_deletes(self):
+        users = [self.alice, self.bob, self.bob, self.alice, self.bob]
+        self.store.add_orders([self.make_order(f"O{i}", user, 1) for i, user in enumerate(users, 1)])
+        self.store.delete_order("O3")
+        table = self.store.get_table()
+        find = table.find
+        compactor = threading.Thread(target=self.store.compact)
+
+        def find_while_compacting(order_id):
+            if compactor.ident is None:
+                compactor.start()
+                time.sleep(0.05)  # Long enough for the copy, the swap has to wait for the delete
+            return find(order_id)
+        table.find = find_while_compacting
+        removed = self.store.delete_user_orders("U1")
+        compactor.join()
+        self.assertEqual([o.get_order_id() for o in removed], ["O1", "O4"])
+        self.assertEqual([o.get_order_id() for o in self.store.get_orders()], ["O2", "O5"])
+        self.assertEqual([o.get_order_id() for o in self.store.get_user_orders("U2")], ["O2", "O5"])
+
+    def test_walk_carries_on_across_a_compaction(self):
+        self.store.add_orders([self.make_order(f"O{i}", self.alice, 1) for i in range(5)])
+        self.store.delete_order("O1")
+        orders = self.store.iter_orders()
+        self.assertEqual(next(orders).get_order_id(), "O0")
+        self.store.delete_order("O3")
+        self.store.compact()  # Every record after O0 moves
+        self.assertEqual([o.get_order_id() for o in orders], ["O2", "O4"])
+
+    def test_convert_from_journal(self):
+        orders_file = os.path.join(self.tmp.name, "orders.pickle")
+        journal = OrderJournal(orders_file)
+        journal.append_many([self.make_order("O1", self.alice, 1), self.make_order("O2", self.bob, 2)])
+        journal.append(self.make_order("O1", self.alice, 1), kind=DELETE)
+        table_file = os.path.join(self.tmp.name, "converted.tbl")
+        self.assertEqual(convert_journal(orders_file, table_file), 1)
+        store = open_storage("mmap", os.path.join(self.tmp.name, "users.pickle"), orders_file,
+                             table_file=table_file)
+        self.assertEqual([o.get_order_id() for o in store.get_orders()], ["O2"])
+        store.close()
+        with self.assertRaises(FileExistsError):
+            convert_journal(orders_file, table_file)
+
+
+# Runs in a separate process for the ID stress test
+def generate_ids(node_dir, count):
+    generator = IdGenerator(claim_node_id(node_dir))
+    return [generator.next_number() for _ in range(count)]
+
+
+class TestIdGenerator(unittest.TestCase):
+
+    def test_increasing_and_unique(self):
+        generator = IdGenerator(3)
+        numbers = [generator.next_number() for _ in range(50000)]
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertEqual(split_id(numbers[0])[1], 3)
+        self.assertTrue(generator.next_id("O").startswith("O"))
+
+    def test_sequence_overflow_and_clock_going_back(self):
+        now = [1800000000.0]
+        generator = IdGenerator(1, clock=lambda: now[0])
+        numbers = [generator.next_number() for _ in range(SEQUENCE_COUNT + 10)]
+        now[0] -= 5  # Clock jumps back
+        numbers += [generator.next_number() for _ in range(10)]
+        self.assertEqual(numbers, sorted(set(numbers)))
+
+    def test_threads(self):
+        generator = IdGenerator(7)
+        results = [[] for _ in range(8)]
+
+        def work(out):
+            for _ in range(5000):
+                out.append(generator.next_number())
+
+        threads = [threading.Thread(target=work, args=(out,)) for out in results]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        numbers = [n for out in results for n in out]
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_processes_never_collide(self):
+        with tempfile.TemporaryDirectory() as node_dir:
+            with multiprocessing.Pool(4) as pool:
+                batches = pool.starmap(generate_ids, [(node_dir, 20000)] * 4)
+        numbers = [n for batch in batches for n in batch]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(len({split_id(batch[0])[1] for batch in batches}), 4)
+
+    def test_node_ids_are_not_shared(self):
+        with tempfile.TemporaryDirectory() as node_dir:
+            self.assertNotEqual(claim_node_id(node_dir), claim_node_id(node_dir))
+
+    def test_invalid_node(self):
+        with self.assertRaises(ValueError):
+            IdGenerator(5000)
+
+
+class FakeRoot:
+    # Stands in for tk.Tk: collects after() callbacks so the test decides when they run
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+    def run_pending(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class TestBackgroundWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.root = FakeRoot()
+        self.busy = []
+        self.worker = BackgroundWorker(self.root, on_busy_change=lambda busy, label: self.busy.append((busy, label)))
+
+    def tearDown(self):
+        self.worker.shutdown()
+
+    def wait_for_jobs(self):
+        for _ in range(500):
+            self.root.run_pending()
+            if self.worker.get_pending_count() == 0:
+                return
+            threading.Event().wait(0.01)
+        self.fail("background jobs did not finish")
+
+    def test_jobs_run_in_order_off_the_calling_thread(self):
+        ran_on, results = [], []
+        for i in range(20):
+            self.worker.submit(lambda i=i: (ran_on.append(threading.current_thread()), i)[1], results.append, label="Saving")
+        self.wait_for_jobs()
+        self.assertEqual(results, list(range(20)))
+        self.assertNotIn(threading.current_thread(), ran_on)
+        self.assertEqual(self.busy[0], (True, "Saving"))
+        self.assertEqual(self.busy[-1], (False, ""))
+
+    def test_results_only_arrive_when_polled(self):
+        results = []
+        self.worker.submit(lambda: 42, results.append)
+        threading.Event().wait(0.05)
+        self.assertEqual(results, [])
+        self.wait_for_jobs()
+        self.assertEqual(results, [42])
+
+    def test_errors_go_to_the_error_handler(self):
+        errors = []
+        self.worker.submit(lambda: 1 / 0, on_error=errors.append)
+        self.wait_for_jobs()
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+
+
+# Runs in a separate process for the shared inventory test
+def book_seats(db_file, attempts):
+    inventory = SharedSeatInventory(db_file)
+    booked = 0
+    for _ in range(attempts):
+        try:
+            inventory.confirm(inventory.reserve("E1", 1))
+            booked += 1
+        except ValueError:
+            pass
+    inventory.close()
+    return booked
+
+
+class SeatInventoryTests:
+    # Shared checks for the in-process and the shared inventory
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.tmp = tempfile.TemporaryDirectory()
+        self.inventory = self.make_inventory(lambda: self.now[0])
+        self.event = Event("E1", "Grand Prix", "2025-05-01", "Yas Marina", 100)
+        self.inventory.add_event(self.event)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_process_order(self):
+        final = Event("E2", "Final", "2025-05-02", "Yas Marina", 5)
+        self.inventory.add_event(final)
+        user = User("U1", "testuser", "hash", b"salt", "Test User", "test@example.com", "", "")
+        order = Order("O1", "2025-05-13", "pending", user)
+        order.add_tickets(Ticket("T1", 130, "", "", event=self.event), 30)
+        order.add_tickets(Ticket("T2", 90, "", "", event=final), 6)
+        with self.assertRaises(ValueError):
+            order.process_order(self.inventory)
+        self.assertEqual((self.inventory.get_available("E1"), self.inventory.get_available("E2")), (100, 5))
+        self.assertEqual(order.get_status(), "pending")
+        order = Order("O2", "2025-05-13", "pending", user)
+        order.add_tickets(Ticket("T1", 130, "", "", event=self.event), 30)
+        order.add_ticket(Ticket("T2", 90, "", "", event=final))
+        self.assertTrue(order.process_order(self.inventory))
+        self.assertEqual((self.inventory.get_available("E1"), self.inventory.get_available("E2")), (70, 4))
+        self.assertEqual(order.get_status(), "confirmed")
+
+    def test_process_order_with_an_unknown_event_holds_nothing(self):
+        order = Order("O1", "2025-05-13", "pending")
+        order.add_tickets(Ticket("T1", 130, "", "", event=self.event), 3)
+        order.add_tickets(Ticket("T2", 90, "", "", event=Event("E9", "Not on sale", "2025-05-03", "Yas Marina", 5)), 2)
+        with self.assertRaises(Exception):
+            order.process_order(self.inventory)
+        self.assertEqual(self.inventory.get_available("E1"), 100)
+        self.assertEqual(order.get_status(), "pending")
+
+    def test_reserve_confirm_release(self):
+        hold = self.inventory.reserve("E1", 10)
+        self.assertEqual(self.inventory.get_available("E1"), 90)
+        self.assertEqual(self.inventory.confirm(hold), 10)
+        self.assertEqual(self.inventory.release(hold), 0)  # Already confirmed
+        self.assertEqual(self.inventory.get_available("E1"), 90)
+        hold = self.inventory.reserve("E1", 5)
+        self.assertEqual(self.inventory.release(hold), 5)
+        self.assertEqual(self.inventory.get_available("E1"), 90)
+        self.inventory.return_seats("E1", 50)
+        self.assertEqual(self.inventory.get_available("E1"), 100)
+
+    def test_sold_out(self):
+        self.inventory.reserve("E1", 100)
+        with self.assertRaises(ValueError):
+            self.inventory.reserve("E1", 1)
+
+    def test_holds_expire(self):
+        hold = self.inventory.reserve("E1", 30, ttl=60)
+        self.now[0] += 30
+        self.assertEqual(self.inventory.get_available("E1"), 70)
+        self.now[0] += 31
+        self.assertEqual(self.inventory.get_available("E1"), 100)
+        with self.assertRaises(KeyError):
+            self.inventory.confirm(hold)
+
+    def test_reserve_many(self):
+        self.inventory.add_event(Event("E2", "Practice", "2025-05-01", "Yas Marina", 5))
+        holds = self.inventory.reserve_many([("E1", 60), ("E2", 3), ("E1", 50), ("E2", 2)], ttl=60)
+        self.assertIsNone(holds[2])
+        self.assertEqual(self.inventory.get_available("E1"), 40)
+        self.assertEqual(self.inventory.get_available("E2"), 0)
+        self.inventory.confirm_many([holds[0], holds[1]])
+        self.assertEqual(self.inventory.release_many([holds[0], holds[3]]), [0, 2])
+        self.assertEqual(self.inventory.get_available("E2"), 2)
+        self.now[0] += 61
+        with self.assertRaises(KeyError):
+            self.inventory.confirm_many(self.inventory.reserve_many([("E1", 1)], ttl=60) + ["H999"])
+        self.assertEqual(self.inventory.get_available("E1"), 39)  # The new hold is still held
+
+    def test_numbered_seats(self):
+        self.inventory.add_event(Event("E5", "Race Day", "2025-05-01", "Yas Marina", 20, SeatMap([SeatSection("A", 2, 10)])))
+        hold = self.inventory.reserve("E5", 4, section="A")
+        self.assertEqual(self.inventory.get_hold_seats(hold), [("A", 0, 3), ("A", 0, 4), ("A", 0, 5), ("A", 0, 6)])
+        self.inventory.release(hold)
+        self.assertEqual(self.inventory.get_hold_seats(self.inventory.reserve("E5", 4)), [("A", 0, 3), ("A", 0, 4), ("A", 0, 5), ("A", 0, 6)])
+        expiring = self.inventory.reserve("E5", 10, ttl=60)
+        self.assertEqual({row for _, row, _ in self.inventory.get_hold_seats(expiring)}, {1})
+        held = self.inventory.reserve_many([("E5", 7, "A"), ("E5", 1, "A")])
+        self.assertIsNone(held[0])  # Only 6 seats are left
+        self.assertEqual(len(self.inventory.get_hold_seats(held[1])), 1)
+        self.now[0] += 61
+        self.assertEqual(self.inventory.get_available("E5"), 15)
+        sold = self.inventory.reserve("E5", 10)
+        seats = self.inventory.get_hold_seats(sold)
+        self.assertEqual({row for _, row, _ in seats}, {1})  # The expired hold's row is free again
+        self.inventory.confirm(sold)
+        self.assertEqual(self.inventory.get_hold_seats(sold), [])
+        self.inventory.return_seats("E5", 10, seats)
+        self.assertEqual(self.inventory.get_available("E5"), 15)
+        self.assertEqual({row for _, row, _ in self.inventory.get_hold_seats(self.inventory.reserve("E5", 10))}, {1})
+
+    def test_hold_ids_never_reused(self):
+        old = self.inventory.reserve("E1", 1)
+        self.inventory.release(old)
+        self.assertNotIn(old, self.inventory.reserve_many([("E1", 1), ("E1", 1)]))
+
+    def test_threads_never_oversell(self):
+        booked = []
+
+        def work():
+            for _ in range(20):
+                try:
+                    self.inventory.confirm(self.inventory.reserve("E1", 1))
+                    booked.append(1)
+                except ValueError:
+                    pass
+
+        threads = [threading.Thread(target=work) for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(booked), 100)
+        self.assertEqual(self.inventory.get_available("E1"), 0)
+
+
+class TestSeatInventory(SeatInventoryTests, unittest.TestCase):
+
+    def make_inventory(self, clock):
+        return SeatInventory(clock=clock)
+
+    def test_event_object_is_updated(self):
+        self.inventory.reserve("E1", 40)
+        self.assertEqual(self.event.get_available_seats(), 60)
+
+
+class TestSharedSeatInventory(SeatInventoryTests, unittest.TestCase):
+
+    def make_inventory(self, clock):
+        return SharedSeatInventory(os.path.join(self.tmp.name, "inventory.db"), clock=clock)
+
+    def test_processes_never_oversell(self):
+        db_file = os.path.join(self.tmp.name, "inventory.db")
+        with multiprocessing.Pool(4) as pool:
+            booked = sum(pool.starmap(book_seats, [(db_file, 40)] * 4))
+        self.assertEqual(booked, 100)
+        self.inventory.sync_event(self.event)
+        self.assertEqual(self.event.get_available_seats(), 0)
+
+    def test_seat_maps_are_shared(self):
+        def make_event():
+            return Event("E5", "Race Day", "2025-05-01", "Yas Marina", 20, SeatMap([SeatSection("A", 2, 10)]))
+        self.inventory.add_event(make_event())
+        # A second inventory on the same file stands in for another process
+        other = SharedSeatInventory(os.path.join(self.tmp.name, "inventory.db"), clock=lambda: self.now[0])
+        event = make_event()
+        other.add_event(event)
+        mine = self.inventory.get_hold_seats(self.inventory.reserve("E5", 4))
+        theirs = other.get_hold_seats(other.reserve("E5", 4))
+        self.assertFalse(set(mine) & set(theirs))
+        self.inventory.release_many(self.inventory.reserve_many([("E5", 2)]))
+        other.sync_event(event)
+        self.assertEqual((event.get_available_seats(), event.get_seat_map().get_free_count()), (12, 12))
+        other.close()
+
+
+class TestPasswordHasher(unittest.TestCase):
+
+    def setUp(self):
+        # Low costs keep the tests fast
+        self.hasher = PasswordHasher("scrypt", cost=10)
+
+    def test_hash_and_verify(self):
+        for hasher in (self.hasher, PasswordHasher("pbkdf2", cost=1000)):
+            salt, encoded = hasher.hash("secret")
+            self.assertTrue(encoded.startswith(hasher.get_algorithm() + "$"))
+            self.assertTrue(hasher.verify(salt, encoded, "secret"))
+            self.assertFalse(hasher.verify(salt, encoded, "wrong"))
+            self.assertFalse(hasher.needs_rehash(encoded))
+
+    def test_old_sha256_hash_still_verifies_and_needs_rehash(self):
+        salt = os.urandom(16)
+        old = derive("sha256", 1, salt, "secret")
+        self.assertTrue(self.hasher.verify(salt, old, "secret"))
+        self.assertFalse(self.hasher.verify(salt, old, "wrong"))
+        self.assertTrue(self.hasher.needs_rehash(old))
+
+    def test_cost_change_needs_rehash(self):
+        _, encoded = self.hasher.hash("secret")
+        self.assertTrue(PasswordHasher("scrypt", cost=11).needs_rehash(encoded))
+        self.assertTrue(PasswordHasher("pbkdf2", cost=1000).needs_rehash(encoded))
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            PasswordHasher("md5")
+
+    def test_pool_verifies_burst(self):
+        pool = HashingPool(self.hasher, workers=2)
+        try:
+            salt, encoded = pool.submit_hash("secret").result()
+            entries = [(salt, encoded, "secret"), (salt, encoded, "wrong")] * 3
+            self.assertEqual(pool.verify_many(entries), [True, False] * 3)
+        finally:
+            pool.shutdown()
+
+
+class TestQuoteTable(unittest.TestCase):
+
+    def setUp(self):
+        self.types = get_ticket_types()
+        self.table = QuoteTable(self.types, max_quantity=20)
+
+    def test_matches_calculate_price(self):
+        for name, ticket in self.types.items():
+            for quantity in (1, 4, 5, 20, 25):
+                self.assertAlmostEqual(self.table.quote(name, quantity), ticket.calculate_price(quantity))
+
+    def test_only_affected_rows_are_redone(self):
+        self.table.quote_many(list(self.types), [1] * len(self.types))
+        self.assertEqual(self.table.get_rebuild_count(), 4)
+        self.types["Weekend"].set_base_price(400)
+        self.table.quote_many(list(self.types), [2] * len(self.types))
+        self.assertEqual(self.table.get_rebuild_count(), 5)
+        self.assertEqual(self.table.quote("Weekend", 2), 2 * (400 + 60))
+        # The group deal is built on its own race pass, changing it redoes the group row
+        self.types["Group"].get_base_ticket_type().set_base_price(100)
+        self.types["Group"].set_discount_percentage(50)
+        self.assertEqual(self.table.quote("Group", 6), 6 * 110 * 0.5)
+        self.assertEqual(self.table.get_rebuild_count(), 6)
+        Admin(1, "admin", "pw").apply_discount(self.types["Season"], 10)
+        self.assertAlmostEqual(self.table.quote("Season", 1), 1000 * 0.9 + 45)
+
+    def test_quote_carts(self):
+        carts = [[("RacePass", 2), ("Group", 5)], [], [("Season", 1)]]
+        totals = [float(total) for total in self.table.quote_carts(carts)]
+        self.assertEqual(totals, [2 * 130 + 5 * 130 * 0.85, 0.0, 1045])
+
+
+class TestSalesColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = SalesColumns({"E1": "RacePass", "E2": "Weekend"})
+        self.alice = User("U1", "alice", "hash", b"salt", "Alice", "alice@example.com", "", "")
+        self.bob = User("U2", "bob", "hash", b"salt", "Bob", "bob@example.com", "", "")
+        self.orders = [self.make_order("O1", self.alice, datetime(2025, 5, 12, 9), "E1", 2, 130),  # A Monday
+                       self.make_order("O2", self.bob, datetime(2025, 5, 13, 9), "E2", 1, 300),
+                       self.make_order("O3", self.bob, datetime(2025, 5, 13, 18), "E1", 10, 130)]
+        self.columns.add_orders(self.orders)
+
+    def make_order(self, order_id, user, placed, event_id, quantity, price):
+        order = Order(order_id, placed, "confirmed", user)
+        order.add_tickets(Ticket("T" + order_id, price, "", "", event=Event(event_id, "", "", "", 100)), quantity)
+        return order
+
+    def test_group_by(self):
+        self.assertEqual(self.columns.group_by("ticket_type"), [("RacePass", 2, 12, 1560), ("Weekend", 1, 1, 300)])
+        self.assertEqual(self.columns.group_by("hour"), [("09:00", 2, 3, 560), ("18:00", 1, 10, 1300)])
+        self.assertEqual(self.columns.group_by("weekday"), [("Monday", 1, 2, 260), ("Tuesday", 2, 11, 1600)])
+        self.assertEqual(self.columns.group_by("price_band"), [("$250-499", 2, 3, 560), ("$1000-2499", 1, 10, 1300)])
+        self.assertEqual(self.columns.group_by("customer", limit=1), [("U2", 2, 11, 1600)])
+        self.assertEqual(self.columns.group_by("customer", date(2025, 5, 12), date(2025, 5, 12)), [("U1", 1, 2, 260)])
+        self.assertEqual(self.columns.group_by("customer", start_date=date(2025, 5, 13)), [("U2", 2, 11, 1600)])
+        self.assertEqual(self.columns.group_by("customer", end_date=date(2025, 5, 12)), [("U1", 1, 2, 260)])
+        with self.assertRaises(ValueError):
+            self.columns.group_by("colour")
+
+    def test_removed_orders_cancel_out(self):
+        self.columns.remove_orders(self.orders[2:])
+        self.assertEqual(self.columns.group_by("hour"), [("09:00", 2, 3, 560)])
+        self.assertEqual(self.columns.group_by("customer"), [("U2", 1, 1, 300), ("U1", 1, 2, 260)])
+        self.assertEqual(self.columns.get_row_count(), 4)
+        self.assertEqual(self.columns.get_first_day(), date(2025, 5, 12))
+
+
+class TestBookingService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        store = PickleStorage(os.path.join(self.tmp.name, "users.pickle"), os.path.join(self.tmp.name, "orders.pickle"))
+        self.service = BookingService(store, SeatInventory(), IdGenerator(1), hasher=PasswordHasher("scrypt", cost=10))
+        self.user = self.service.register("sam", "Sam@example.com", "pw")
+
+    def tearDown(self):
+        self.service.close()
+        self.tmp.cleanup()
+
+    def test_payment_is_charged_and_saved(self):
+        order = self.service.book(self.user["user_id"], "RacePass", 2, "1234567812345678")
+        self.service.close()
+        store = PickleStorage(os.path.join(self.tmp.name, "users.pickle"), os.path.join(self.tmp.name, "orders.pickle"))
+        self.service = BookingService(store, SeatInventory(), IdGenerator(1), hasher=PasswordHasher("scrypt", cost=10))
+        payment = store.find_order(order["order_id"]).get_payment()
+        self.assertEqual(payment.get_status(), "processed")
+        self.assertEqual(payment.get_amount(), order["charged"])
+
+    def test_declined_payment_gives_the_seats_back(self):
+        folder = os.path.join(self.tmp.name, "declined")
+        os.mkdir(folder)
+        inventory = SeatInventory()
+        pipeline = PaymentPipeline(FakeGateway(latency=0.001, jitter=0, decline_rate=1.0)).start()
+        service = BookingService(PickleStorage(os.path.join(folder, "users.pickle"), os.path.join(folder, "orders.pickle")),
+                                 inventory, IdGenerator(2), hasher=PasswordHasher("scrypt", cost=10), payments=pipeline)
+        try:
+            user = service.register("kim", "kim@example.com", "pw")
+            event_id = service.get_events()["RacePass"].get_event_id()
+            available = inventory.get_available(event_id)
+            with self.assertRaises(BookingError) as caught:
+                service.book(user["user_id"], "RacePass", 2, "1234567812345678")
+            self.assertEqual(caught.exception.status, 402)
+            result = service.book_many(user["user_id"],
+                                       [{"ticket_type": "RacePass", "quantity": 1, "card": "1234567812345678"}])
+            self.assertEqual((result["booked"], result["results"][0]["title"]), (0, "Payment Error"))
+            self.assertEqual(inventory.get_available(event_id), available)
+            self.assertEqual(service.get_user_orders(user["user_id"]), [])
+        finally:
+            service.close()  # Before tearDown removes the folder
+
+    def test_stopped_payments_give_the_seats_back(self):
+        folder = os.path.join(self.tmp.name, "stopped")
+        os.mkdir(folder)
+        inventory = SeatInventory()
+        pipeline = PaymentPipeline(FakeGateway(latency=5, jitter=0)).start()
+        service = BookingService(PickleStorage(os.path.join(folder, "users.pickle"), os.path.join(folder, "orders.pickle")),
+                                 inventory, IdGenerator(2), hasher=PasswordHasher("scrypt", cost=10), payments=pipeline)
+        try:
+            user = service.register("kim", "kim@example.com", "pw")
+            event_id = service.get_events()["RacePass"].get_event_id()
+            available = inventory.get_available(event_id)
+            items = [{"ticket_type": "RacePass", "quantity": 1, "card": "1234567812345678"}] * 2
+            threading.Timer(0.05, pipeline.stop).start()  # Shut down while the cards are being charged
+            result = service.book_many(user["user_id"], items)
+            self.assertEqual([r.get("title") for r in result["results"]], ["Payment Error"] * 2)
+            with self.assertRaises(BookingError) as caught:
+                service.book(user["user_id"], "RacePass", 1, "1234567812345678")
+            self.assertEqual(caught.exception.status, 503)
+            self.assertEqual(inventory.get_available(event_id), available)
+        finally:
+            service.close()
+
+    def test_register_and_login(self):
+        self.assertNotIn("password", self.user)
+        self.assertEqual(self.service.login("sam@EXAMPLE.com", "pw")["user_id"], self.user["user_id"])
+        with self.assertRaises(BookingError) as caught:
+            self.service.register("sam", "sam@example.com", "pw")
+        self.assertEqual(caught.exception.status, 409)
+        with self.assertRaises(BookingError) as caught:
+            self.service.login("sam@example.com", "wrong")
+        self.assertEqual(caught.exception.status, 401)
+
+    def test_login_upgrades_old_hash(self):
+        store = self.service.get_store()
+        user = store.find_user_by_id(self.user["user_id"])
+        user.set_password(derive("sha256", 1, user.get_salt(), "pw"))
+        store.update_user(user)
+        self.service.login("sam@example.com", "pw")
+        self.assertTrue(store.find_user_by_id(self.user["user_id"]).get_password().startswith("scrypt$10$"))
+
+    def test_hashing_pool_hashes_new_and_upgraded_passwords(self):
+        hasher = PasswordHasher("scrypt", cost=10)
+        pool = HashingPool(hasher, workers=1)
+        hashed = []
+        submit_hash = pool.submit_hash
+        pool.submit_hash = lambda password: hashed.append(password) or submit_hash(password)
+        store = PickleStorage(os.path.join(self.tmp.name, "pool-users.pickle"), os.path.join(self.tmp.name, "pool-orders.pickle"))
+        service = BookingService(store, SeatInventory(), IdGenerator(2), hasher=hasher, hashing_pool=pool)
+        try:
+            user = service.register("kim", "kim@example.com", "pw")
+            saved = store.find_user_by_id(user["user_id"])
+            saved.set_password(derive("sha256", 1, saved.get_salt(), "pw"))
+            store.update_user(saved)
+            service.login("kim@example.com", "pw")
+            self.assertEqual(hashed, ["pw", "pw"])
+            self.assertTrue(store.find_user_by_id(user["user_id"]).get_password().startswith("scrypt$10$"))
+        finally:
+            service.close()
+            pool.shutdown()
+
+    def test_profile_change_is_redone_after_a_conflict(self):
+        store = self.service.get_store()
+        other = PickleStorage(os.path.join(self.tmp.name, "users.pickle"), os.path.join(self.tmp.name, "orders.pickle"))
+        find_user = store.find_user_by_id
+        reads = []
+
+        def saved_elsewhere_after_first_read(user_id):
+            reads.append(user_id)
+            user = find_user(user_id)
+            if len(reads) == 1:  # Another process saves the user between the read and the save
+                changed = other.find_user_by_id(user_id)
+                changed.set_email("sam.new@example.com")
+                other.update_user(changed)
+            return user
+        store.find_user_by_id = saved_elsewhere_after_first_read
+        self.service.update_profile(self.user["user_id"], "Sam Smith", "555", "Abu Dhabi")
+        other.close()
+        self.assertEqual(len(reads), 2)
+        user = find_user(self.user["user_id"])
+        self.assertEqual((user.get_email(), user.get_full_name()), ("sam.new@example.com", "Sam Smith"))
+
+    def test_booking_gets_numbered_seats(self):
+        order = self.service.book(self.user["user_id"], "RacePass", 2, "1234567812345678")
+        self.assertEqual(order["seats"], ["Main Grandstand, row 1, seat 125", "Main Grandstand, row 1, seat 126"])
+        seat_map = self.service.get_events()["RacePass"].get_seat_map()
+        self.assertEqual(seat_map.get_free_count(), 59998)
+        self.assertEqual(self.service.get_user_orders(self.user["user_id"])[0]["seats"], order["seats"])
+        group = self.service.book_many(self.user["user_id"], [{"ticket_type": "Group", "quantity": 5, "card": "1234567812345678"}])
+        self.assertTrue(group["results"][0]["seats"][0].startswith("South Zone, row 1"))
+        self.service.delete_order(self.user["user_id"], order["order_id"])
+        self.assertEqual(seat_map.get_free_count(), 60000)  # The same seats went back on sale
+
+    def test_book_list_and_delete(self):
+        order = self.service.book(self.user["user_id"], "RacePass", "2", "1234567812345678")
+        self.assertEqual(order["quantity"], 2)
+        self.assertEqual(order["charged"], self.service.quote("RacePass", 2))
+        self.assertEqual([o["order_id"] for o in self.service.get_user_orders(self.user["user_id"])], [order["order_id"]])
+        self.assertEqual(self.service.get_events()["RacePass"].get_available_seats(), 59998)
+        self.service.delete_order(self.user["user_id"], order["order_id"])
+        self.assertEqual(self.service.get_user_orders(self.user["user_id"]), [])
+        self.assertEqual(self.service.get_events()["RacePass"].get_available_seats(), 60000)
+
+    def test_booking_errors(self):
+        for quantity, card, title in (("0", "1234567812345678", "Invalid"), ("2", "1234", "Payment Error"),
+                                      ("60001", "1234567812345678", "Sold Out")):
+            with self.assertRaises(BookingError) as caught:
+                self.service.book(self.user["user_id"], "RacePass", quantity, card)
+            self.assertEqual(caught.exception.title, title)
+        with self.assertRaises(BookingError):
+            self.service.delete_order(self.user["user_id"], "O-unknown")
+
+    def test_book_many(self):
+        items = [{"ticket_type": "Weekend", "quantity": 2, "card": "1234567812345678"},
+                 {"ticket_type": "Weekend", "quantity": "x", "card": "1234567812345678"},
+                 {"ticket_type": "Season", "quantity": 5001, "card": "1234567812345678"},
+                 {"ticket_type": "Group", "quantity": 5, "card": "1234567812345678"}]
+        report = self.service.book_many(self.user["user_id"], items)
+        self.assertEqual((report["booked"], report["failed"]), (2, 2))
+        self.assertEqual([r["ok"] for r in report["results"]], [True, False, False, True])
+        self.assertEqual([r["title"] for r in report["results"] if not r["ok"]], ["Invalid", "Sold Out"])
+        self.assertEqual(report["charged"], self.service.quote("Weekend", 2) + self.service.quote("Group", 5))
+        self.assertEqual(len(self.service.get_user_orders(self.user["user_id"])), 2)
+
+        report = self.service.book_many(self.user["user_id"], items, all_or_nothing=True)
+        self.assertEqual(report["booked"], 0)
+        self.assertEqual(len(self.service.get_user_orders(self.user["user_id"])), 2)
+        self.assertEqual(self.service.get_events()["Weekend"].get_available_seats(), 20000 - 2)
+
+    def test_group_discount_taken_once(self):
+        order = self.service.book(self.user["user_id"], "Group", 6, "1234567812345678")
+        self.assertAlmostEqual(order["charged"], 6 * 130 * 0.85)
+        self.assertAlmostEqual(order["total"], order["charged"])
+        self.service.set_group_discount(50)
+        self.assertAlmostEqual(self.service.quote("Group", 6), 6 * 130 * 0.5)
+        self.assertEqual(self.service.quote_carts([[{"ticket_type": "Group", "quantity": 6}]]), [390.0])
+
+    def test_report_and_discount(self):
+        self.service.book(self.user["user_id"], "Weekend", 1, "1234567812345678")
+        report = self.service.sales_report()
+        self.assertEqual(report["total_orders"], 1)
+        self.assertIn("1 ticket(s) sold", report["text"])
+        self.assertEqual(self.service.set_group_discount("20"), 20.0)
+        with self.assertRaises(BookingError):
+            self.service.set_group_discount("120")
+
+    def test_sales_breakdown(self):
+        first = self.service.book(self.user["user_id"], "Weekend", 2, "1234567812345678")
+        self.service.book(self.user["user_id"], "RacePass", 1, "1234567812345678")
+        breakdown = self.service.sales_breakdown("ticket_type")
+        self.assertEqual([(r["label"], r["tickets"]) for r in breakdown["rows"]], [("Weekend", 2), ("RacePass", 1)])
+        self.assertIn("Sales by ticket type", breakdown["text"])
+        # Bookings and deletes made after the columns were read are counted too
+        self.service.book(self.user["user_id"], "RacePass", 3, "1234567812345678")
+        self.service.delete_order(self.user["user_id"], first["order_id"])
+        rows = self.service.sales_breakdown("ticket_type")["rows"]
+        self.assertEqual([(r["label"], r["orders"], r["tickets"]) for r in rows], [("RacePass", 2, 4)])
+        self.service.update_profile(self.user["user_id"], "Sam S", "555", "Here")
+        top = self.service.sales_breakdown("customer", limit=5)
+        self.assertEqual(top["rows"][0]["label"], f"Sam S ({self.user['user_id']})")
+        self.assertEqual(self.service.sales_breakdown("hour", "2000-01-01", "2000-12-31")["rows"], [])
+        for by, limit in (("colour", None), ("hour", 0)):
+            with self.assertRaises(BookingError):
+                self.service.sales_breakdown(by, limit=limit)
+
+
+class TestApiServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        store = SQLiteStorage(os.path.join(self.tmp.name, "bookings.db"))
+        self.service = BookingService(store, SeatInventory(), IdGenerator(2), hasher=PasswordHasher("scrypt", cost=10))
+        self.server = ApiServer(self.service, port=0, workers=8, admins=["Boss@example.com"])
+        self.url = f"http://127.0.0.1:{self.server.start_background()}"
+
+    def tearDown(self):
+        self.server.stop_background()
+        self.service.close()
+        self.tmp.cleanup()
+
+    def test_client_round_trip(self):
+        client = BookingClient(self.url)
+        user = client.register("sam", "sam@example.com", "pw")
+        order = client.book(user["user_id"], "Season", 1, "1234567812345678")
+        self.assertEqual([o["order_id"] for o in client.get_user_orders(user["user_id"])], [order["order_id"]])
+        batch = client.book_many(user["user_id"], [{"ticket_type": "RacePass", "quantity": 1, "card": "1234567812345678"}] * 3)
+        self.assertEqual(batch["booked"], 3)
+        self.assertEqual(len(client.get_user_orders(user["user_id"])), 4)
+        self.assertEqual(client.update_profile(user["user_id"], "Sam S", "1", "Here")["full_name"], "Sam S")
+        admin = BookingClient(self.url)
+        admin.register("boss", "boss@example.com", "pw")
+        self.assertEqual(admin.sales_report()["total_orders"], 4)
+        self.assertEqual(admin.sales_breakdown("ticket_type")["rows"][0]["label"], "Season")
+        admin.close()
+        client.delete_account(user["user_id"])
+        with self.assertRaises(BookingError) as caught:
+            client.get_user_orders(user["user_id"])
+        self.assertEqual(caught.exception.status, 401)
+        client.close()
+
+    def test_sessions_are_separate(self):
+        alice, bob = BookingClient(self.url), BookingClient(self.url)
+        alice_id = alice.register("alice", "alice@example.com", "pw")["user_id"]
+        bob.register("bob", "bob@example.com", "pw")
+        order = alice.book(alice_id, "RacePass", 1, "1234567812345678")
+        with self.assertRaises(BookingError) as caught:
+            bob.delete_order(alice_id, order["order_id"])  # Not bob's order
+        self.assertEqual(caught.exception.status, 404)
+        self.assertEqual(bob.get_user_orders(None), [])
+        alice.close()
+        bob.close()
+
+    def test_admin_routes_refuse_customers(self):
+        discount = self.service.get_ticket_types()["Group"].get_discount_percentage()
+        client = BookingClient(self.url)
+        client.register("sam", "sam@example.com", "pw")
+        for call in (client.sales_report, lambda: client.sales_breakdown("ticket_type"),
+                     lambda: client.set_group_discount(90)):
+            with self.assertRaises(BookingError) as caught:
+                call()
+            self.assertEqual(caught.exception.status, 403)
+        self.assertEqual(self.service.get_ticket_types()["Group"].get_discount_percentage(), discount)
+        client.close()
+        admin = BookingClient(self.url)
+        admin.register("boss", "boss@example.com", "pw")
+        self.assertEqual(admin.set_group_discount(20), 20.0)
+        admin.logout()
+        admin.login("boss@example.com", "pw")  # A new session of an admin is an admin session too
+        self.assertEqual(admin.sales_report()["total_orders"], 0)
+        admin.close()
+
+    def test_many_clients_at_once(self):
+        def work(i):
+            client = BookingClient(self.url)
+            user_id = client.register(f"u{i}", f"u{i}@example.com", "pw")["user_id"]
+            client.book(user_id, "Group", 5, "1234567812345678")
+            client.close()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.service.sales_report()["total_orders"], 20)
+        self.assertEqual(self.service.get_events()["Group"].get_available_seats(), 8000 - 100)
+
+
+class TestStartup(unittest.TestCase):
+
+    def imported_after(self, code):
+        # Run in a fresh interpreter, nothing imported by the tests themselves counts
+        result = subprocess.run([sys.executable, "-c", f"import sys; {code}; print('\\n'.join(sys.modules))"],
+                                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return set(result.stdout.splitlines())
+
+    def test_packages_import_nothing_until_used(self):
+        modules = self.imported_after("import Models, Storage, Services")
+        self.assertNotIn("Models.order", modules)
+        self.assertNotIn("Storage.sqlite_storage", modules)
+        self.assertNotIn("Services.booking_service", modules)
+
+    def test_headless_service_needs_no_gui_or_network(self):
+        modules = self.imported_after("from Services import open_service, BookingError")
+        self.assertNotIn("tkinter", modules)
+        self.assertNotIn("asyncio", modules)
+        self.assertNotIn("http.client", modules)
+        self.assertNotIn("multiprocessing", modules)
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_generated_data_can_be_used(self):
+        hasher = PasswordHasher("scrypt", cost=10)
+        users_file, orders_file, db_file = datagen.generate(self.tmp.name, 20, 200, hasher, sqlite=True)
+        store = PickleStorage(users_file, orders_file)
+        self.assertEqual((len(store.get_users()), len(store.get_orders())), (20, 200))
+        store.close()
+        service = BookingService(SQLiteStorage(db_file), SeatInventory(), IdGenerator(3), hasher=hasher)
+        self.assertEqual(service.login(datagen.user_email(7), datagen.PASSWORD)["user_id"], "U7")
+        self.assertEqual(service.sales_report()["total_orders"], 200)
+        service.close()
+
+    def test_compare_flags_regressions(self):
+        old = [suite.summarize("pickle", 10, 100, "book", [1.0, 1.0, 1.0]),
+               suite.summarize("pickle", 10, 100, "login", [4.0, 4.0, 4.0])]
+        new = [suite.summarize("pickle", 10, 100, "book", [2.0, 2.0, 2.0]),
+               suite.summarize("pickle", 10, 100, "login", [4.4, 4.4, 4.4]),
+               suite.summarize("sqlite", 10, 100, "book", [9.0, 9.0, 9.0])]  # Not in the baseline
+        rows = suite.compare(old, new, threshold=1.5)
+        self.assertEqual([(key[3], regressed) for key, _, _, _, regressed in rows], [("book", True), ("login", False)])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file